@@ -0,0 +1,390 @@
+"""Benchmarks of the qroutines.
+
+For each routine and each size of its grid, three phases are timed
+separately:
+
+- build: the construction of the top-level QRoutine (and of its pattern, if
+  any). The sub-routines are built lazily by the QLM when linking, so their
+  construction falls in the next phase
+- to_circ: the application of the routine to a Program and `Program.to_circ()`
+- submit: the simulation of the circuit with `qpu.submit`, only if the circuit
+  has at most max_sim_qubits qubits
+
+Besides the timings, the number of gate definitions of the circuit and its
+size once pickled are recorded, since both grow with the number of distinct
+sub-routine signatures.
+
+Each phase is repeated and the minimum time is kept; the routine caches are
+emptied before each repetition, so that the timings are the cold ones.
+
+The results of each run are appended to a JSON history and compared with a
+baseline run (by default the previous one) to detect regressions, i.e.
+phases slower than the baseline by more than a relative threshold.
+
+Usage: `python -m benchmarks [--cases adder_cuccaro sorter] [--quick]`, see
+`--help`.
+"""
+import argparse
+import json
+import logging
+import os
+import pickle
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from qat.external.qroutines.arith import cuccaro_arith, tkk_arith
+from qat.external.qroutines.hamming_weight_compute import fpc, wallace
+from qat.external.qroutines.hamming_weight_generate import bartschiE19
+from qat.external.qroutines.linalg import _rref
+from qat.external.qroutines.linalg import gauss_jordan_isd4 as gji
+from qat.external.qroutines.linalg import matrix as qmatrix
+from qat.external.qroutines.sorting import sorting_network as sn
+from qat.external.utils import cache
+from qat.lang.AQASM.program import Program
+from qat.lang.AQASM.routines import QRoutine
+
+LOGGER = logging.getLogger(__name__)
+
+PHASES = ("build", "to_circ", "submit")
+DEFAULT_HISTORY = os.path.join(os.path.dirname(__file__), "history.json")
+DEFAULT_THRESHOLD = 0.25
+# Differences below this are considered noise, in seconds
+DEFAULT_MIN_DELTA = 1e-3
+
+
+class BenchCase(NamedTuple):
+    """A routine to benchmark.
+
+    - name: the name of the case
+    - build: returns the routine for a given size, and the number of qubits
+      of its arguments
+    - sizes: the grid of sizes
+    """
+
+    name: str
+    build: Callable[[Any], Tuple[QRoutine, int]]
+    sizes: Sequence
+
+
+class Regression(NamedTuple):
+    case: str
+    size: str
+    phase: str
+    baseline: float
+    current: float
+
+    def __str__(self):
+        ratio = self.current / self.baseline if self.baseline else float("inf")
+        return (
+            f"{self.case}[{self.size}] {self.phase}: {self.baseline:.4f}s -> "
+            f"{self.current:.4f}s (x{ratio:.2f})"
+        )
+
+
+def _cuccaro_adder(bits):
+    return (~cuccaro_arith.adder)(bits, bits, True, True), 2 * bits + 1
+
+
+def _tkk_adder(bits):
+    return (~tkk_arith.adder)(bits, bits, True, True), 2 * bits + 1
+
+
+def _fpc_compute(n):
+    pattern = fpc.get_qroutine_for_qubits_weight_get_pattern(n)
+    a_len, cout_len = pattern["n_lines"], pattern["n_couts"]
+    qrout = (~fpc.get_qroutine_for_qubits_weight)(a_len, cout_len, pattern)
+    return qrout, a_len + cout_len
+
+
+def _fpc_check(n):
+    pattern = fpc.get_qroutine_for_qubits_weight_get_pattern(n)
+    a_len, cout_len = pattern["n_lines"], pattern["n_couts"]
+    qrout = (~fpc.get_qroutine_for_qubits_weight_check)(
+        a_len, cout_len, n // 2, pattern, True
+    )
+    return qrout, a_len + cout_len + 1
+
+
+def _wallace_compute(n):
+    pattern = wallace.get_pattern(n)
+    a_len, cout_len = pattern["n_lines"], pattern["n_couts"]
+    qrout = (~wallace.get_qroutine_for_qubits_weight)(a_len, cout_len, pattern)
+    return qrout, a_len + cout_len
+
+
+def _sorter(n):
+    pattern = sn.get_pattern_sorter(n)
+    qrout = (~sn.build_gate_sorter)(pattern)
+    return qrout, pattern["n_lines"] + pattern["n_comps"]
+
+
+def _merger(n):
+    pattern = sn.get_pattern_merger(n)
+    qrout = (~sn.build_gate_merger)(pattern)
+    return qrout, pattern["n_lines"] + pattern["n_comps"]
+
+
+def _gji(size):
+    r, n = size
+    swap_ancilla_n, _ = gji.get_required_ancillae(r)
+    # Prange: the rightmost r x (n - r) submatrix is skipped
+    return (~gji.get_rref)(r, n, True, n), r * n + swap_ancilla_n
+
+
+def _rref_legacy(size):
+    r, n = size
+    swap_ancilla_n, add_ancilla_n = _rref.get_required_ancillae(r, n)
+    return (~_rref.get_rref)(r, n), r * n + swap_ancilla_n + add_ancilla_n
+
+
+def _move_columns_end(size):
+    nrows, ncols = size
+    data = qmatrix.move_columns_end_data(nrows, ncols)
+    qrout = (~qmatrix.move_columns_end_gate)(data)
+    return qrout, (nrows + 1) * data["n_cols"] + data["n_comps"]
+
+
+def _bartschi(size):
+    n, k = size
+    return (~bartschiE19.generate)(n, k), n
+
+
+CASES: Dict[str, BenchCase] = {
+    case.name: case
+    for case in (
+        BenchCase("adder_cuccaro", _cuccaro_adder, (2, 4, 8, 16, 32, 64)),
+        BenchCase("adder_tkk", _tkk_adder, (2, 4, 8, 16, 32, 64)),
+        BenchCase("fpc_compute", _fpc_compute, (4, 8, 16, 32, 64, 128)),
+        BenchCase("fpc_check", _fpc_check, (4, 8, 16, 32, 64, 128)),
+        BenchCase("wallace_compute", _wallace_compute, (4, 8, 16, 32, 64, 128)),
+        BenchCase("sorter", _sorter, (4, 8, 16, 32, 64, 128)),
+        BenchCase("merger", _merger, (4, 8, 16, 32, 64, 128)),
+        BenchCase("gji", _gji, ((2, 4), (3, 6), (4, 8), (8, 16), (16, 32))),
+        BenchCase("rref", _rref_legacy, ((2, 4), (3, 6), (4, 8), (8, 16))),
+        BenchCase(
+            "move_columns_end", _move_columns_end, ((2, 4), (4, 8), (8, 16), (16, 32))
+        ),
+        BenchCase("bartschi", _bartschi, ((4, 2), (8, 4), (12, 6), (16, 8), (32, 16))),
+    )
+}
+
+
+def size_key(size) -> str:
+    if isinstance(size, (tuple, list)):
+        return "x".join(str(i) for i in size)
+    return str(size)
+
+
+def time_case(
+    case: BenchCase, size, qpu=None, repeat: int = 3, max_sim_qubits: int = 16
+) -> Dict[str, Any]:
+    """Time the three phases of a routine at a given size.
+
+    :returns: the minimum time of each phase (None for submit if not
+        simulated), the number of qubits and of gate definitions of the
+        circuit and its pickled size in bytes
+    """
+    times: Dict[str, List[float]] = {phase: [] for phase in PHASES}
+    circuit = None
+    for _ in range(repeat):
+        cache.cache_clear()
+        start = time.perf_counter()
+        qrout, nargs = case.build(size)
+        built = time.perf_counter()
+        pr = Program()
+        pr.apply(qrout, pr.qalloc(nargs))
+        circuit = pr.to_circ()
+        compiled = time.perf_counter()
+        times["build"].append(built - start)
+        times["to_circ"].append(compiled - built)
+        if qpu is not None and circuit.nbqbits <= max_sim_qubits:
+            job = circuit.to_job()
+            start = time.perf_counter()
+            qpu.submit(job)
+            times["submit"].append(time.perf_counter() - start)
+    result: Dict[str, Any] = {
+        phase: min(times[phase]) if times[phase] else None for phase in PHASES
+    }
+    result["qubits"] = circuit.nbqbits
+    result["definitions"] = len(circuit.gateDic)
+    result["size"] = len(pickle.dumps(circuit))
+    return result
+
+
+def run(
+    cases: Sequence[BenchCase],
+    qpu=None,
+    repeat: int = 3,
+    max_sim_qubits: int = 16,
+    quick: bool = False,
+) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Time all the cases over their grids (only the first two sizes if
+    quick), returning the results by case and size."""
+    results = {}
+    for case in cases:
+        results[case.name] = {}
+        for size in case.sizes[:2] if quick else case.sizes:
+            LOGGER.info("%s[%s]", case.name, size_key(size))
+            results[case.name][size_key(size)] = time_case(
+                case, size, qpu, repeat, max_sim_qubits
+            )
+    return results
+
+
+def find_regressions(
+    results: Dict[str, Dict[str, Dict[str, Any]]],
+    baseline: Dict[str, Dict[str, Dict[str, Any]]],
+    threshold: float = DEFAULT_THRESHOLD,
+    min_delta: float = DEFAULT_MIN_DELTA,
+) -> List[Regression]:
+    """Compare the results with the baseline ones. A phase regressed if it is
+    slower by more than threshold (relative) and min_delta (absolute). Cases,
+    sizes and phases missing from either side are ignored."""
+    regressions = []
+    for case, sizes in results.items():
+        for size, phases in sizes.items():
+            old_phases = baseline.get(case, {}).get(size, {})
+            for phase in PHASES:
+                old, new = old_phases.get(phase), phases.get(phase)
+                if old is None or new is None:
+                    continue
+                if new > old * (1 + threshold) and new - old > min_delta:
+                    regressions.append(Regression(case, size, phase, old, new))
+    return regressions
+
+
+def format_results(results: Dict[str, Dict[str, Dict[str, Any]]]) -> str:
+    """A table with the timings and the dominant phase of each size."""
+    lines = [
+        f"{'case':<18}{'size':>8}{'qubits':>8}{'defs':>7}{'bytes':>10}"
+        + "".join(f"{phase:>11}" for phase in PHASES)
+        + "  dominant"
+    ]
+    for case, sizes in results.items():
+        for size, phases in sizes.items():
+            timed = {p: phases[p] for p in PHASES if phases.get(p) is not None}
+            lines.append(
+                f"{case:<18}{size:>8}{phases.get('qubits') or '-':>8}"
+                + f"{phases.get('definitions') or '-':>7}"
+                + f"{phases.get('size') or '-':>10}"
+                + "".join(
+                    f"{phases[p]:>11.4f}" if p in timed else f"{'-':>11}"
+                    for p in PHASES
+                )
+                + f"  {max(timed, key=timed.get) if timed else '-'}"
+            )
+    return "\n".join(lines)
+
+
+def load_history(path: str) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_history(path: str, history: List[Dict[str, Any]]):
+    with open(path, "w") as f:
+        json.dump(history, f, indent=1)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def new_run(results: Dict[str, Dict[str, Dict[str, Any]]], **info) -> Dict[str, Any]:
+    """Wrap the results with the information identifying the run."""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.node(),
+        **info,
+        "results": results,
+    }
+
+
+def _get_qpu(simulator: str):
+    if simulator == "none":
+        return None
+    if simulator == "pylinalg":
+        from qat.pylinalg import PyLinalg
+
+        return PyLinalg()
+    if simulator == "linalg":
+        from qat.qpus import LinAlg
+
+        return LinAlg()
+    if simulator == "sparse":
+        from qat.external.qpus.sparse import SparseQPU
+
+        return SparseQPU()
+    raise ValueError(f"Simulator {simulator} not supported")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=None)
+    parser.add_argument("--quick", action="store_true", help="only the smallest sizes")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--simulator", default="pylinalg")
+    parser.add_argument("--max-sim-qubits", type=int, default=16)
+    parser.add_argument("--history", default=DEFAULT_HISTORY)
+    parser.add_argument(
+        "--baseline",
+        type=int,
+        default=-1,
+        help="index of the baseline run in the history, default the last one",
+    )
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument(
+        "--min-delta",
+        type=float,
+        default=DEFAULT_MIN_DELTA,
+        help="differences below this are noise, in seconds",
+    )
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    cases = [CASES[name] for name in args.cases or CASES]
+    results = run(
+        cases,
+        _get_qpu(args.simulator),
+        args.repeat,
+        args.max_sim_qubits,
+        args.quick,
+    )
+    print(format_results(results))
+
+    history = load_history(args.history)
+    regressions = []
+    if history:
+        baseline = history[args.baseline]
+        print(f"\nBaseline: {baseline['timestamp']} ({baseline['revision']})")
+        regressions = find_regressions(
+            results, baseline["results"], args.threshold, args.min_delta
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if not regressions:
+            print("No regressions")
+    if not args.no_save:
+        history.append(new_run(results, simulator=args.simulator))
+        save_history(args.history, history)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
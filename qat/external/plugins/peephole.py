@@ -0,0 +1,156 @@
+"""Peephole optimization of compiled circuits.
+
+Many routines leave pairs of mutually inverse gates in the final circuit, f.e.
+the X gates flipping the a register of the subtractor, or an X closing a
+routine followed by the X opening the next one. :func:`cancel_inverse_pairs`
+removes them, also across the boundaries of the routines, commuting gates past
+the ones acting on disjoint qubits; since the removal of a pair may make two
+other gates adjacent, the cancellations cascade.
+
+The circuits must be compiled with `to_circ(inline=True)`, so that the gates
+of the routines are not boxed.
+"""
+import copy
+import logging
+from collections import Counter, defaultdict
+from typing import TYPE_CHECKING, Dict, Hashable, List, NamedTuple, Tuple
+
+from qat.core.plugins import AbstractPlugin
+from qat.core.util import OpType, has_non_inlined
+from qat.external.utils.resources import canonical_gate_name
+
+if TYPE_CHECKING:
+    from qat.core import Batch, HardwareSpecs
+    from qat.core.wrappers.circuit import Circuit
+
+LOGGER = logging.getLogger(__name__)
+
+# Base gates equal to their inverse, with any number of controls
+_SELF_INVERSE = {"X", "Y", "Z", "H", "SWAP"}
+# Base gates whose inverse is the gate with the opposite angle (the QLM
+# compiles the dagger of a rotation this way)
+_ROTATIONS = {"RX", "RY", "RZ", "PH"}
+# Symmetric targets
+_SYMMETRIC = {"SWAP"}
+# Base gates already including some controls
+_BASE_GATES = {"CNOT": ("X", 1), "CCNOT": ("X", 2), "CSIGN": ("Z", 1)}
+_SUPPORTED_OPS = {OpType.GATETYPE, OpType.MEASURE, OpType.RESET}
+
+
+class PeepholeReport(NamedTuple):
+    """Gate counts, by canonical name, before and after the optimization."""
+
+    before: Counter
+    after: Counter
+
+    @property
+    def removed(self) -> int:
+        return sum(self.before.values()) - sum(self.after.values())
+
+
+def _gate_keys(name: str, params: List, qbits: List[int]) -> Tuple[Hashable, Hashable]:
+    """Return the key identifying a gate and the key of its inverse."""
+    nctrls = 0
+    dag = False
+    while True:
+        if name.startswith("C-"):
+            nctrls += 1
+            name = name[2:]
+        elif name.startswith("D-"):
+            dag = not dag
+            name = name[2:]
+        else:
+            break
+    if name in _BASE_GATES:
+        name, base_ctrls = _BASE_GATES[name]
+        nctrls += base_ctrls
+    targets = qbits[nctrls:]
+    key = (
+        name,
+        tuple(params),
+        frozenset(qbits[:nctrls]),
+        frozenset(targets) if name in _SYMMETRIC else tuple(targets),
+    )
+    if name in _SELF_INVERSE:
+        return key + (False,), key + (False,)
+    if name in _ROTATIONS and not dag:
+        return key + (dag,), (name, tuple(-p for p in params)) + key[2:] + (dag,)
+    return key + (dag,), key + (not dag,)
+
+
+def cancel_inverse_pairs(circuit: "Circuit") -> Tuple["Circuit", PeepholeReport]:
+    """Remove the pairs of mutually inverse gates which are adjacent, i.e.
+    with no gate in between acting on any of their qubits.
+
+    :param circuit: a circuit compiled with `inline=True`. Measures and resets
+        are supported, and are never crossed
+    :returns: the optimized circuit and the gate counts before and after
+    :raises ValueError: if the circuit contains boxed routines or unsupported
+        operations
+    """
+    if has_non_inlined(circuit):
+        raise ValueError("Circuit has boxed routines, compile it with inline=True")
+    if any(op.type not in _SUPPORTED_OPS for op in circuit.ops):
+        raise ValueError("Only gates, measures and resets are supported")
+    instrs = list(circuit.iterate_simple())
+
+    keep = [True] * len(instrs)
+    keys: List[Hashable] = [None] * len(instrs)
+    # The indexes of the gates not (yet) cancelled acting on each qubit
+    live: Dict[int, List[int]] = defaultdict(list)
+    for idx, (op, instr) in enumerate(zip(circuit.ops, instrs)):
+        if op.type != OpType.GATETYPE:
+            # keys[idx] is None, so it can't be cancelled
+            for q in op.qbits:
+                live[q].append(idx)
+            continue
+        name, params, qbits = instr
+        keys[idx], inverse = _gate_keys(name, params, qbits)
+        prev = live[qbits[0]][-1] if live[qbits[0]] else None
+        # Same keys implies same qubits
+        if (
+            prev is not None
+            and keys[prev] == inverse
+            and all(live[q][-1] == prev for q in qbits)
+        ):
+            keep[prev] = keep[idx] = False
+            for q in qbits:
+                live[q].pop()
+        else:
+            for q in qbits:
+                live[q].append(idx)
+
+    optimized = copy.copy(circuit)
+    optimized.ops = [op for op, k in zip(circuit.ops, keep) if k]
+    report = PeepholeReport(
+        _count_gates(circuit.ops, instrs, [True] * len(instrs)),
+        _count_gates(circuit.ops, instrs, keep),
+    )
+    LOGGER.info(
+        "Removed %d out of %d gates", report.removed, sum(report.before.values())
+    )
+    return optimized, report
+
+
+def _count_gates(ops, instrs, keep) -> Counter:
+    return Counter(
+        canonical_gate_name(instr[0])
+        for op, instr, k in zip(ops, instrs, keep)
+        if k and op.type == OpType.GATETYPE
+    )
+
+
+class PeepholePlugin(AbstractPlugin):
+    """Plugin applying :func:`cancel_inverse_pairs` to all the jobs of a batch,
+    f.e. `(PeepholePlugin() | PyLinalg()).submit(job)`. The reports are
+    appended to :attr:`reports`."""
+
+    def __init__(self):
+        super().__init__()
+        self.reports: List[PeepholeReport] = []
+
+    def compile(self, batch: "Batch", hardware_specs: "HardwareSpecs") -> "Batch":
+        for job in batch.jobs:
+            job.circuit, report = cancel_inverse_pairs(job.circuit)
+            self.reports.append(report)
+        return batch
@@ -0,0 +1,126 @@
+"""Asynchronous submission of jobs to local QPUs running in worker processes.
+
+The local simulators (PyLinalg, LinAlg, MPS, ...) are synchronous and bound to
+a single core, so independent jobs submitted one after another don't take
+advantage of the other cores. A :class:`JobQueue` keeps a bounded pool of
+worker processes, each one with its own QPU built by a factory, and returns
+futures of the results:
+
+.. code-block::
+
+    with JobQueue(PyLinalg) as queue:
+        results = queue.run(jobs)
+        # or, from a coroutine
+        results = await queue.gather(jobs)
+
+The factory is sent to the workers, so it must be picklable, f.e. a QPU class
+or a `functools.partial` of it.
+"""
+import asyncio
+import concurrent.futures
+import logging
+import os
+import weakref
+from typing import TYPE_CHECKING, Callable, Iterable, List, Optional
+
+if TYPE_CHECKING:
+    from qat.core.wrappers.job import Job
+    from qat.core.wrappers.result import Result
+
+LOGGER = logging.getLogger(__name__)
+
+# The QPU of the worker process
+_WORKER_QPU = None
+
+
+def _init_worker(qpu_factory: Callable):
+    global _WORKER_QPU
+    _WORKER_QPU = qpu_factory()
+
+
+def _run_job(job: "Job") -> "Result":
+    return _WORKER_QPU.submit(job)
+
+
+class JobQueue:
+    """Pool of worker processes running the jobs on local QPUs.
+
+    :param qpu_factory: picklable callable returning the QPU of each worker
+    :param max_workers: the number of worker processes, default the number of
+        cores
+    :param max_pending: the maximum number of jobs submitted through
+        :meth:`submit_async` or :meth:`run` and not completed yet, default
+        twice the number of workers. Bounds the memory used by long sweeps.
+        The futures of :meth:`submit` are not bounded
+    """
+
+    def __init__(
+        self,
+        qpu_factory: Callable,
+        max_workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+    ):
+        self.qpu_factory = qpu_factory
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.max_workers
+        self._executor: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        # One per event loop
+        self._semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    @property
+    def executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        if self._executor is None:
+            LOGGER.debug("Starting %d workers", self.max_workers)
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                self.max_workers,
+                initializer=_init_worker,
+                initargs=(self.qpu_factory,),
+            )
+        return self._executor
+
+    def submit(self, job: "Job") -> concurrent.futures.Future:
+        """Submit a job, returning the future of its result."""
+        return self.executor.submit(_run_job, job)
+
+    async def submit_async(self, job: "Job") -> "Result":
+        """Submit a job and wait for its result, without blocking the event
+        loop. At most max_pending jobs are in the queue at the same time."""
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            # A semaphore which has waited refers to its loop, which is then
+            # never collected: drop the closed loops, f.e. of asyncio.run
+            for closed in [lp for lp in self._semaphores if lp.is_closed()]:
+                del self._semaphores[closed]
+            self._semaphores[loop] = asyncio.Semaphore(self.max_pending)
+        async with self._semaphores[loop]:
+            return await asyncio.wrap_future(self.submit(job))
+
+    async def gather(self, jobs: Iterable["Job"]) -> List["Result"]:
+        """Run all the jobs, returning their results in the same order."""
+        return await asyncio.gather(*(self.submit_async(job) for job in jobs))
+
+    def run(self, jobs: Iterable["Job"]) -> List["Result"]:
+        """Blocking version of :meth:`gather`."""
+        futures = []
+        pending = set()
+        for job in jobs:
+            if len(pending) >= self.max_pending:
+                _, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+            future = self.submit(job)
+            futures.append(future)
+            pending.add(future)
+        return [future.result() for future in futures]
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait)
+            self._executor = None
+        self._semaphores.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
@@ -0,0 +1,275 @@
+"""Classical simulator for reversible circuits.
+
+Circuits made only of X, CNOT, CCNOT, SWAP and their multi-controlled versions
+map computational basis states to computational basis states, so they can be
+simulated by keeping one classical bit per qubit. The simulation is linear in
+the number of gates, regardless of the number of qubits, so it can be used to
+check circuits (e.g. the 64-bit FPC or full-size GJISD) that no statevector
+backend can hold.
+
+The same operations can be run in batch, bit-sliced mode: each qubit holds
+one uint64 word for every 64 classical inputs, and each gate becomes a
+handful of bitwise NumPy operations over all the inputs at once (see
+:meth:`RProgram.run_batch`).
+
+All the gates are taken from :meth:`~qat.core.Circuit.iterate_simple`, so
+boxed routines, daggers, controls and ancillae are resolved by the QLM itself.
+"""
+import logging
+from typing import (
+    TYPE_CHECKING,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from qat.core.wrappers.circuit import Circuit
+
+LOGGER = logging.getLogger(__name__)
+
+# Opcodes of the reversible operations
+OP_X = 0
+OP_SWAP = 1
+OP_RESET = 2
+
+# Number of controls already included in the name of the base gate
+_BASE_GATES = {
+    "X": (OP_X, 0),
+    "CNOT": (OP_X, 1),
+    "CCNOT": (OP_X, 2),
+    "SWAP": (OP_SWAP, 0),
+}
+# Gates that do nothing on a basis state
+_IGNORED = {"I", "MEASURE", "BREAK", "LOCK", "RELEASE", "LOGIC"}
+
+
+class ROp(NamedTuple):
+    """A reversible operation, i.e. a (multi-)controlled X or SWAP.
+
+    - opcode: one of OP_X, OP_SWAP, OP_RESET
+    - ctrls: the indexes of the control qubits
+    - targets: the indexes of the target qubits (1 for X, 2 for SWAP, any
+      number for RESET)
+    """
+
+    opcode: int
+    ctrls: Tuple[int, ...]
+    targets: Tuple[int, ...]
+
+
+class RBits(bytearray):
+    """The classical state of the qubits, one byte (0 or 1) per qubit."""
+
+    _TO01 = bytes.maketrans(b"\x00\x01", b"01")
+
+    def to01(self) -> str:
+        """Return the state as a bitstring, qubit 0 being the leftmost."""
+        return self.translate(self._TO01).decode()
+
+
+def decode_gate(name: str, qbits: List[int]) -> ROp:
+    """Translate a gate as yielded by `iterate_simple` into an :class:`ROp`.
+
+    :raises ValueError: if the gate is not a classical reversible one
+    """
+    nctrls = 0
+    base = name
+    while True:
+        if base.startswith("C-"):
+            nctrls += 1
+            base = base[2:]
+        elif base.startswith("D-"):
+            # All the supported gates are self-inverse
+            base = base[2:]
+        else:
+            break
+    try:
+        opcode, base_ctrls = _BASE_GATES[base]
+    except KeyError:
+        raise ValueError(f"Gate {name} is not a reversible classical gate")
+    nctrls += base_ctrls
+    return ROp(opcode, tuple(qbits[:nctrls]), tuple(qbits[nctrls:]))
+
+
+def decode_circuit(circuit: "Circuit") -> List[ROp]:
+    """Translate a circuit into the list of its reversible operations.
+
+    :raises ValueError: if the circuit contains a non-reversible gate
+    """
+    ops = []
+    for instr in circuit.iterate_simple():
+        name = instr[0]
+        if name == "RESET":
+            ops.append(ROp(OP_RESET, (), tuple(instr[1])))
+        elif name in _IGNORED:
+            continue
+        else:
+            ops.append(decode_gate(name, instr[2]))
+    return ops
+
+
+def run_ops(ops: Iterable[ROp], rbits: RBits) -> RBits:
+    """Apply the operations to the classical state, in place."""
+    for opcode, ctrls, targets in ops:
+        if ctrls and not all(rbits[c] for c in ctrls):
+            continue
+        if opcode == OP_X:
+            rbits[targets[0]] ^= 1
+        elif opcode == OP_SWAP:
+            a, b = targets
+            rbits[a], rbits[b] = rbits[b], rbits[a]
+        else:
+            for t in targets:
+                rbits[t] = 0
+    return rbits
+
+
+def pack_bits(bits: np.ndarray) -> np.ndarray:
+    """Pack a (batch x nbqbits) array of 0/1 into a (nbqbits x nwords) uint64
+    array, where bit i of word w of a qubit is the value of the qubit in input
+    64 * w + i. Inputs are padded with zeros up to a multiple of 64.
+    """
+    bits = np.asarray(bits, dtype=np.uint8)
+    batch, nbqbits = bits.shape
+    nwords = -(-batch // 64)
+    packed = np.zeros((nbqbits, nwords * 8), dtype=np.uint8)
+    packed[:, : -(-batch // 8)] = np.packbits(bits.T, axis=1, bitorder="little")
+    return packed.view("<u8")
+
+
+def unpack_bits(words: np.ndarray, batch: int) -> np.ndarray:
+    """Inverse of :func:`pack_bits`, returns a (batch x nbqbits) uint8 array."""
+    bits = np.unpackbits(
+        np.ascontiguousarray(words, dtype="<u8").view(np.uint8),
+        axis=1,
+        count=batch,
+        bitorder="little",
+    )
+    return bits.T
+
+
+def pack_ints(values: Sequence[int], nbits: int) -> np.ndarray:
+    """Pack a batch of integers into a (nbits x nwords) uint64 array. Row j
+    contains bit j (LSB first) of each integer, i.e. the rows are in little
+    endian order w.r.t. the integers.
+    """
+    values = np.asarray(values, dtype=np.int64)
+    nwords = -(-len(values) // 64)
+    words = np.zeros((nbits, nwords * 8), dtype=np.uint8)
+    for j in range(nbits):
+        bits = ((values >> j) & 1).astype(np.uint8)
+        words[j, : -(-len(values) // 8)] = np.packbits(bits, bitorder="little")
+    return words.view("<u8")
+
+
+def unpack_ints(words: np.ndarray, batch: int) -> np.ndarray:
+    """Inverse of :func:`pack_ints`, returns an int64 array of length batch."""
+    bits = unpack_bits(words, batch).astype(np.int64)
+    return bits @ (np.int64(1) << np.arange(bits.shape[1], dtype=np.int64))
+
+
+def run_ops_batch(ops: Iterable[ROp], words: np.ndarray) -> np.ndarray:
+    """Apply the operations to a (nbqbits x nwords) uint64 bit-sliced state,
+    in place.
+    """
+    mask = np.empty(words.shape[1], dtype=words.dtype)
+    diff = np.empty_like(mask)
+    for opcode, ctrls, targets in ops:
+        if opcode == OP_RESET:
+            words[list(targets)] = 0
+            continue
+        if ctrls:
+            np.copyto(mask, words[ctrls[0]])
+            for c in ctrls[1:]:
+                np.bitwise_and(mask, words[c], out=mask)
+        if opcode == OP_X:
+            row = words[targets[0]]
+            if ctrls:
+                np.bitwise_xor(row, mask, out=row)
+            else:
+                np.invert(row, out=row)
+        else:
+            row_a, row_b = words[targets[0]], words[targets[1]]
+            np.bitwise_xor(row_a, row_b, out=diff)
+            if ctrls:
+                np.bitwise_and(diff, mask, out=diff)
+            np.bitwise_xor(row_a, diff, out=row_a)
+            np.bitwise_xor(row_b, diff, out=row_b)
+    return words
+
+
+class RProgram:
+    """A reversible program, i.e. a list of :class:`ROp` acting on a classical
+    state of nbqbits bits.
+
+    The usual entry point is :meth:`circuit_to_rprogram`, which decodes the
+    circuit and runs it from the all-zero state; the final state is then
+    available in :attr:`rbits`.
+    """
+
+    def __init__(self, nbqbits: int, ops: List[ROp]):
+        self.nbqbits = nbqbits
+        self.ops = ops
+        self.rbits = RBits(nbqbits)
+
+    @classmethod
+    def circuit_to_rprogram(
+        cls, circuit: "Circuit", initial: Optional[Iterable[int]] = None
+    ) -> "RProgram":
+        """Decode and simulate the circuit.
+
+        :param circuit: a circuit made only of X, SWAP and (multi-)controlled
+            X/SWAP gates
+        :param initial: the initial value of the qubits, default all 0
+        :returns: the RProgram, with rbits containing the final state
+        """
+        rpr = cls(circuit.nbqbits, decode_circuit(circuit))
+        LOGGER.debug("%d qubits, %d ops", rpr.nbqbits, len(rpr.ops))
+        rpr.run(initial)
+        return rpr
+
+    def run(self, initial: Optional[Iterable[int]] = None) -> RBits:
+        """Run the program starting from the initial state (default all 0)."""
+        self.rbits = RBits(self.nbqbits) if initial is None else RBits(initial)
+        if len(self.rbits) != self.nbqbits:
+            raise ValueError(
+                f"Initial state has {len(self.rbits)} bits, expected {self.nbqbits}"
+            )
+        return run_ops(self.ops, self.rbits)
+
+    def run_batch(self, inputs: np.ndarray) -> np.ndarray:
+        """Run the program over a batch of initial states at once.
+
+        :param inputs: a (batch x nbqbits) array of 0/1, one initial state per
+            row
+        :returns: a (batch x nbqbits) uint8 array with the final states
+        """
+        inputs = np.asarray(inputs)
+        if inputs.ndim != 2 or inputs.shape[1] != self.nbqbits:
+            raise ValueError(
+                f"Inputs have shape {inputs.shape}, expected (batch, {self.nbqbits})"
+            )
+        words = self.run_words(pack_bits(inputs))
+        return unpack_bits(words, inputs.shape[0])
+
+    def run_words(self, words: np.ndarray) -> np.ndarray:
+        """Run the program, in place, over a bit-sliced state as produced by
+        :func:`pack_bits`. Useful when the batch is too big to be expanded to
+        one byte per qubit, f.e. when the registers are set with
+        :func:`pack_ints`.
+        """
+        if words.shape[0] != self.nbqbits:
+            raise ValueError(
+                f"State has {words.shape[0]} qubits, expected {self.nbqbits}"
+            )
+        return run_ops_batch(self.ops, words)
+
+    def new_words(self, batch: int) -> np.ndarray:
+        """Return an all-zero bit-sliced state for batch inputs."""
+        return np.zeros((self.nbqbits, -(-batch // 64)), dtype="<u8")
@@ -0,0 +1,358 @@
+"""Sparse statevector simulator for "superposition then reversible" circuits.
+
+The ISD circuits prepare a superposition of C(n, k) basis states with
+:func:`~qat.external.qroutines.hamming_weight_generate.bartschiE19.generate`,
+then apply only classical permutations (sorting network, column moves, GJISD,
+FPC). A dense statevector needs 2^nbqbits amplitudes, while the state of these
+circuits is never supported on more than C(n, k) basis states.
+
+:class:`SparseState` keeps only the support: one row of bits for each basis
+state with a non-zero amplitude, and the amplitudes. The runs of reversible
+gates are applied in bulk to all the support at once, bit-sliced as in
+:func:`~qat.external.qpus.reversible.run_ops_batch`. The other (multi-)
+controlled single qubit gates, f.e. the controlled RY of the Dicke state
+preparation, split each basis state in (at most) two, and the duplicates are
+merged afterwards.
+
+:class:`SparseQPU` wraps the simulation into a QPU, so that it can be used as
+a stand-in of the statevector ones, f.e. by the tests with
+SIMULATOR=sparse.
+"""
+import logging
+from typing import TYPE_CHECKING, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from qat.comm.datamodel.ttypes import ComplexNumber
+from qat.comm.exceptions.ttypes import ErrorType, QPUException
+from qat.comm.shared.ttypes import ProcessingType
+from qat.core.qpu import QPUHandler
+from qat.core.wrappers.result import Result, Sample, aggregate_data
+from qat.external.qpus.reversible import (
+    OP_RESET,
+    ROp,
+    decode_gate,
+    pack_bits,
+    run_ops_batch,
+    unpack_bits,
+)
+
+if TYPE_CHECKING:
+    from qat.core.wrappers.circuit import Circuit
+    from qat.core.wrappers.job import Job
+
+LOGGER = logging.getLogger(__name__)
+
+# Amplitudes whose squared modulus is below this value are dropped
+DEFAULT_THRESHOLD = 1e-24
+
+_SQRT1_2 = 1 / np.sqrt(2)
+# Gates that do nothing on the state
+_IGNORED = {"I", "BREAK", "LOCK", "RELEASE", "LOGIC"}
+
+
+def _rx(theta: float) -> np.ndarray:
+    c, s = np.cos(theta / 2), np.sin(theta / 2)
+    return np.array([[c, -1j * s], [-1j * s, c]])
+
+
+def _ry(theta: float) -> np.ndarray:
+    c, s = np.cos(theta / 2), np.sin(theta / 2)
+    return np.array([[c, -s], [s, c]], dtype=complex)
+
+
+def _rz(theta: float) -> np.ndarray:
+    return np.diag([np.exp(-0.5j * theta), np.exp(0.5j * theta)])
+
+
+def _ph(theta: float) -> np.ndarray:
+    return np.diag([1, np.exp(1j * theta)])
+
+
+_MATRICES = {
+    "H": lambda: np.array([[_SQRT1_2, _SQRT1_2], [_SQRT1_2, -_SQRT1_2]], complex),
+    "Y": lambda: np.array([[0, -1j], [1j, 0]]),
+    "Z": lambda: np.diag([1, -1]).astype(complex),
+    "S": lambda: np.diag([1, 1j]),
+    "T": lambda: np.diag([1, np.exp(0.25j * np.pi)]),
+    "RX": _rx,
+    "RY": _ry,
+    "RZ": _rz,
+    "PH": _ph,
+}
+
+
+class UOp:
+    """A (multi-)controlled single qubit gate.
+
+    :param matrix: the 2 x 2 unitary matrix
+    :param ctrls: the indexes of the control qubits
+    :param target: the index of the target qubit
+    """
+
+    __slots__ = ("matrix", "ctrls", "target")
+
+    def __init__(self, matrix: np.ndarray, ctrls: Tuple[int, ...], target: int):
+        self.matrix = matrix
+        self.ctrls = ctrls
+        self.target = target
+
+    def __repr__(self) -> str:
+        return f"UOp(ctrls={self.ctrls}, target={self.target})"
+
+
+def decode_unitary(name: str, params: List[float], qbits: List[int]) -> UOp:
+    """Translate a gate as yielded by `iterate_simple` into a :class:`UOp`.
+
+    :raises ValueError: if the gate is not a (controlled) single qubit gate
+    """
+    nctrls = 0
+    dagger = False
+    base = name
+    while True:
+        if base.startswith("C-"):
+            nctrls += 1
+            base = base[2:]
+        elif base.startswith("D-"):
+            dagger = not dagger
+            base = base[2:]
+        else:
+            break
+    if base not in _MATRICES:
+        raise ValueError(f"Gate {name} is not supported by the sparse simulator")
+    matrix = np.asarray(_MATRICES[base](*params), dtype=complex)
+    if dagger:
+        matrix = matrix.conj().T
+    if len(qbits) != nctrls + 1:
+        raise ValueError(f"Gate {name} is not a single qubit gate")
+    return UOp(matrix, tuple(qbits[:nctrls]), qbits[nctrls])
+
+
+def decode_circuit(circuit: "Circuit") -> List[Union[List[ROp], UOp]]:
+    """Translate a circuit into the list of its operations, where consecutive
+    reversible gates are grouped into lists of :class:`ROp`.
+
+    :raises ValueError: if the circuit contains a gate that is neither
+        reversible nor a (controlled) single qubit gate, or an intermediate
+        measurement or reset
+    """
+    ops: List[Union[List[ROp], UOp]] = []
+    for name, params, qbits in circuit.iterate_simple():
+        if name in _IGNORED:
+            continue
+        if name in ("MEASURE", "RESET"):
+            raise ValueError("Intermediate measurements are not supported")
+        try:
+            rop = decode_gate(name, qbits)
+        except ValueError:
+            ops.append(decode_unitary(name, params, qbits))
+            continue
+        if not ops or isinstance(ops[-1], UOp):
+            ops.append([])
+        ops[-1].append(rop)
+    return ops
+
+
+class SparseState:
+    """A state given by its support.
+
+    :param bits: the (support x nbqbits) uint8 array of the basis states, one
+        per row, the value of qubit q being in column q
+    :param amplitudes: the amplitude of each basis state
+    """
+
+    def __init__(self, bits: np.ndarray, amplitudes: np.ndarray):
+        if bits.ndim != 2 or bits.shape[0] != len(amplitudes):
+            raise ValueError(
+                f"{bits.shape} basis states for {len(amplitudes)} amplitudes"
+            )
+        self.bits = bits
+        self.amplitudes = amplitudes
+
+    @classmethod
+    def basis(cls, nbqbits: int, initial: Optional[Iterable[int]] = None):
+        """The basis state with the given qubit values, default all 0."""
+        bits = np.zeros((1, nbqbits), dtype=np.uint8)
+        if initial is not None:
+            bits[0] = list(initial)
+        return cls(bits, np.ones(1, dtype=complex))
+
+    @property
+    def nbqbits(self) -> int:
+        return self.bits.shape[1]
+
+    def __len__(self) -> int:
+        return len(self.amplitudes)
+
+    def apply_reversible(self, ops: List[ROp]):
+        """Apply reversible operations to all the basis states at once."""
+        if any(op.opcode == OP_RESET for op in ops):
+            raise ValueError("Resets are not supported")
+        words = run_ops_batch(ops, pack_bits(self.bits))
+        self.bits = np.ascontiguousarray(unpack_bits(words, len(self)))
+
+    def apply_unitary(self, op: UOp, threshold: float = DEFAULT_THRESHOLD):
+        """Apply a (controlled) single qubit gate. Each basis state satisfying
+        the controls is replaced by its two images, then the duplicates are
+        merged and the amplitudes below the threshold dropped."""
+        if op.ctrls:
+            active = self.bits[:, op.ctrls].all(axis=1)
+        else:
+            active = np.ones(len(self), dtype=bool)
+        values = self.bits[active, op.target]
+        if not values.size:
+            return
+        amps = self.amplitudes[active]
+        if op.matrix[0, 1] == 0 and op.matrix[1, 0] == 0:
+            # Diagonal gates only change the amplitudes
+            self.amplitudes[active] = amps * op.matrix[values, values]
+            return
+        zeros = self.bits[active]
+        zeros[:, op.target] = 0
+        ones = zeros.copy()
+        ones[:, op.target] = 1
+        self.bits = np.concatenate((self.bits[~active], zeros, ones))
+        self.amplitudes = np.concatenate(
+            (
+                self.amplitudes[~active],
+                op.matrix[0, values] * amps,
+                op.matrix[1, values] * amps,
+            )
+        )
+        self._merge(threshold)
+
+    def _merge(self, threshold: float):
+        keys = np.packbits(self.bits, axis=1)
+        keys = np.ascontiguousarray(keys).view(np.dtype((np.void, keys.shape[1])))
+        _, first, inverse = np.unique(
+            keys.ravel(), return_index=True, return_inverse=True
+        )
+        amplitudes = np.zeros(len(first), dtype=complex)
+        np.add.at(amplitudes, inverse.ravel(), self.amplitudes)
+        keep = np.abs(amplitudes) ** 2 > threshold
+        self.bits = self.bits[first[keep]]
+        self.amplitudes = amplitudes[keep]
+
+    def probabilities(self) -> np.ndarray:
+        return np.abs(self.amplitudes) ** 2
+
+    def states(self, qubits: Optional[List[int]] = None) -> List[int]:
+        """The basis states as integers, the first qubit being the most
+        significant bit.
+
+        :param qubits: the qubits to read, default all of them
+        """
+        bits = self.bits if qubits is None else self.bits[:, qubits]
+        nbits = bits.shape[1]
+        shift = -nbits % 8
+        return [
+            int.from_bytes(row.tobytes(), "big") >> shift
+            for row in np.packbits(bits, axis=1)
+        ]
+
+    def marginal(self, qubits: List[int]) -> Tuple[List[int], np.ndarray]:
+        """The probability distribution of the given qubits.
+
+        :returns: the states (in the order of :meth:`states`) and their
+            probabilities
+        """
+        bits = np.ascontiguousarray(self.bits[:, qubits])
+        keys = np.packbits(bits, axis=1)
+        keys = np.ascontiguousarray(keys).view(np.dtype((np.void, keys.shape[1])))
+        _, first, inverse = np.unique(
+            keys.ravel(), return_index=True, return_inverse=True
+        )
+        probs = np.zeros(len(first))
+        np.add.at(probs, inverse.ravel(), self.probabilities())
+        return SparseState(bits[first], np.ones(len(first))).states(), probs
+
+
+def simulate(
+    circuit: "Circuit",
+    initial: Optional[Iterable[int]] = None,
+    threshold: float = DEFAULT_THRESHOLD,
+) -> SparseState:
+    """Simulate the circuit from a basis state.
+
+    :param circuit: the circuit
+    :param initial: the initial value of the qubits, default all 0
+    :param threshold: amplitudes whose squared modulus is below this value are
+        dropped
+    """
+    state = SparseState.basis(circuit.nbqbits, initial)
+    for op in decode_circuit(circuit):
+        if isinstance(op, UOp):
+            state.apply_unitary(op, threshold)
+        else:
+            state.apply_reversible(op)
+    LOGGER.debug("%d qubits, support of %d states", state.nbqbits, len(state))
+    return state
+
+
+class SparseQPU(QPUHandler):
+    """QPU simulating the circuits with :func:`simulate`.
+
+    Only sampling jobs are supported. With nbshots == 0 the whole
+    distribution is returned, like the statevector simulators do.
+
+    :param threshold: amplitudes whose squared modulus is below this value are
+        dropped
+    :param seed: the seed used to draw the shots
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, seed=None):
+        super().__init__()
+        self.threshold = threshold
+        self._rng = np.random.default_rng(seed)
+
+    def submit_job(self, job: "Job") -> Result:
+        if job.type != ProcessingType.SAMPLE:
+            raise QPUException(
+                ErrorType.INVALID_ARGS, "sparse", "Only sampling is supported"
+            )
+        try:
+            state = simulate(job.circuit, threshold=self.threshold)
+        except ValueError as exc:
+            raise QPUException(ErrorType.INVALID_ARGS, "sparse", str(exc))
+        nbqbits = job.circuit.nbqbits
+        qubits = list(range(nbqbits)) if job.qubits is None else list(job.qubits)
+        threshold = (job.amp_threshold or 0.0) ** 2
+
+        result = Result()
+        result.meta_data = {}
+        result.raw_data = []
+        if qubits == list(range(nbqbits)):
+            states = state.states()
+            amplitudes = state.amplitudes
+            probabilities = state.probabilities()
+        else:
+            states, probabilities = state.marginal(qubits)
+            amplitudes = None
+        # Same order of the statevector simulators
+        order = sorted(range(len(states)), key=states.__getitem__)
+        states = [states[i] for i in order]
+        probabilities = probabilities[order]
+        if amplitudes is not None:
+            amplitudes = amplitudes[order]
+
+        if job.nbshots == 0:
+            for i, (int_state, prob) in enumerate(zip(states, probabilities)):
+                if prob <= threshold:
+                    continue
+                amplitude = None
+                if amplitudes is not None:
+                    amplitude = ComplexNumber(
+                        re=amplitudes[i].real, im=amplitudes[i].imag
+                    )
+                result.raw_data.append(
+                    Sample(state=int_state, amplitude=amplitude, probability=prob)
+                )
+            return result
+
+        shots = self._rng.choice(
+            len(states), job.nbshots, p=probabilities / probabilities.sum()
+        )
+        for idx in shots:
+            result.raw_data.append(Sample(state=states[idx]))
+        if job.aggregate_data:
+            result = aggregate_data(result)
+        return result
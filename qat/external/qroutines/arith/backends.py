@@ -0,0 +1,127 @@
+"""Registry of the adder backends.
+
+:mod:`qat.external.qroutines.arith` declares the abstract MADD gate; each
+backend implements it with the same signature (a_l, b_l, overflow_qbit,
+little_endian) and the same wires (a, b, cout if overflow_qbit), so the
+arithmetic consumers (f.e. :mod:`~qat.external.qroutines.hamming_weight_compute.
+fpc`) can take the name of the backend instead of importing one of them:
+
+- cuccaro: ripple adder, 1 ancilla, Toffoli depth ~2n
+- tkk: Takahashi-Tani-Kunihiro ripple adder, no ancillae, Toffoli depth ~2n
+- cla: carry-lookahead adder, ~2n ancillae, Toffoli depth O(log n)
+
+Instead of a name, the consumers can pass a cost model (see :data:`COSTS`),
+and the cheapest backend is selected for each register length, using the
+analytic resources of the backends.
+"""
+import functools
+import logging
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from qat.external.qroutines.arith import cla_arith, cuccaro_arith, tkk_arith
+from qat.external.utils.resources import Resources
+
+LOGGER = logging.getLogger(__name__)
+
+
+class AdderBackend(NamedTuple):
+    """An adder implementation.
+
+    - adder: the gate, f.e. `adder(a_l, b_l, overflow_qbit, little_endian)`
+    - resources: the analytic resources of the gate,
+      `resources(a_l, b_l, overflow_qbit, track_depth, tracker)`
+    - track: replay the gates of the adder (little endian, a_l == b_l) on a
+      Resources, `track(res, a, b, cout)` with cout None if there is no
+      overflow qubit. The ancillae are allocated and released on res
+    """
+
+    name: str
+    adder: Callable
+    resources: Callable[..., Resources]
+    track: Callable[[Resources, Sequence[int], Sequence[int], Optional[int]], None]
+
+
+# Cost models, the backend with the smallest key is selected
+COSTS: Dict[str, Callable[[Resources], Tuple]] = {
+    "qubits": lambda res: (res.qubits, res.toffoli_depth),
+    "depth": lambda res: (res.toffoli_depth, res.qubits),
+}
+
+_BACKENDS: Dict[str, AdderBackend] = {}
+
+
+def register_adder(backend: AdderBackend):
+    """Add a backend, replacing the one with the same name if any."""
+    if backend.name in COSTS:
+        raise ValueError(f"{backend.name} is the name of a cost model")
+    _BACKENDS[backend.name] = backend
+    select_adder.cache_clear()
+
+
+def adder_names() -> List[str]:
+    return list(_BACKENDS)
+
+
+def get_adder(name: str) -> AdderBackend:
+    try:
+        return _BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown adder {name}, expected one of {adder_names()} or a cost "
+            f"model in {list(COSTS)}"
+        ) from None
+
+
+@functools.lru_cache(maxsize=None)
+def select_adder(
+    bits: int, overflow_qbit: bool = True, cost: Union[str, Callable] = "qubits"
+) -> AdderBackend:
+    """The cheapest backend for two bits-long registers. Ties are broken by
+    the order of registration.
+
+    :param cost: the name of a cost model in :data:`COSTS`, or a function
+        returning the (sortable) cost of a Resources
+    """
+    key = COSTS[cost] if isinstance(cost, str) else cost
+    best = min(
+        _BACKENDS.values(),
+        key=lambda backend: key(backend.resources(bits, bits, overflow_qbit)),
+    )
+    LOGGER.debug("Adder %s selected for %d bits (%s)", best.name, bits, cost)
+    return best
+
+
+def resolve_adder(
+    spec: Union[str, Callable], bits: int, overflow_qbit: bool = True
+) -> AdderBackend:
+    """The backend named spec, or the one selected by the cost model spec."""
+    if callable(spec) or spec in COSTS:
+        return select_adder(bits, overflow_qbit, spec)
+    return get_adder(spec)
+
+
+def _cuccaro_track(res: Resources, a, b, cout):
+    if len(a) == 1 and cout is None:
+        # cin is the last wire and it is not used, so it's not allocated
+        cuccaro_arith._adder_track(res, a, b, None, cout)
+        return
+    cin = res.new_ancillae(1)[0]
+    cuccaro_arith._adder_track(res, a, b, cin, cout)
+    res.release_ancillae([cin])
+
+
+register_adder(
+    AdderBackend(
+        "cuccaro", cuccaro_arith.adder, cuccaro_arith.adder_resources, _cuccaro_track
+    )
+)
+register_adder(
+    AdderBackend(
+        "tkk", tkk_arith.adder, tkk_arith.adder_resources, tkk_arith._adder_track
+    )
+)
+register_adder(
+    AdderBackend(
+        "cla", cla_arith.adder, cla_arith.adder_resources, cla_arith._adder_track
+    )
+)
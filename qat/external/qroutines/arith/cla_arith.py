@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""In-place carry-lookahead adder based on [DKRS04] Draper, Thomas G. ;
+Kutin, Samuel A. ; Rains, Eric M. ; Svore, Krysta M.: A logarithmic-depth
+quantum carry-lookahead adder. quant-ph/0406142.
+
+The carries are computed out of place by the P/G/C rounds of the paper, with
+Toffoli depth O(log n), and added to b. Then they are uncomputed by running the
+same network on a and the complement of the sum, since the carry into bit i of
+a + ~s is equal to the one of a + b.
+
+Compared to the ripple adders, it trades O(n) ancillae (the n - 1 carries and
+the propagate bits of the tree) for the logarithmic depth.
+"""
+
+import logging
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from qat.external.utils.cache import cached_routine
+from qat.external.utils.resources import Resources
+from qat.lang.AQASM.gates import CCNOT, CNOT, X
+from qat.lang.AQASM.misc import build_gate
+from qat.lang.AQASM.routines import QRoutine
+
+LOGGER = logging.getLogger(__name__)
+
+_GATES = {"X": X, "CNOT": CNOT, "CCNOT": CCNOT}
+
+
+def _log2(n: int) -> int:
+    """floor(log2(n)), 0 for n < 1."""
+    return max(n.bit_length() - 1, 0)
+
+
+def get_required_ancillae(bits: int, overflow_qbit: bool = False) -> Tuple[int, int]:
+    """The ancillae of an adder of two bits-long registers.
+
+    :returns: the number of carries and the number of propagate bits
+    """
+    m = bits if overflow_qbit else bits - 1
+    props = sum((m >> t) - 1 for t in range(1, _log2(m)))
+    return max(bits - 1, 0), props
+
+
+def _propagates(b: Sequence, props: Sequence) -> List[List]:
+    """Split the propagate ancillae in the rounds of the tree: P[t][k], for
+    1 <= k < m / 2^t, covers bits [2^t k, 2^t (k + 1)). P[0] is b itself."""
+    m = len(b)
+    rounds = [list(b)]
+    pos = 0
+    for t in range(1, _log2(m)):
+        size = (m >> t) - 1
+        # P[t][0] is never used
+        rounds.append([None] + list(props[pos : pos + size]))
+        pos += size
+    return rounds
+
+
+def _p_rounds(p: List[List]) -> Iterator[Tuple[str, tuple]]:
+    for t in range(1, len(p)):
+        for k in range(1, len(p[t])):
+            yield "CCNOT", (p[t - 1][2 * k], p[t - 1][2 * k + 1], p[t][k])
+
+
+def _carries(a: Sequence, b: Sequence, g: Sequence, props: Sequence):
+    """Yield the gates setting g[i] to the carry out of bit i of a + b, i.e.
+    the carry into bit i + 1. a, b and the propagate ancillae are left
+    untouched. The intermediate g[i] are used as controls, so they must be 0,
+    except the last one that is only a target (f.e. the cout)."""
+    m = len(a)
+    # G[j], j = 1..m, is the carry into bit j
+    G = [None] + list(g)
+    p = _propagates(b, props)
+    for i in range(m):
+        yield "CCNOT", (a[i], b[i], G[i + 1])
+    for i in range(m):
+        yield "CNOT", (a[i], b[i])
+    yield from _p_rounds(p)
+    # G rounds
+    for t in range(1, _log2(m) + 1):
+        step, half = 1 << t, 1 << (t - 1)
+        for k in range(m >> t):
+            ctrls = G[step * k + half], p[t - 1][2 * k + 1]
+            yield "CCNOT", ctrls + (G[step * k + step],)
+    # C rounds, t = floor(log2(2m / 3)) .. 1
+    for t in range(_log2(2 * m // 3), 0, -1):
+        step, half = 1 << t, 1 << (t - 1)
+        for k in range(1, (m - half) // step + 1):
+            yield "CCNOT", (G[step * k], p[t - 1][2 * k], G[step * k + half])
+    # P^-1 rounds
+    yield from reversed(list(_p_rounds(p)))
+    for i in range(m):
+        yield "CNOT", (a[i], b[i])
+
+
+def _adder_ops(
+    a: Sequence, b: Sequence, cout, carries: Sequence, props: Sequence
+) -> Iterator[Tuple[str, tuple]]:
+    """Yield the gates of the adder (little endian, len(a) == len(b)). cout is
+    None if there is no overflow qubit."""
+    bits = len(a)
+    if bits == 0:
+        return
+    low = bits - 1
+    # Carries into bits 1..bits - 1, plus the overflow if any
+    g = list(carries) + ([cout] if cout is not None else [])
+    yield from _carries(a[: len(g)], b[: len(g)], g, props)
+    for i in range(bits):
+        yield "CNOT", (a[i], b[i])
+    for i in range(1, bits):
+        yield "CNOT", (carries[i - 1], b[i])
+    # Uncompute the carries with the inverse of the network on a and ~s
+    for i in range(low):
+        yield "X", (b[i],)
+    yield from reversed(list(_carries(a[:low], b[:low], carries, props)))
+    for i in range(low):
+        yield "X", (b[i],)
+
+
+@build_gate("MADD_CLA", [int, int, bool, bool])
+@cached_routine
+def adder(a_l: int, b_l: int, overflow_qbit=False, little_endian=True) -> QRoutine:
+    """|a>|b>(|cout>) -> |a>|a+b>(|cout ^ carry>). Only registers of the same
+    length are supported."""
+    assert a_l == b_l
+    qfun = QRoutine()
+    a = qfun.new_wires(a_l)
+    b = qfun.new_wires(b_l)
+    if not little_endian:
+        a.reverse()
+        b.reverse()
+    cout = qfun.new_wires(1)[0] if overflow_qbit else None
+    n_carries, n_props = get_required_ancillae(a_l, overflow_qbit)
+    carries = qfun.new_wires(n_carries) if n_carries else []
+    props = qfun.new_wires(n_props) if n_props else []
+    if n_carries + n_props:
+        qfun.set_ancillae(*(list(carries) + list(props)))
+    LOGGER.debug("a %s, b %s, cout %s", a, b, cout)
+    for name, qbits in _adder_ops(a, b, cout, carries, props):
+        qfun.apply(_GATES[name], *qbits)
+    return qfun
+
+
+def adder_resources(
+    a_l: int, b_l: int, overflow_qbit=False, track_depth: bool = True, tracker=Resources
+) -> Resources:
+    """Resources of :func:`adder`, without building it.
+
+    :param tracker: the Resources class (or factory) replaying the gates, f.e.
+        an :class:`~qat.external.utils.opstream.OpStreamWriter`
+    """
+    assert a_l == b_l
+    qubits = a_l + b_l + (1 if overflow_qbit else 0)
+    res = tracker(qubits, 0, track_depth)
+    a = list(range(a_l))
+    b = list(range(a_l, a_l + b_l))
+    _adder_track(res, a, b, a_l + b_l if overflow_qbit else None)
+    return res
+
+
+def _adder_track(res: Resources, a, b, cout: Optional[int]):
+    """Replay the gates of the adder on the resource tracker, allocating and
+    releasing its ancillae."""
+    n_carries, n_props = get_required_ancillae(len(a), cout is not None)
+    ancillae = res.new_ancillae(n_carries + n_props)
+    for name, qbits in _adder_ops(
+        a, b, cout, ancillae[:n_carries], ancillae[n_carries:]
+    ):
+        res.apply(name, *qbits)
+    res.release_ancillae(ancillae)
@@ -4,6 +4,8 @@
 import itertools
 import logging
 
+from qat.external.utils.cache import cached_routine
+from qat.external.utils.resources import Resources
 from qat.lang.AQASM.gates import CCNOT, CNOT, X
 from qat.lang.AQASM.misc import build_gate
 from qat.lang.AQASM.routines import QRoutine
@@ -76,20 +78,20 @@ def _common(qfun, a, b, cout, bits, overflow_qbit):
 
 def _maj_chain(qfun, a, b, cin, mrange):
     LOGGER.debug("MAJ %d, %d, %d", cin[0], b[0], a[0])
-    qfun.apply(_majority(f"cin, b{0}, a{0}"), cin[0], b[0], a[0])
+    qfun.apply(_majority(), cin[0], b[0], a[0])
     for j in mrange:
         LOGGER.debug("j is %d", j)
         LOGGER.debug("MAJ %d, %d, %d", a[j], b[j + 1], a[j + 1])
-        qfun.apply(_majority(f"a{j}, b{j+1}, a{j+1}"), a[j], b[j + 1], a[j + 1])
+        qfun.apply(_majority(), a[j], b[j + 1], a[j + 1])
 
 
 def _maj_chain_dag(qfun, a, b, cin, mrange):
     for j in reversed(mrange):
         LOGGER.debug("j is %d", j)
         LOGGER.debug("MAJD %d, %d, %d", a[j], b[j + 1], a[j + 1])
-        qfun.apply(_majority(f"a{j}, b{j+1}, a{j+1}").dag(), a[j], b[j + 1], a[j + 1])
+        qfun.apply(_majority().dag(), a[j], b[j + 1], a[j + 1])
     LOGGER.debug("MAJD %d, %d, %d", cin[0], b[0], a[0])
-    qfun.apply(_majority(f"cin, b{0}, a{0}").dag(), cin[0], b[0], a[0])
+    qfun.apply(_majority().dag(), cin[0], b[0], a[0])
 
 
 def _middle_logic(qfun, a, b, cout, end, ends, overflow_qbit, b_is_bigger):
@@ -137,12 +139,13 @@ def _unmaj_chain(qfun, a, b, cin, mrange):
     for j in reversed(mrange):
         LOGGER.debug("j is %d", j)
         LOGGER.debug("UNM %d, %d, %d", a[j], b[j + 1], a[j + 1])
-        qfun.apply(_unmajority(f"a{j}, b{j+1}, a{j+1}"), a[j], b[j + 1], a[j + 1])
+        qfun.apply(_unmajority(), a[j], b[j + 1], a[j + 1])
     LOGGER.debug("UNM %d, %d, %d", cin[0], b[0], a[0])
-    qfun.apply(_unmajority(f"cin, b{0}, a{0}"), cin[0], b[0], a[0])
+    qfun.apply(_unmajority(), cin[0], b[0], a[0])
 
 
 @build_gate("MCOMP", [int, int, bool])
+@cached_routine
 def comparator(a_l: int, b_l: int, little_endian=False) -> QRoutine:
     overflow_qbit = True
     qfun, a, b, cin, cout, bits, b_is_bigger = _common_init(
@@ -164,6 +167,7 @@ def comparator(a_l: int, b_l: int, little_endian=False) -> QRoutine:
 
 
 @build_gate("MSUB", [int, int, bool, bool])
+@cached_routine
 def subtractor(a_l: int, b_l: int, overflow_qbit=False, little_endian=False) -> QRoutine:
     qfun, a, b, cin, cout, bits, b_is_bigger = _common_init(
         a_l, b_l, overflow_qbit, little_endian
@@ -183,6 +187,7 @@ def subtractor(a_l: int, b_l: int, overflow_qbit=False, little_endian=False) ->
 
 
 @build_gate("MADD", [int, int, bool, bool])
+@cached_routine
 def adder(a_l: int, b_l: int, overflow_qbit=False, little_endian=True) -> QRoutine:
     qfun, a, b, cin, cout, bits, b_is_bigger = _common_init(
         a_l, b_l, overflow_qbit, little_endian
@@ -197,10 +202,12 @@ def adder(a_l: int, b_l: int, overflow_qbit=False, little_endian=True) -> QRouti
     return qfun
 
 
-@build_gate("MAJ", [str], arity=lambda _: 3)
-def _majority(name: str) -> QRoutine:
+# MAJ and UMA take no parameters, so that all the ones of a ripple chain share
+# the same definition in the circuit. The qubits they act on are in the debug
+# log of the chains.
+@build_gate("MAJ", [], arity=3)
+def _majority() -> QRoutine:
     """Majority gate."""
-    LOGGER.debug("name %s", name)
     qfun = QRoutine()
     c = qfun.new_wires(1)[0]
     b = qfun.new_wires(1)[0]
@@ -211,10 +218,9 @@ def _majority(name: str) -> QRoutine:
     return qfun
 
 
-@build_gate("UMA", [str], arity=lambda _: 3)
-def _unmajority(name: str) -> QRoutine:
+@build_gate("UMA", [], arity=3)
+def _unmajority() -> QRoutine:
     """Unmajority gate."""
-    LOGGER.debug("name %s", name)
     qfun = QRoutine()
     c = qfun.new_wires(1)[0]
     b = qfun.new_wires(1)[0]
@@ -228,6 +234,74 @@ def _unmajority(name: str) -> QRoutine:
     return qfun
 
 
+def adder_resources(
+    a_l: int, b_l: int, overflow_qbit=False, track_depth: bool = True, tracker=Resources
+) -> Resources:
+    """Resources of :func:`adder`, without building it. Only registers of the
+    same length are supported for now.
+
+    :param tracker: the Resources class (or factory) replaying the gates, f.e.
+        an :class:`~qat.external.utils.opstream.OpStreamWriter`
+    """
+    qubits = a_l + b_l + (1 if overflow_qbit else 0)
+    res = tracker(qubits, 0, track_depth)
+    a = list(range(a_l))
+    b = list(range(a_l, a_l + b_l))
+    cout = a_l + b_l if overflow_qbit else None
+    if a_l == 1 and not overflow_qbit:
+        # cin is the last wire and it is not used, so it's not allocated
+        _adder_track(res, a, b, None, cout)
+        return res
+    cin = res.new_ancillae(1)[0]
+    _adder_track(res, a, b, cin, cout)
+    res.release_ancillae([cin])
+    return res
+
+
+def _adder_track(res: Resources, a, b, cin, cout):
+    """Replay the gates of the adder (little endian, a_l == b_l) on the
+    resource tracker. cout is None if there is no overflow qubit."""
+    # assuming same length for now
+    assert len(a) == len(b)
+    bits = len(a)
+    if bits == 1:
+        res.apply("CNOT", a[0], b[0])
+        if cout is not None:
+            res.apply("X", b[0])
+            res.apply("CCNOT", a[0], b[0], cout)
+            res.apply("X", b[0])
+        return
+    end = bits - 1
+    ends = end if cout is not None else end - 1
+    mrange = range(0, ends)
+    _majority_track(res, cin, b[0], a[0])
+    for j in mrange:
+        _majority_track(res, a[j], b[j + 1], a[j + 1])
+    if cout is not None:
+        res.apply("CNOT", a[ends], cout)
+    else:
+        res.apply("CNOT", a[ends], b[end])
+        res.apply("CNOT", a[end], b[end])
+    for j in reversed(mrange):
+        _unmajority_track(res, a[j], b[j + 1], a[j + 1])
+    _unmajority_track(res, cin, b[0], a[0])
+
+
+def _majority_track(res: Resources, c, b, a):
+    res.apply("CNOT", a, b)
+    res.apply("CNOT", a, c)
+    res.apply("CCNOT", c, b, a)
+
+
+def _unmajority_track(res: Resources, c, b, a):
+    res.apply("X", b)
+    res.apply("CNOT", c, b)
+    res.apply("CCNOT", c, b, a)
+    res.apply("X", b)
+    res.apply("CNOT", a, c)
+    res.apply("CNOT", a, b)
+
+
 # TODO
 @build_gate("HIGH_BIT", [])
 def high_bit_only():
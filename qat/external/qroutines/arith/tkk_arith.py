@@ -9,46 +9,59 @@ In: Quantum Information & Computation Bd. 10 (2010), Nr. 9 & 10, S. 872–890.
 import itertools
 import logging
 
+from qat.external.utils.resources import Resources
 from qat.lang.AQASM.gates import CCNOT, CNOT, X
 from qat.lang.AQASM.misc import build_gate
 from qat.lang.AQASM.routines import QRoutine
 
 LOGGER = logging.getLogger(__name__)
 
-def _adder(qrout, a, b, c_reg, little_endian=False):
-    a_new = a + c_reg
+_GATES = {"X": X, "CNOT": CNOT, "CCNOT": CCNOT}
+
+
+def _adder_ops(a, b, cout=None):
+    """Yield the (name, qubits) of the gates of the adder. If cout is None
+    there is no overflow qubit: the carry is only ever a target, so its gates
+    are dropped, and no ancilla is left dirty."""
+    a_new = list(a) + [cout]
     rlen = len(a)
-    # if not little_endian:
-    #     a_new.reverse()
-    #     b.reverse()
 
     # print("*1*")
     i = None
     for i in range(1, rlen):
-        qrout.apply(CNOT, a[i], b[i])
-    if i is not None:
-        qrout.apply(CNOT, a[i], c_reg)
+        yield "CNOT", (a[i], b[i])
+    if i is not None and cout is not None:
+        yield "CNOT", (a[i], cout)
 
     # print("*2*")
     for i in range(rlen - 1, 1, -1):
-        qrout.apply(CNOT, a[i - 1], a[i])
+        yield "CNOT", (a[i - 1], a[i])
 
     # print("*3*")
-    for i in range(0, rlen):
-        qrout.apply(CCNOT, a[i], b[i], a_new[i + 1])
+    for i in range(0, rlen if cout is not None else rlen - 1):
+        yield "CCNOT", (a[i], b[i], a_new[i + 1])
 
     # print("*4*")
     for i in range(rlen - 1, 0, -1):
-        qrout.apply(CNOT, a[i], b[i])
-        qrout.apply(CCNOT, a[i - 1], b[i - 1], a[i])
+        yield "CNOT", (a[i], b[i])
+        yield "CCNOT", (a[i - 1], b[i - 1], a[i])
 
     # print("*5*")
     for i in range(1, rlen - 1):
-        qrout.apply(CNOT, a[i], a[i + 1])
+        yield "CNOT", (a[i], a[i + 1])
 
     # print("*6*")
     for i in range(0, rlen):
-        qrout.apply(CNOT, a[i], b[i])
+        yield "CNOT", (a[i], b[i])
+
+
+def _adder(qrout, a, b, c_reg, little_endian=False):
+    # if not little_endian:
+    #     a_new.reverse()
+    #     b.reverse()
+    cout = c_reg[0] if c_reg is not None else None
+    for name, qbits in _adder_ops(a, b, cout):
+        qrout.apply(_GATES[name], *qbits)
 
 
 @build_gate("MADD", [int, int, bool, bool])
@@ -59,9 +72,7 @@ def adder(a_len: int, b_len: int, overflow_qubit = False, little_endian=False) -
     qrout = QRoutine()
     a = qrout.new_wires(rlen)
     b = qrout.new_wires(rlen)
-    c_reg = qrout.new_wires(1)
-    if not overflow_qubit:
-        qrout.set_ancillae(c_reg)
+    c_reg = qrout.new_wires(1) if overflow_qubit else None
 
     _adder(qrout, a, b, c_reg, little_endian)
     return qrout
@@ -73,9 +84,7 @@ def subtractor(a_len: int, b_len: int, overflow_qubit = False, little_endian=Fal
     qrout = QRoutine()
     a = qrout.new_wires(rlen)
     b = qrout.new_wires(rlen)
-    c_reg = qrout.new_wires(1)
-    if not overflow_qubit:
-        qrout.set_ancillae(c_reg)
+    c_reg = qrout.new_wires(1) if overflow_qubit else None
 
     for qb in itertools.chain(a):
         qrout.apply(X, qb)
@@ -84,3 +93,26 @@ def subtractor(a_len: int, b_len: int, overflow_qubit = False, little_endian=Fal
     for qb in itertools.chain(a, b):
         qrout.apply(X, qb)
     return qrout
+
+
+def adder_resources(
+    a_l: int, b_l: int, overflow_qbit=False, track_depth: bool = True, tracker=Resources
+) -> Resources:
+    """Resources of :func:`adder`, without building it.
+
+    :param tracker: the Resources class (or factory) replaying the gates, f.e.
+        an :class:`~qat.external.utils.opstream.OpStreamWriter`
+    """
+    assert a_l == b_l
+    res = tracker(a_l + b_l + (1 if overflow_qbit else 0), 0, track_depth)
+    a = list(range(a_l))
+    b = list(range(a_l, a_l + b_l))
+    _adder_track(res, a, b, a_l + b_l if overflow_qbit else None)
+    return res
+
+
+def _adder_track(res: Resources, a, b, cout):
+    """Replay the gates of the adder on the resource tracker. cout is None if
+    there is no overflow qubit."""
+    for name, qbits in _adder_ops(a, b, cout):
+        res.apply(name, *qbits)
@@ -0,0 +1,3 @@
+# Registers the indexes of a pattern refer to: the a qubits or the couts
+SRC_A = 0
+SRC_COUT = 1
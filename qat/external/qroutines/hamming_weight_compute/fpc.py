@@ -1,22 +1,31 @@
 import logging
-from math import ceil, log
-from typing import TYPE_CHECKING
+from functools import partial
+from typing import TYPE_CHECKING, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 from qat.lang.AQASM.routines import QRoutine
 from qat.lang.AQASM.gates import X
 from qat.lang.AQASM.misc import build_gate
 
+from qat.external.utils.ancillae import AncillaPool
 from qat.external.utils.bits import conversion
-from qat.external.qroutines.arith import cuccaro_arith as adder
+from qat.external.utils.cache import FrozenDict, cached_routine
+from qat.external.utils.resources import Resources
+from qat.external.qroutines.arith import backends
 from qat.external.qroutines import qregs_init as qregs
+from qat.external.qroutines.hamming_weight_compute import SRC_A, SRC_COUT, wallace
+from qat.external.synthesis.mctrls import mcx
 
 if TYPE_CHECKING:
-    from qat.lang.AQASM.bits import QRegister
+    from qat.lang.AQASM.bits import QRegister, Qbit
+    from qat.lang.AQASM.program import Program
 
 LOGGER = logging.getLogger(__name__)
 
 
 @build_gate("FPC_WCOM", [int, int, dict])
+@cached_routine
 def get_qroutine_for_qubits_weight(a_len: int, cout_len: int, patterns_dict: dict):
     """QRoutine to compute the hamming weight of a set of qubits.
 
@@ -35,108 +44,174 @@ def get_qroutine_for_qubits_weight(a_len: int, cout_len: int, patterns_dict: dic
     LOGGER.debug("a %s", a_qs)
     LOGGER.debug("cout %s", cout_qs)
 
-    for i in patterns_dict["adders_pattern"]:
-        cout_idx = int(i[-1][1:])
-        half_bits = int((len(i) - 1) / 2)
-        input_qubits = []
-        for j in i:
-            if j[0] == "a":
-                input_qubits.append(a_qs[int(j[1:])])
-            elif j[0] == "c":
-                input_qubits.append(cout_qs[int(j[1:])])
-            else:
-                raise ValueError(
-                    "Invalid data in patterns_dict, has it been generated"
-                    "using the get_pattern() routine?"
-                )
-        tmp_a = [input_qubits[i] for i in range(half_bits)]
-        tmp_b = [input_qubits[i] for i in range(half_bits, 2 * half_bits)] + [
-            cout_qs[cout_idx]
-        ]
+    wires = list(a_qs) + list(cout_qs)
+    for a_idxs, b_idxs, cout_idx in get_adders(patterns_dict):
+        tmp_a = [wires[i] for i in a_idxs]
+        tmp_b = [wires[i] for i in b_idxs] + [wires[cout_idx]]
         LOGGER.debug("%s", tmp_a)
         LOGGER.debug("%s", tmp_b)
 
         # tmp_b - 1 bcz we also added the cout in tmp_b
+        adder = backends.resolve_adder(_adder_spec(patterns_dict), len(tmp_a))
         qfun_add = (~adder.adder)(len(tmp_a), len(tmp_b) - 1, True, True)
         qfun.apply(qfun_add, tmp_a, tmp_b)
     return qfun
 
 
-def get_to_measure_qubits(a_qs: "QRegister", cout_qs: "QRegister", patterns_dict: dict):
-    """It returns the list of qbits containing the final result."""
-    to_measure_qubits = []
-    for j in patterns_dict["results"]:
-        if j[0] == "a":
-            to_measure_qubits.append(a_qs[int(j[1:])])
-        elif j[0] == "c":
-            to_measure_qubits.append(cout_qs[int(j[1:])])
-        else:
-            raise ValueError(
-                "Invalid data in patterns_dict, has it been generated"
-                "using the get_pattern() routine?"
+def get_qroutine_for_qubits_weight_resources(
+    patterns_dict: dict, track_depth: bool = True, tracker=Resources
+) -> Resources:
+    """Resources of :func:`get_qroutine_for_qubits_weight`, without building
+    it.
+
+    :param tracker: the Resources class (or factory) replaying the gates, f.e.
+        an :class:`~qat.external.utils.opstream.OpStreamWriter`
+    """
+    a_len = patterns_dict["n_lines"]
+    cout_len = patterns_dict["n_couts"]
+    res = tracker(a_len + cout_len, cout_len, track_depth)
+    spec = _adder_spec(patterns_dict)
+    for a_idxs, b_idxs, cout_idx in get_adders(patterns_dict):
+        adder = backends.resolve_adder(spec, len(a_idxs))
+        adder.track(res, a_idxs, b_idxs, cout_idx)
+    return res
+
+
+def _adder_spec(patterns_dict: dict) -> str:
+    # The patterns generated before the adder backends use the Cuccaro adder
+    return patterns_dict.get("adder", "cuccaro")
+
+
+def _check_pattern(patterns_dict: dict):
+    if "inputs" not in patterns_dict:
+        raise ValueError(
+            "Invalid data in patterns_dict, has it been generated "
+            "using the get_pattern() routine?"
+        )
+
+
+def _is_wallace(patterns_dict: dict) -> bool:
+    return patterns_dict.get("tree") == wallace.TREE
+
+
+def get_adders(patterns_dict: dict) -> Iterator[Tuple[List[int], List[int], int]]:
+    """Yield, in order, the (a, b, cout) qubits of each adder of the pattern,
+    as indexes of the register made of the a qubits followed by the couts."""
+    _check_pattern(patterns_dict)
+    inputs = patterns_dict["inputs"].astype(np.int64)
+    inputs[patterns_dict["sources"] == SRC_COUT] += patterns_dict["n_lines"]
+    inputs = inputs.tolist()
+    couts = (patterns_dict["couts"] + patterns_dict["n_lines"]).tolist()
+    stage_offsets = patterns_dict["stage_offsets"].tolist()
+    pos = 0
+    for stage in range(len(stage_offsets) - 1):
+        half_bits = stage + 1
+        for k in range(stage_offsets[stage], stage_offsets[stage + 1]):
+            yield (
+                inputs[pos : pos + half_bits],
+                inputs[pos + half_bits : pos + 2 * half_bits],
+                couts[k],
             )
-    return to_measure_qubits
+            pos += 2 * half_bits
+
+
+def get_to_measure_qubits(a_qs: "QRegister", cout_qs: "QRegister", patterns_dict: dict):
+    """It returns the list of qbits containing the final result. The pattern
+    can be a :mod:`.wallace` one too."""
+    if _is_wallace(patterns_dict):
+        return wallace.get_to_measure_qubits(a_qs, cout_qs, patterns_dict)
+    _check_pattern(patterns_dict)
+    regs = (a_qs, cout_qs)
+    return [
+        regs[src][idx]
+        for idx, src in zip(
+            patterns_dict["results"].tolist(),
+            patterns_dict["results_sources"].tolist(),
+        )
+    ]
 
 
-def get_qroutine_for_qubits_weight_get_pattern(n):
+def get_qroutine_for_qubits_weight_get_pattern(n, adder: str = "cuccaro"):
     """Given n bits, it returns a dictionary containing the pattern to compute
     the weight of this n bits, ie:
 
-    #. n_lines: required qubits (>= n, the closest power of 2) #.
-    n_couts, the total number of couts required by the adders #.
-    adders_pattern, the pattern of adders #. results, the bits
-    containing the final results
+    #. n_lines: required qubits (>= n, the closest power of 2)
+    #. n_couts: the total number of couts required by the adders
+    #. inputs, sources: the input qubits of all the adders, one after the
+       other; the adders of stage s have s + 1 qubits for each operand.
+       sources tells whether each index refers to the a qubits (SRC_A) or to
+       the couts (SRC_COUT)
+    #. couts: the cout of each adder
+    #. stage_offsets: the index of the first adder of each stage, plus the
+       total number of adders
+    #. results, results_sources: the bits containing the final results, LSB
+       first
+    #. adder: the adder backend, or the cost model selecting the backend of
+       each stage (see :mod:`~qat.external.qroutines.arith.backends`), f.e.
+       "depth" to trade ancillae for depth in the widest stages
+
+    All the values are numpy arrays of the smallest integer type able to hold
+    the indexes, so that the pattern stays small (and pickles compactly) even
+    for thousands of bits.
     """
-    steps = ceil(log(n, 2))
+    if adder not in backends.COSTS:
+        backends.get_adder(adder)
+    steps = max(n - 1, 0).bit_length()
     # TODO maybe we can use fewer lines
     n_lines = 2**steps
-    patterns_dict = {}
-    patterns_dict["n_lines"] = n_lines
-    patterns_dict["n_couts"] = n_lines - 1
-    couts = ["c{0}".format(i) for i in range(patterns_dict["n_couts"])][::-1]
-    inputs = ["a{0}".format(i) for i in range(patterns_dict["n_lines"])][::-1]
-    LOGGER.debug("inputs %s", inputs)
-    LOGGER.debug("couts %s", couts)
-    patterns_dict["adders_pattern"] = []
-
-    n_adders = n_lines
-    n_inputs_per_adders = 0
-    inputs_next_stage = inputs
+    n_couts = n_lines - 1
+    # The smallest type able to hold the indexes
+    idx_type = np.min_scalar_type(n_lines)
+
+    inputs, sources = [], []
+    stage_offsets = [0]
+    # The bits carried to the next stage, in order
+    cur_idx = np.arange(n_lines, dtype=idx_type)
+    cur_src = np.full(n_lines, SRC_A, dtype=np.uint8)
     for i in range(steps):
-        n_adders = int(n_adders / 2)
-        n_inputs_per_adders += 2
-        outputs_this_stage = []
+        n_adders = n_lines >> (i + 1)
+        n_inputs_per_adders = 2 * (i + 1)
         LOGGER.debug(
             "Stage %d, n_adder %d, n_inputs_per_adder %d",
             i,
             n_adders,
             n_inputs_per_adders,
         )
-        LOGGER.debug("inputs_next_stage %s", inputs_next_stage)
-        for j in range(n_adders):
-            LOGGER.debug("Stage %d, adder %d", i, j)
-            adder_inputs = []
-            for k in range(n_inputs_per_adders):
-                adder_inputs.append(inputs_next_stage.pop())
-            adder_cout = couts.pop()
-            adder_outputs = adder_inputs[
-                int(len(adder_inputs) / 2) : len(adder_inputs)
-            ] + [adder_cout]
-            patterns_dict["adders_pattern"].append(
-                tuple(adder_inputs) + tuple([adder_cout])
+        inputs.append(cur_idx)
+        sources.append(cur_src)
+        adder_couts = np.arange(
+            stage_offsets[-1], stage_offsets[-1] + n_adders, dtype=idx_type
+        )
+        stage_offsets.append(stage_offsets[-1] + n_adders)
+        # The outputs of each adder are its b operand and its cout
+        cur_idx = np.hstack(
+            (cur_idx.reshape(n_adders, -1)[:, i + 1 :], adder_couts[:, None])
+        ).ravel()
+        cur_src = np.hstack(
+            (
+                cur_src.reshape(n_adders, -1)[:, i + 1 :],
+                np.full((n_adders, 1), SRC_COUT, dtype=np.uint8),
             )
-            LOGGER.debug("%s, %s --> %s", adder_inputs, adder_cout, adder_outputs)
-            outputs_this_stage += adder_outputs
-        inputs_next_stage = outputs_this_stage[::-1]
-    LOGGER.debug("adders pattern\n%s", patterns_dict["adders_pattern"])
-    patterns_dict["results"] = inputs_next_stage[::-1]
-    LOGGER.debug("results\n%s", patterns_dict["results"])
-    return patterns_dict
+        ).ravel()
+    patterns_dict = {
+        "n_lines": n_lines,
+        "n_couts": n_couts,
+        "inputs": np.concatenate(inputs or [np.empty(0, idx_type)]),
+        "sources": np.concatenate(sources or [np.empty(0, np.uint8)]),
+        "couts": np.arange(n_couts, dtype=idx_type),
+        "stage_offsets": np.array(stage_offsets, dtype=idx_type),
+        "results": cur_idx,
+        "results_sources": cur_src,
+        "adder": adder,
+    }
+    LOGGER.debug("pattern\n%s", patterns_dict)
+    return FrozenDict(patterns_dict)
 
 
 # def get_qroutine_for_qubits_weight_check(circuit, a_qs, cin_q, cout_qs, eq_q,
 #                                          anc_q, weight_int, patterns_dict):
 @build_gate("FPC_WCHE", [int, int, int, dict, bool])
+@cached_routine
 def get_qroutine_for_qubits_weight_check(
     a_l, cout_l, weight_int, patterns_dict, compute_eq
 ):
@@ -154,6 +229,9 @@ def get_qroutine_for_qubits_weight_check(
     of this function, but also other qubits, as control ones. For example if,
     in addition to the weight being equal to a specific int, we also have to
     check for additional features coming from other parts of the circuit.
+
+    The patterns_dict can be a :func:`.wallace.get_pattern` one too, in which
+    case the weight is computed by the carry-save adders tree.
     """
     circuit = QRoutine()
     a_qs = circuit.new_wires(a_l)
@@ -167,8 +245,11 @@ def get_qroutine_for_qubits_weight_check(
     )
     LOGGER.debug("equal_str %s", equal_str)
 
-    qfun = (~get_qroutine_for_qubits_weight)(a_l, cout_l, patterns_dict)
-    circuit.apply(qfun, a_qs, cout_qs)
+    if _is_wallace(patterns_dict):
+        weight = wallace.get_qroutine_for_qubits_weight
+    else:
+        weight = get_qroutine_for_qubits_weight
+    circuit.apply((~weight)(a_l, cout_l, patterns_dict), a_qs, cout_qs)
     result_qubits = get_to_measure_qubits(a_qs, cout_qs, patterns_dict)
     # We already have the string in little endian, so we don't have to reverse
     # it again
@@ -180,7 +261,55 @@ def get_qroutine_for_qubits_weight_check(
     return circuit
 
 
+def apply_qubits_weight_check(
+    program: "Program",
+    a_qs: Sequence["Qbit"],
+    weight_int: int,
+    eq_q: "Qbit",
+    pool: Optional[AncillaPool] = None,
+    adder: str = "cuccaro",
+    patterns_dict: Optional[dict] = None,
+):
+    """Set eq_q to 1 if the weight of a_qs is weight_int, leaving a_qs
+    untouched, following the compute/uncompute flow of
+    :func:`get_qroutine_for_qubits_weight_check`.
+
+    The padding lines (up to n_lines) and the couts are taken from the pool and
+    released once uncomputed, so that the next routines can reuse them.
+
+    :param pool: the ancilla pool, default a new one
+    :param adder: the adder backend or cost model, see
+        :func:`get_qroutine_for_qubits_weight_get_pattern`
+    :param patterns_dict: the pattern, f.e. a :func:`.wallace.get_pattern` one,
+        default the ripple adders tree built with adder
+    """
+    pool = AncillaPool(program) if pool is None else pool
+    if patterns_dict is None:
+        pattern = get_qroutine_for_qubits_weight_get_pattern(len(a_qs), adder)
+    else:
+        pattern = patterns_dict
+    a_l, cout_l = pattern["n_lines"], pattern["n_couts"]
+    with pool.routine("FPC_WCHE"):
+        padding = pool.get(a_l - len(a_qs))
+        cout_qs = pool.get(cout_l)
+        lines = list(a_qs) + padding
+        check = partial(
+            get_qroutine_for_qubits_weight_check, a_l, cout_l, weight_int, pattern
+        )
+        program.apply(check(True), lines, cout_qs, eq_q)
+        program.apply(check(False).dag(), lines, cout_qs)
+        pool.release(padding + cout_qs)
+
+
 def set_qubit_if_true(a_qs, cout_qs, patterns_dict, eq_q, circuit):
+    """Flip eq_q if all the result qubits are 1. The X controlled by them is
+    made of Toffolis, borrowing the other qubits as dirty ancillae (see
+    :func:`~qat.external.synthesis.mctrls.mcx.mcx`), when they are enough."""
     result_qubits = get_to_measure_qubits(a_qs, cout_qs, patterns_dict)
     ctrls = [qb for qb in result_qubits]
-    circuit.apply(X.ctrl(len(ctrls)), ctrls, eq_q[0])
+    n_anc = mcx.get_required_ancillae(len(ctrls))
+    idle = [qb for qb in list(a_qs) + list(cout_qs) if qb not in ctrls][:n_anc]
+    if n_anc == 0 or len(idle) < n_anc:
+        circuit.apply(X.ctrl(len(ctrls)), ctrls, eq_q[0])
+        return
+    circuit.apply(mcx.mcx(len(ctrls), "dirty"), ctrls, eq_q[0], idle)
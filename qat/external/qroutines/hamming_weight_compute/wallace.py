@@ -0,0 +1,179 @@
+"""Hamming weight computed by a Wallace/Dadda tree of carry-save adders.
+
+The n bits are the column of weight 1 of a sum. The bits of each column are
+grouped by three in full adders (3:2 compressors), the earliest available
+first: the sum stays in the column, in place of the last input, while the carry
+goes to a new cout in the next column. When only two bits are left, a half
+adder reduces them to one, i.e. to a bit of the weight.
+
+Compared to the ripple adders tree of :mod:`.fpc`, n is not padded to a power
+of 2, each compressor needs a single cout and no cin (less than n couts in
+total), and the Toffoli depth is O(log n) instead of O(log^2 n).
+
+The pattern has the same results and results_sources of the one of fpc, so
+that :func:`~qat.external.qroutines.hamming_weight_compute.fpc.
+get_qroutine_for_qubits_weight_check` works on both.
+"""
+import heapq
+import logging
+from typing import TYPE_CHECKING, Iterator, List, Tuple
+
+import numpy as np
+
+from qat.lang.AQASM.routines import QRoutine
+from qat.lang.AQASM.gates import CCNOT, CNOT
+from qat.lang.AQASM.misc import build_gate
+
+from qat.external.utils.cache import FrozenDict, cached_routine
+from qat.external.utils.resources import Resources
+from qat.external.qroutines.hamming_weight_compute import SRC_A, SRC_COUT
+
+if TYPE_CHECKING:
+    from qat.lang.AQASM.bits import QRegister
+
+LOGGER = logging.getLogger(__name__)
+
+# The value of the "tree" key of the patterns
+TREE = "wallace"
+
+_GATES = {"CNOT": CNOT, "CCNOT": CCNOT}
+
+
+def get_pattern(n: int) -> FrozenDict:
+    """Given n bits, it returns a dictionary containing the Wallace tree to
+    compute their weight, ie:
+
+    #. tree: :data:`TREE`
+    #. n_lines: n, no padding is needed
+    #. n_couts: the number of compressors, each one has its own cout
+    #. compressors: the (n_couts x 3) array of the inputs of the compressors,
+       as indexes of the register made of the a qubits followed by the couts.
+       The third input is -1 for the half adders. The sum is left in the last
+       input, the carry in the cout of the compressor
+    #. results, results_sources: the bits containing the final results, LSB
+       first, see :func:`get_to_measure_qubits`
+    """
+    compressors: List[List[int]] = []
+    results = []
+    # The bits of the current column, as (Toffoli depth, index) of the wires
+    column = [(0, i) for i in range(n)]
+    while column:
+        carries = []
+        # The earliest bits first, so that the column is reduced by a tree
+        # as shallow as possible
+        while len(column) > 2:
+            (tx, x), (ty, y), (tz, z) = [heapq.heappop(column) for _ in range(3)]
+            # See _compressor_ops, the third input is needed one step later
+            ready = max(max(tx, ty) + 1, tz) + 1
+            heapq.heappush(column, (ready, z))
+            carries.append((ready, n + len(compressors)))
+            compressors.append([x, y, z])
+        if len(column) == 2:
+            (tx, x), (ty, y) = sorted(column)
+            column = [(max(tx, ty) + 1, y)]
+            carries.append((column[0][0], n + len(compressors)))
+            compressors.append([x, y, -1])
+        results.append(column[0][1])
+        LOGGER.debug("Weight %d, %d carries", len(results) - 1, len(carries))
+        heapq.heapify(carries)
+        column = carries
+    n_couts = len(compressors)
+    idx_type = np.min_scalar_type(-(n + n_couts))
+    results = np.array(results, dtype=np.int64)
+    results_sources = np.where(results < n, SRC_A, SRC_COUT).astype(np.uint8)
+    results[results >= n] -= n
+    patterns_dict = {
+        "tree": TREE,
+        "n_lines": n,
+        "n_couts": n_couts,
+        "compressors": np.array(compressors, dtype=idx_type).reshape(n_couts, 3),
+        "results": results.astype(np.min_scalar_type(max(n, n_couts))),
+        "results_sources": results_sources,
+    }
+    LOGGER.debug("pattern\n%s", patterns_dict)
+    return FrozenDict(patterns_dict)
+
+
+def _check_pattern(patterns_dict: dict):
+    if patterns_dict.get("tree") != TREE:
+        raise ValueError(
+            "Invalid data in patterns_dict, has it been generated "
+            "using the wallace.get_pattern() routine?"
+        )
+
+
+def get_compressors(patterns_dict: dict) -> Iterator[Tuple[List[int], int]]:
+    """Yield, in order, the inputs and the cout of each compressor, as indexes
+    of the register made of the a qubits followed by the couts. The half
+    adders have 2 inputs."""
+    _check_pattern(patterns_dict)
+    n = patterns_dict["n_lines"]
+    for k, comp in enumerate(patterns_dict["compressors"].tolist()):
+        yield [i for i in comp if i >= 0], n + k
+
+
+def _compressor_ops(inputs, cout) -> Iterator[Tuple[str, tuple]]:
+    """Full adder |x>|y>|z>|0> -> |x>|x^y>|x^y^z>|maj(x, y, z)>, or half adder
+    |x>|y>|0> -> |x>|x^y>|x.y>."""
+    x, y = inputs[:2]
+    yield "CCNOT", (x, y, cout)
+    yield "CNOT", (x, y)
+    if len(inputs) == 3:
+        z = inputs[2]
+        yield "CCNOT", (y, z, cout)
+        yield "CNOT", (y, z)
+
+
+@build_gate("WALLACE_WCOM", [int, int, dict])
+@cached_routine
+def get_qroutine_for_qubits_weight(a_len: int, cout_len: int, patterns_dict: dict):
+    """QRoutine to compute the hamming weight of a set of qubits.
+
+    The patterns_dict must be computed in advance by :func:`get_pattern`. The a
+    qubits are modified too, and restored by the dagger of the routine.
+    """
+    assert a_len == patterns_dict["n_lines"]
+    assert cout_len == patterns_dict["n_couts"]
+
+    qfun = QRoutine()
+    a_qs = qfun.new_wires(a_len)
+    cout_qs = qfun.new_wires(cout_len)
+    LOGGER.debug("a %s", a_qs)
+    LOGGER.debug("cout %s", cout_qs)
+
+    wires = list(a_qs) + list(cout_qs)
+    for inputs, cout in get_compressors(patterns_dict):
+        for name, qbits in _compressor_ops(inputs, cout):
+            qfun.apply(_GATES[name], *[wires[i] for i in qbits])
+    return qfun
+
+
+def get_qroutine_for_qubits_weight_resources(
+    patterns_dict: dict, track_depth: bool = True, tracker=Resources
+) -> Resources:
+    """Resources of :func:`get_qroutine_for_qubits_weight`, without building
+    it.
+
+    :param tracker: the Resources class (or factory) replaying the gates, f.e.
+        an :class:`~qat.external.utils.opstream.OpStreamWriter`
+    """
+    a_len = patterns_dict["n_lines"]
+    cout_len = patterns_dict["n_couts"]
+    res = tracker(a_len + cout_len, cout_len, track_depth)
+    for inputs, cout in get_compressors(patterns_dict):
+        for name, qbits in _compressor_ops(inputs, cout):
+            res.apply(name, *qbits)
+    return res
+
+
+def get_to_measure_qubits(a_qs: "QRegister", cout_qs: "QRegister", patterns_dict: dict):
+    """It returns the list of qbits containing the final result, LSB first."""
+    _check_pattern(patterns_dict)
+    regs = (a_qs, cout_qs)
+    return [
+        regs[src][idx]
+        for idx, src in zip(
+            patterns_dict["results"].tolist(),
+            patterns_dict["results_sources"].tolist(),
+        )
+    ]
@@ -1,6 +1,7 @@
 import logging
 
 import numpy as np
+from qat.external.utils.resources import Resources
 from qat.lang.AQASM.gates import CNOT, RY, X
 from qat.lang.AQASM.routines import QRoutine
 from qat.lang.AQASM.misc import build_gate
@@ -8,6 +9,16 @@ from qat.lang.AQASM.misc import build_gate
 logger = logging.getLogger(__name__)
 
 
+def _angle(num: int, den: int) -> float:
+    """The angle 2 * arccos(sqrt(num / den)) of both (i) and (ii).
+
+    The gates are keyed on the angle, so the same formula must be used for
+    both: equal ratios then give exactly the same float (the division is
+    correctly rounded), and share the same definitions in the circuit.
+    """
+    return 2 * np.arccos(np.sqrt(num / den))
+
+
 @build_gate("_BARTSCHI_I", [float])
 def _igate(angle: float) -> QRoutine:
     qf = QRoutine()
@@ -33,7 +44,7 @@ def _iigate(angle: float) -> QRoutine:
 def _scs(n: int, k: int) -> QRoutine:
     qf = QRoutine()
     wires = qf.new_wires(n)
-    angle = 2 * np.arccos(1 / np.sqrt(n))
+    angle = _angle(1, n)
     # (i)
     # n-2 -> 0, n-1 -> 1
     qf.apply(_igate(angle), wires[n - 2], wires[n - 1])
@@ -42,7 +53,7 @@ def _scs(n: int, k: int) -> QRoutine:
     # qfi.apply(CNOT, wires[n - 2], wires[n - 1])
     # (ii)_l
     for l in range(2, k + 1):
-        angle = 2 * np.arccos(np.sqrt(l / n))
+        angle = _angle(l, n)
         # n-l-1 -> 0, n-l -> 1, n - 1 ->2
         qf.apply(_iigate(angle), n - l - 1, n - l, n - 1)
         # qf.apply(CNOT, wires[n - l - 1], wires[n - 1])
@@ -75,3 +86,36 @@ def generate(n: int, k: int) -> QRoutine:
         for qb in wires:
             qf.apply(X, qb)
     return qf
+
+
+def generate_resources(n: int, k: int, track_depth: bool = True) -> Resources:
+    """Resources of :func:`generate`, without building it."""
+    res = Resources(n, 0, track_depth)
+    if k <= 0 or n < k:
+        return res
+    if k == n:
+        for qb in range(n):
+            res.apply("X", qb)
+        return res
+
+    localk = k if k <= n / 2 else n - k
+    for i in range(n - 1, n - localk - 1, -1):
+        res.apply("X", i)
+    for i in range(n, localk, -1):
+        _scs_track(res, i, localk)
+    for i in range(localk, 1, -1):
+        _scs_track(res, i, i - 1)
+    if localk != k:
+        for qb in range(n):
+            res.apply("X", qb)
+    return res
+
+
+def _scs_track(res: Resources, n: int, k: int):
+    res.apply("CNOT", n - 2, n - 1)
+    res.apply("C-RY", n - 1, n - 2)
+    res.apply("CNOT", n - 2, n - 1)
+    for l in range(2, k + 1):
+        res.apply("CNOT", n - l - 1, n - 1)
+        res.apply("C-C-RY", n - 1, n - l, n - l - 1)
+        res.apply("CNOT", n - l - 1, n - 1)
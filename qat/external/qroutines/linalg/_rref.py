@@ -1,6 +1,8 @@
 import logging
 
 import numpy as np
+from qat.external.utils.cache import cached_routine
+from qat.external.utils.gf2 import pack_rows, unpack_rows
 from qat.lang.AQASM.gates import X
 from qat.lang.AQASM.misc import build_gate
 from qat.lang.AQASM.routines import QRoutine
@@ -57,25 +59,51 @@ def build_u_matrix_from_bitlists(swaps: list, adds: list, nsquare):
     This function will return the U matrix by analyzing the ancilla qubits
     produced by the RREF gate.
     """
+    u = build_u_matrices_from_bitarrays([swaps], [adds], nsquare)
+    return unpack_rows(u[0], nsquare)
+
+
+def build_u_matrices_from_bitarrays(
+    swaps: np.ndarray, adds: np.ndarray, nsquare: int
+) -> np.ndarray:
+    """Batched version of :func:`build_u_matrix_from_bitlists`, building the U
+    matrices of many samples at once.
+
+    :param swaps: the (samples x swap_ancilla) array of the swap ancillae,
+        f.e. obtained with :func:`matrix.decode_result_matrices`
+    :param adds: the (samples x add_ancilla) array of the add ancillae
+    :param nsquare: the size of U
+    :returns: the (samples x nsquare x words) uint64 array of the U matrices,
+        with the rows packed as in :mod:`qat.external.utils.gf2`. Use
+        :func:`~qat.external.utils.gf2.unpack_rows` to get the bits
+    """
+    swaps = np.asarray(swaps, dtype=np.uint64)
+    # Explicit, since there are no ancillae when nsquare is 1
+    samples = len(swaps)
+    swaps = swaps.reshape(samples, nsquare * (nsquare - 1) // 2)
+    adds = np.asarray(adds, dtype=np.uint64).reshape(samples, -1)
+    # All ones where the ancilla is 1, to select the rows to add
+    swaps = (0 - swaps)[..., np.newaxis]
+    adds = (0 - adds)[..., np.newaxis]
+    u = np.repeat(pack_rows(np.eye(nsquare, dtype=np.uint8))[np.newaxis], len(swaps), 0)
     swap_idx = 0
     add_idx = 0
-    u = np.eye(nsquare, dtype=np.uint8)
+    others = np.arange(nsquare)
     for i in range(nsquare):
-        for j in range(i + 1, nsquare):
-            if swaps[swap_idx]:
-                u[i,] += u[j,]
-            swap_idx += 1
-        for j in range(nsquare):
-            if j == i:
-                continue
-            if adds[add_idx]:
-                u[j,] += u[i,]
-            add_idx += 1
-    u = u % 2
+        # The rows after i are not changed while they are added to row i
+        nswaps = nsquare - i - 1
+        selected = u[:, i + 1 :] & swaps[:, swap_idx : swap_idx + nswaps]
+        u[:, i] ^= np.bitwise_xor.reduce(selected, axis=1)
+        swap_idx += nswaps
+        # Row i is added to all the others, so it doesn't change
+        if adds.shape[1] > add_idx:
+            u[:, others != i] ^= u[:, [i]] & adds[:, add_idx : add_idx + nsquare - 1]
+            add_idx += nsquare - 1
     return u
 
 
 @build_gate("RREF_OPS", [int, int])
+@cached_routine
 def gate_same_ops_for_vector(nrows: int, ncols: int):
     """Apply the same operations applied to obtain the matrix RREF to a vector.
     The.
@@ -113,6 +141,7 @@ def gate_same_ops_for_vector(nrows: int, ncols: int):
 
 
 @build_gate("RREF", [int, int])
+@cached_routine
 def get_rref(nrows, ncols):
     """Apply RREF to a matrix A.
 
@@ -169,6 +198,7 @@ def get_rref(nrows, ncols):
 
 
 @build_gate("ROWSWAP", [int, int, int])
+@cached_routine
 def get_row_swap(nrows, ncols, row_src_idx: int):
     """In reality just add to the source row the first row with non-zero
     element. F.e., suppose:
@@ -184,7 +214,7 @@ def get_row_swap(nrows, ncols, row_src_idx: int):
     Note that the element of rows are qregister, each one representing a row.
     Each qregister should have the same length, otw the result is undefined.
     """
-    LOGGER.debug(f"nrows {nrows}, ncols {ncols}")
+    LOGGER.debug("nrows %s, ncols %s", nrows, ncols)
     qfun = QRoutine()
 
     # This will contain the source row
@@ -194,17 +224,17 @@ def get_row_swap(nrows, ncols, row_src_idx: int):
 
     # the pivot is on the diagonal
     col_src_idx = row_src_idx
-    LOGGER.debug(f"row_src_idx {row_src_idx}")
+    LOGGER.debug("row_src_idx %s", row_src_idx)
     row_src = row_wires[row_src_idx]
-    LOGGER.debug(f"row src {row_src}")
+    LOGGER.debug("row src %s", row_src)
     # LOGGER.debug(f"row src idxs {[q.index for q in row_src]}")
-    LOGGER.debug(f"X src {row_src[row_src_idx]} ")
+    LOGGER.debug("X src %s", row_src[row_src_idx])
     qfun.apply(X, row_src[col_src_idx])
     for row_oth_idx in range(row_src_idx + 1, nrows):
         # All the possible rows after the source row
-        LOGGER.debug(f"row_oth_idx {row_oth_idx}")
+        LOGGER.debug("row_oth_idx %s", row_oth_idx)
         row_oth = row_wires[row_oth_idx]
-        LOGGER.debug(f"row oth {row_oth}")
+        LOGGER.debug("row oth %s", row_oth)
         # LOGGER.debug(f"row oth idxs {[q.index for q in row_oth]}")
 
         # Ancilla telling if the column must be swapped; since it's not reset
@@ -212,32 +242,33 @@ def get_row_swap(nrows, ncols, row_src_idx: int):
         anc = qfun.new_wires(1)
         # qfun.set_ancillae(anc)
         # LOGGER.debug(f"ancillae {qfun.ancillae}")
-        LOGGER.debug(f"current ancilla {anc}")
+        LOGGER.debug("current ancilla %s", anc)
         # LOGGER.debug(f"current ancilla idx {anc[0].index}")
         # CNOT where ctrl must be 0
         # row_src[col_idx] can be 1 in two cases:
         # - It has been set to 1 in the previous round following a swap
         # - It was already 1 to start with
-        LOGGER.debug(f"CNOT {row_src[col_src_idx]} -> {anc} ")
+        LOGGER.debug("CNOT %s -> %s", row_src[col_src_idx], anc)
         qfun.apply(X.ctrl(), row_src[col_src_idx], anc)
 
         # sum if ancilla is set, but only the col_idxs after the given one. The
         # idea is that all previous idx are already at 0 bcz of previous row
         # operations.
         for col_idx in range(col_src_idx, ncols):
-            LOGGER.debug(f"CCNOT {anc}, {row_oth[col_idx]} -> {row_src[col_idx]} ")
+            LOGGER.debug("CCNOT %s, %s -> %s", anc, row_oth[col_idx], row_src[col_idx])
             qfun.apply(X.ctrl(2), anc, row_oth[col_idx], row_src[col_idx])
 
-    LOGGER.debug(f"X src {row_src[col_src_idx]} ")
+    LOGGER.debug("X src %s", row_src[col_src_idx])
     qfun.apply(X, row_src[col_src_idx])
     return qfun
 
 
 @build_gate("ROWADD", [int, int, int])
+@cached_routine
 def get_row_addition(nrows, ncols, row_src_idx: int):
     qfun = QRoutine()
     # nrows, ncols = len(matrix), len(matrix[0])
-    LOGGER.debug(f"nrows {nrows}, ncols {ncols}")
+    LOGGER.debug("nrows %s, ncols %s", nrows, ncols)
 
     # This will contain the source row
     # row_src = qfun.new_wires(row_length)
@@ -246,30 +277,30 @@ def get_row_addition(nrows, ncols, row_src_idx: int):
         row_wires.append(qfun.new_wires(ncols))
 
     col_src_idx = row_src_idx
-    LOGGER.debug(f"row_src_idx {row_src_idx}")
+    LOGGER.debug("row_src_idx %s", row_src_idx)
     row_src = row_wires[row_src_idx]
-    LOGGER.debug(f"row src {row_src}")
+    LOGGER.debug("row src %s", row_src)
     # LOGGER.debug(f"row src idxs {[q.index for q in row_src]}")
     # WIP diff, range
     for row_oth_idx in range(nrows):
         if row_oth_idx == row_src_idx:
             continue
         # All the possible rows after the source row
-        LOGGER.debug(f"row_oth_idx {row_oth_idx}")
+        LOGGER.debug("row_oth_idx %s", row_oth_idx)
         row_oth = row_wires[row_oth_idx]
-        LOGGER.debug(f"row oth {row_oth}")
+        LOGGER.debug("row oth %s", row_oth)
         # LOGGER.debug(f"row oth idxs {[q.index for q in row_oth]}")
         # Ancilla telling if the column must be swapped
         anc = qfun.new_wires(1)
         # qfun.set_ancillae(anc)
         # LOGGER.debug(f"ancillae {qfun.ancillae}")
-        LOGGER.debug(f"current ancilla {anc}")
+        LOGGER.debug("current ancilla %s", anc)
         # LOGGER.debug(f"current ancilla idx {anc[0].index}")
         # CNOT where ctrl must be 0
         # row_src[col_idx] can be 1 in two cases:
         # - It has been set to 1 in the previous round following a swap
         # - It was already 1 to start with
-        LOGGER.debug(f"CNOT {row_src[col_src_idx]} -> {anc} ")
+        LOGGER.debug("CNOT %s -> %s", row_src[col_src_idx], anc)
         qfun.apply(X.ctrl(), row_oth[col_src_idx], anc)
 
         # sum if ancilla is set, but only the col_idxs after the given one. The
@@ -277,7 +308,7 @@ def get_row_addition(nrows, ncols, row_src_idx: int):
         # operations.
         # WIP, diff, CCNOT src and tgt
         for col_idx in range(col_src_idx, ncols):
-            LOGGER.debug(f"CCNOT {anc}, {row_oth[col_idx]} -> {row_src[col_idx]} ")
+            LOGGER.debug("CCNOT %s, %s -> %s", anc, row_oth[col_idx], row_src[col_idx])
             qfun.apply(X.ctrl(2), anc, row_src[col_idx], row_oth[col_idx])
 
     LOGGER.debug("----")
@@ -1,11 +1,21 @@
 """This gauss-jordan procedure is specifically tailored for ISD."""
 import logging
 from functools import partial
+from typing import TYPE_CHECKING, List, Optional, Sequence, Union
 
+import numpy as np
+from qat.external.qroutines.linalg import _rref
+from qat.external.utils.ancillae import AncillaPool
+from qat.external.utils.cache import cached_routine
+from qat.external.utils.resources import Resources
 from qat.lang.AQASM.gates import CCNOT, CNOT, X
 from qat.lang.AQASM.misc import build_gate
 from qat.lang.AQASM.routines import QRoutine
 
+if TYPE_CHECKING:
+    from qat.lang.AQASM.bits import Cbit, Qbit
+    from qat.lang.AQASM.program import Program
+
 LOGGER = logging.getLogger(__name__)
 # Just a fake swap for pictorial representation of deleted gates
 # FAKE = X
@@ -25,7 +35,30 @@ def get_required_ancillae(r: int) -> tuple[int, int]:
     return swap_ancilla_n, 0
 
 
+def build_u_matrices(swaps: np.ndarray, matrices: np.ndarray) -> np.ndarray:
+    """Build the matrices U of the row operations applied by :func:`get_rref`
+    to many samples at once, i.e. U @ H is equal to the output matrix on the
+    columns never skipped.
+
+    The additions of phase 2 are controlled by the pivot columns, which are
+    left untouched afterwards, so they are read from the output matrices.
+
+    :param swaps: the (samples x swap_ancilla) array of the swap ancillae
+    :param matrices: the (samples x r x n) array of the output matrices, f.e.
+        obtained with :func:`matrix.decode_result_matrices`
+    :returns: the (samples x r x words) uint64 array of the U matrices, see
+        :func:`_rref.build_u_matrices_from_bitarrays`
+    """
+    matrices = np.asarray(matrices)
+    r = matrices.shape[1]
+    # The controls of the additions of pivot x, on the rows other than x
+    controls = np.swapaxes(matrices[:, :, :r], 1, 2)
+    adds = controls[:, ~np.eye(r, dtype=bool)]
+    return _rref.build_u_matrices_from_bitarrays(swaps, adds, r)
+
+
 @build_gate("GJISD", [int, int, bool, int])
+@cached_routine
 def get_rref(r, n, skip_rightmost, norig) -> QRoutine:
     """Apply RREF to a matrix H.
 
@@ -44,27 +77,49 @@ def get_rref(r, n, skip_rightmost, norig) -> QRoutine:
     should put them at the end of the original matrix (i.e., after column n-1)
     """
     qrout = QRoutine()
-    if norig < 0:
-        norig = n
-
     qregs_rows = []
     for _ in range(r):
         qreg = qrout.new_wires(n)
         qregs_rows.append(qreg)
 
     swap_ancilla_n, _ = get_required_ancillae(r)
-    swap_ancillae = qrout.new_wires(swap_ancilla_n)
-    swap_ancilla_idx = 0
+    swap_ancillae = iter(qrout.new_wires(swap_ancilla_n))
+    for gate, rows, col in _rref_steps(r, n, skip_rightmost, norig):
+        if gate is X:
+            qrout.apply(X, qregs_rows[rows[0]][col])
+        elif col == _SWAP_ANCILLA:
+            qrout.apply(
+                gate, qregs_rows[rows[0]], qregs_rows[rows[1]], next(swap_ancillae)
+            )
+        else:
+            qrout.apply(gate, qregs_rows[rows[0]], qregs_rows[rows[1]])
+    return qrout
+
+
+# Marks the row swaps in the steps of the RREF, which take a swap ancilla
+_SWAP_ANCILLA = -1
 
+
+def _rref_steps(r: int, n: int, skip_rightmost: bool, norig: int):
+    """Yield the steps of :func:`get_rref`, in order, as (gate, rows, col):
+
+    - (X, (row,), col) for an X on an element of the matrix
+    - (row swap, (x, i), _SWAP_ANCILLA) for the addition of row i to the pivot
+      row x, controlled by the next swap ancilla
+    - (row addition, (i, x), None) for the addition of the pivot row x to
+      row i
+    """
+    if norig < 0:
+        norig = n
     if skip_rightmost:
         # in Prange we skip the rightmost r X k columns of original matrix H
         skip_cols = set(range(r, norig))
     else:
         skip_cols = set()
 
-    qrout.apply(X, qregs_rows[0][0])
+    yield X, (0,), 0
     for x in range(r):
-        _skip_cols = skip_cols.copy()
+        _skip_cols = frozenset(skip_cols)
         rowswap = partial(get_row_swap, r, n, x, _skip_cols)
         rowadd = partial(get_row_addition, r, n, x, _skip_cols)
         # we don't check the pivot for the last row, we'll check at later
@@ -73,38 +128,69 @@ def get_rref(r, n, skip_rightmost, norig) -> QRoutine:
             # phase 1, look for a valid pivot in rows below
             for i in range(x + 1, r):
                 pivot_last = i == r - 1
-                qrout.apply(
-                    rowswap(pivot_last),
-                    qregs_rows[x],
-                    qregs_rows[i],
-                    swap_ancillae[swap_ancilla_idx],
-                )
-                swap_ancilla_idx += 1
+                yield rowswap(pivot_last), (x, i), _SWAP_ANCILLA
             # improvement 3, X anticipated
             if x != r - 2:
-                qrout.apply(X, qregs_rows[x + 1][x + 1])  #
+                yield X, (x + 1,), x + 1
 
         if x != r - 1:
-            qrout.apply(X, qregs_rows[x][x])
+            yield X, (x,), x
 
         # phase 2, put 0 in pivot column for each row below and above pivot one
         for i in range(r):
             # obv, we skip the row under analysis
             if i == x:
                 continue
-            qrout.apply(
-                rowadd(),
-                qregs_rows[i],
-                qregs_rows[x],
-            )
+            yield rowadd(), (i, x), None
         # impr. 1
         skip_cols.add(x)
 
-    return qrout
 
+def apply_rref(
+    program: "Program",
+    matrix_qbits: Sequence["Qbit"],
+    r: int,
+    n: int,
+    skip_rightmost: bool,
+    norig: int,
+    pool: Optional[AncillaPool] = None,
+) -> List[Union["Qbit", "Cbit"]]:
+    """Apply the same operations of :func:`get_rref` directly to a program,
+    taking each swap ancilla from the pool just before its row swap and
+    discarding it right after, since it's never used again.
 
-@build_gate("ROWSWAP", [int, int, int, set, bool])
-def get_row_swap(r: int, n: int, pivot_idx: int, skip_cols: set, pivot_last: bool):
+    With a measure_reset pool, a single swap ancilla is live at any time,
+    instead of the r(r-1)/2 of get_rref.
+
+    :param program: the program
+    :param matrix_qbits: the r * n qubits of the matrix
+    :param pool: the ancilla pool, default a new one without measure_reset
+    :returns: the swap ancillae, in the order of get_rref: the cbits holding
+        their values if the pool measures and resets them, the (dirty) qubits
+        otherwise
+    """
+    pool = AncillaPool(program) if pool is None else pool
+    rows = [matrix_qbits[i * n : (i + 1) * n] for i in range(r)]
+    swaps = []
+    with pool.routine("GJISD"):
+        for gate, rows_idx, col in _rref_steps(r, n, skip_rightmost, norig):
+            if gate is X:
+                program.apply(X, rows[rows_idx[0]][col])
+            elif col == _SWAP_ANCILLA:
+                anc = pool.get(1)
+                program.apply(gate, rows[rows_idx[0]], rows[rows_idx[1]], anc)
+                cbits = pool.discard(anc)
+                swaps.extend(anc if cbits is None else cbits)
+            else:
+                program.apply(gate, rows[rows_idx[0]], rows[rows_idx[1]])
+    return swaps
+
+
+@build_gate("ROWSWAP", [int, int, int, frozenset, bool])
+@cached_routine
+def get_row_swap(
+    r: int, n: int, pivot_idx: int, skip_cols: frozenset, pivot_last: bool
+):
     """WARN: the pivot element is checked against state 1 (improvement 4)
     r, n: ISD params
     pivot_idx: index of pivot under analysis (in the matrix, it has position M_{pivot_idx, pivot_idx})
@@ -132,8 +218,9 @@ def get_row_swap(r: int, n: int, pivot_idx: int, skip_cols: set, pivot_last: boo
     return qrout
 
 
-@build_gate("ROWADD", [int, int, int, set])
-def get_row_addition(r: int, n: int, pivot_idx: int, skip_cols: set):
+@build_gate("ROWADD", [int, int, int, frozenset])
+@cached_routine
+def get_row_addition(r: int, n: int, pivot_idx: int, skip_cols: frozenset):
     """
     r, n: ISD params
     pivot_idx: index of pivot under analysis (in the matrix, it has position M_{pivot_idx, pivot_idx})
@@ -158,3 +245,58 @@ def get_row_addition(r: int, n: int, pivot_idx: int, skip_cols: set):
         if c not in skip_cols:
             qrout.apply(CCNOT, other_row[pivot_idx], pivot_row[c], other_row[c])
     return qrout
+
+
+def get_rref_resources(
+    r: int,
+    n: int,
+    skip_rightmost: bool,
+    norig: int,
+    track_depth: bool = True,
+    tracker=Resources,
+) -> Resources:
+    """Resources of :func:`get_rref`, without building it.
+
+    The gates of each row operation are replayed as a single chain, so the
+    time is proportional to the r**2 row operations (each one vectorized on the
+    n columns if track_depth is True).
+
+    :param tracker: the Resources class (or factory) replaying the gates, f.e.
+        an :class:`~qat.external.utils.opstream.OpStreamWriter`
+    """
+    if norig < 0:
+        norig = n
+    swap_ancilla_n, _ = get_required_ancillae(r)
+    res = tracker(r * n + swap_ancilla_n, swap_ancilla_n, track_depth)
+    rows = np.arange(r * n).reshape(r, n)
+    swap_ancillae = range(r * n, r * n + swap_ancilla_n)
+    swap_ancilla_idx = 0
+    # in Prange we skip the rightmost r X k columns of original matrix H
+    right_cols = np.arange(max(r, norig) if skip_rightmost else r, n)
+
+    res.apply("X", rows[0][0])
+    for x in range(r):
+        # columns before x are skipped because of impr. 1
+        left_cols = np.arange(x + 1, r)
+        if x != r - 1:
+            for i in range(x + 1, r):
+                pivot_last = i == r - 1
+                # impr. 5
+                if pivot_last:
+                    cols = np.concatenate((left_cols, [x], right_cols))
+                else:
+                    cols = np.concatenate(([x], left_cols, right_cols))
+                anc = swap_ancillae[swap_ancilla_idx]
+                res.apply("CNOT", rows[x][x], anc)
+                res.apply_chain("CCNOT", [anc], rows[i][cols], rows[x][cols])
+                swap_ancilla_idx += 1
+            if x != r - 2:
+                res.apply("X", rows[x + 1][x + 1])
+            res.apply("X", rows[x][x])
+
+        cols = np.concatenate((left_cols, right_cols))
+        for i in range(r):
+            if i == x:
+                continue
+            res.apply_chain("CCNOT", [rows[i][x]], rows[x][cols], rows[i][cols])
+    return res
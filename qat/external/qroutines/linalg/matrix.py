@@ -1,19 +1,22 @@
-from typing import TYPE_CHECKING, List, Set, Tuple
+from typing import TYPE_CHECKING, List, Optional, Sequence, Set, Tuple
 
 # import nptyping
 import numpy as np
 from qat.external.qroutines import qregs_init
 from qat.external.qroutines.sorting import sorting_network as sn
+from qat.external.utils.cache import FrozenDict, cached_routine
+from qat.external.utils.resources import Resources
 from qat.lang.AQASM.gates import SWAP
 from qat.lang.AQASM.misc import build_gate
 from qat.lang.AQASM.routines import QRoutine
 
 if TYPE_CHECKING:
-    from qat.core.wrappers.result import Sample
+    from qat.core.wrappers.result import Result, Sample
     from qat.lang.AQASM.bits import Qbit, QRegister
 
 
 @build_gate("MATRIX_INIT", [np.ndarray])
+@cached_routine
 def initialize_qureg_to_binary_matrix(matrix):
     """Initialize a set of quregs to the value of the binary matrix, row-wise.
     I.e. matrix [[1, 0], [1, 0]] will produce qreg [1, 0, 1, 0].
@@ -83,15 +86,64 @@ def build_matrix_from_bitstring(
     bitstring: str, qreg_range: Set[int], shape: Tuple[int, int]
 ) -> np.ndarray:
     matrix = np.zeros(shape, dtype=np.ubyte)
-    interesting_bits = [val for i, val in enumerate(bitstring) if i in qreg_range]
-    for i, val in enumerate(interesting_bits):
-        row = i // shape[1]
-        col = i % shape[1]
-        matrix[row][col] = val
+    bits = np.frombuffer(bitstring.encode(), dtype=np.ubyte) - ord("0")
+    interesting_bits = bits[sorted(i for i in qreg_range if i < len(bitstring))]
+    matrix.reshape(-1)[: len(interesting_bits)] = interesting_bits
     return matrix
 
 
+def decode_result_matrices(
+    result: "Result",
+    index_map: Sequence[Sequence[int]],
+    qubits: Optional[Sequence[int]] = None,
+    packed: bool = False,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Decode the matrices of all the samples of a result at once.
+
+    :param result: the result of a job
+    :param index_map: the index of the qubit of each entry of the matrix, f.e.
+        the output of :meth:`get_rows_as_index_list`. For more matrices, f.e. a
+        matrix and its syndrome, concatenate their columns
+    :param qubits: the qubits measured by the job, if not all of them, as
+        passed to `Circuit.to_job`
+    :param packed: if True, pack the columns of each row in bytes with
+        `np.packbits`, i.e. column 0 is the MSB of the first byte
+    :returns: the (samples x rows x cols) uint8 array of the matrices, or the
+        (samples x rows x ceil(cols / 8)) one if packed, and the array of the
+        probabilities of the samples
+    """
+    index_map = np.asarray(index_map, dtype=np.intp)
+    if qubits is not None:
+        positions = np.full(max(qubits) + 1, -1, dtype=np.intp)
+        positions[list(qubits)] = np.arange(len(qubits))
+        index_map = positions[index_map]
+        if (index_map < 0).any():
+            raise ValueError("The matrix contains some qubits not measured")
+        nbqbits = len(qubits)
+    else:
+        nbqbits = sum(qreg.length for qreg in result.qregs)
+    states, probabilities = [], []
+    for sample in result:
+        states.append(sample.state.int)
+        probabilities.append(sample.probability)
+    nbytes = (nbqbits + 7) // 8
+    # The state of qubit 0 is the MSB, unless lsb_first
+    if result.lsb_first:
+        index_map = 8 * nbytes - 1 - index_map
+    else:
+        index_map = index_map + 8 * nbytes - nbqbits
+    raw = b"".join(state.to_bytes(nbytes, "big") for state in states)
+    bits = np.unpackbits(
+        np.frombuffer(raw, dtype=np.ubyte).reshape(len(states), nbytes), axis=1
+    )
+    matrices = bits[:, index_map]
+    if packed:
+        matrices = np.packbits(matrices, axis=-1)
+    return matrices, np.array(probabilities, dtype=np.float64)
+
+
 @build_gate("SWAP_COLS", [int])
+@cached_routine
 def buildg_swap_columns(nrows: int):
     routine = QRoutine()
     col1 = routine.new_wires(nrows)
@@ -109,15 +161,24 @@ def buildg_swap_rows(ncols: int):
     pass
 
 
-def move_columns_end_data(nrows: int, ncols: int):
-    data = sn.get_pattern_sorter(ncols)
-    data["n_rows"] = nrows
-    data["n_cols"] = data["n_lines"]
-    data["n_cols_orig"] = ncols
-    return data
+def move_columns_end_data(
+    nrows: int, ncols: int, network: str = "bitonic", exact: bool = False
+) -> FrozenDict:
+    """Data of :func:`move_columns_end_gate`.
+
+    :param network: the sorting network, see
+        :func:`~qat.external.qroutines.sorting.sorting_network.get_pattern_network`
+    :param exact: if True, the network is pruned to ncols lines, so that no
+        padding column is needed (n_cols == ncols)
+    """
+    data = sn.get_pattern_network(ncols, network, exact)
+    return FrozenDict(
+        data, n_rows=nrows, n_cols=data["n_lines"], n_cols_orig=ncols
+    )
 
 
 @build_gate("MOVE_COLS_END", [dict])
+@cached_routine
 def move_columns_end_gate(data: dict) -> QRoutine:
     """Use a sorting network to move the columns of the matrix to the end. The
     matrix must be created with the corresponding method from this class,
@@ -155,8 +216,33 @@ def move_columns_end_gate(data: dict) -> QRoutine:
     routine.apply(sort_net, comb, comp)
 
     qrout = buildg_swap_columns(nrows)
-    for pattern in data["swaps_pattern"]:
+    for pattern in data["swaps_pattern"].tolist():
         routine.apply(
             qrout.ctrl(), comp[pattern[0]], col_wires[pattern[1]], col_wires[pattern[2]]
         )
     return routine
+
+
+def move_columns_end_gate_resources(
+    data: dict, track_depth: bool = True, tracker=Resources
+) -> Resources:
+    """Resources of :func:`move_columns_end_gate`, without building it.
+
+    :param tracker: the Resources class (or factory) replaying the gates, f.e.
+        an :class:`~qat.external.utils.opstream.OpStreamWriter`
+    """
+    ncols: int = data["n_cols"]
+    comp_len: int = data["n_comps"]
+    nrows: int = data["n_rows"]
+    matrix_len = nrows * ncols
+    res = tracker(matrix_len + ncols + comp_len, comp_len, track_depth)
+    col_wires = [np.arange(col_idx, matrix_len, ncols) for col_idx in range(ncols)]
+    comb = range(matrix_len, matrix_len + ncols)
+    comp = range(matrix_len + ncols, matrix_len + ncols + comp_len)
+
+    sn._build_gate_common_track(res, comb, comp, data)
+    for pattern in data["swaps_pattern"].tolist():
+        res.apply_chain(
+            "C-SWAP", [comp[pattern[0]]], col_wires[pattern[1]], col_wires[pattern[2]]
+        )
+    return res
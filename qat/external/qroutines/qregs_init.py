@@ -11,6 +11,7 @@ import logging
 from typing import TYPE_CHECKING, List, Sequence
 
 from qat.external.utils.bits import conversion
+from qat.external.utils.cache import cached_routine
 from qat.lang.AQASM.gates import X
 from qat.lang.AQASM.misc import build_gate
 from qat.lang.AQASM.routines import QRoutine
@@ -29,6 +30,7 @@ LOGGER = logging.getLogger(__name__)
 # Little endian in qubit initialization also means left-to-right bitstring
 # corresponds bottom-to-top in circuit
 @build_gate("QBIT_INIT", [Sequence, int, bool], lambda x, y, _: len(x) + y)
+@cached_routine
 def _conditionally_initialize_qureg_given_bitarray(
     a_arr: Sequence[int],
     ncontrols: int,
@@ -4,11 +4,21 @@ https://fileadmin.cs.lth.se/cs/Personal/Rolf_Karlsson/lect10.pdf for reference.
 The original work is in Chapter 27.3,4,5 of T. H. Cormen, C. E.
 Leiserson, R. L. Rivest, and C. Stein, Introduction to algorithms,
 second edition. The MIT Press and McGraw-Hill Book Company, 2001.
+
+Besides the bitonic sorter, Batcher's odd-even mergesort (K. E. Batcher,
+Sorting networks and their applications, AFIPS 1968) needs fewer comparators
+with the same depth. Every comparator moves the 1 to its higher line, so the
+networks can be pruned to any n (see :func:`prune_pattern`) instead of being
+padded to the next power of 2: each comparator saved is a controlled SWAP less
+per row in :func:`~qat.external.qroutines.linalg.matrix.move_columns_end_gate`.
 """
+import functools
 import logging
-from typing import Any, Dict
+from typing import Any, Callable, Dict, Tuple
 
 import numpy as np
+from qat.external.utils.cache import FrozenDict, cached_routine
+from qat.external.utils.resources import Resources
 from qat.lang.AQASM.gates import SWAP, CNOT, X
 from qat.lang.AQASM.misc import build_gate
 from qat.lang.AQASM.routines import QRoutine
@@ -23,7 +33,7 @@ def _build_gate_common(net_data: Dict[str, Any]) -> QRoutine:
     a_wires = routine.new_wires(a_len)
     comp_wires = routine.new_wires(comp_len)
 
-    for swap_pattern in net_data["swaps_pattern"]:
+    for swap_pattern in net_data["swaps_pattern"].tolist():
         a_qb = a_wires[swap_pattern[1]]
         b_qb = a_wires[swap_pattern[2]]
         ctrl_qb = comp_wires[swap_pattern[0]]
@@ -39,7 +49,37 @@ def _build_gate_common(net_data: Dict[str, Any]) -> QRoutine:
     return routine
 
 
+def build_gate_sorter_resources(
+    net_data: Dict[str, Any], track_depth: bool = True, tracker=Resources
+) -> Resources:
+    """Resources of :func:`build_gate_sorter` (and of the bitonic sorter and
+    merger, which share the same structure), without building it.
+
+    :param tracker: the Resources class (or factory) replaying the gates, f.e.
+        an :class:`~qat.external.utils.opstream.OpStreamWriter`
+    """
+    a_len: int = net_data["n_lines"]
+    comp_len: int = net_data["n_comps"]
+    res = tracker(a_len + comp_len, comp_len, track_depth)
+    _build_gate_common_track(
+        res, range(a_len), range(a_len, a_len + comp_len), net_data
+    )
+    return res
+
+
+def _build_gate_common_track(res: Resources, a_wires, comp_wires, net_data):
+    for swap_pattern in net_data["swaps_pattern"].tolist():
+        a_qb = a_wires[swap_pattern[1]]
+        b_qb = a_wires[swap_pattern[2]]
+        ctrl_qb = comp_wires[swap_pattern[0]]
+        res.apply("X", b_qb)
+        res.apply("CNOT", b_qb, ctrl_qb)
+        res.apply("X", b_qb)
+        res.apply("C-SWAP", ctrl_qb, a_qb, b_qb)
+
+
 @build_gate("BITONIC_SORTER", [dict])
+@cached_routine
 def build_gate_bitonic_sorter(net_data: Dict[str, Any]) -> QRoutine:
     return _build_gate_common(net_data)
 
@@ -57,121 +97,140 @@ def get_pattern_bitonic_sorter(n) -> Dict[str, Any]:
     2. n_comps, the number of fair coin flips required to obtain the full
     permutation
 
-    3. the swaps_pattern, i.e. a list of tuples containing:
+    3. the swaps_pattern, i.e. a (n_comps x 3) int32 array whose rows contain:
     - an integer signalling which comparator output bit to use
     - the first line involved in the swap
     - the second line involved in the swap
+
+    4. layers, the layer of each comparator, i.e. its depth in the network
+    (the comparators of the same layer act on disjoint lines), and n_layers
+    """
+    n_lines = _get_n_lines(n)
+    return _get_pattern(n_lines, [(_bitonic_template(n_lines), 0)])
+
+
+def _get_n_lines(n: int) -> int:
+    return 2 ** int(np.ceil(np.log2(n)))
+
+
+def _half_cleaners(swap_step: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Comparators of the bitonic sorter on 2 * swap_step lines, i.e. the
+    half-cleaner with the given swap_step followed by the recursive
+    half-cleaners on each half, in depth-first order.
+
+    :returns: the (n_comps x 2) lines and the level of each comparator
     """
-    net_data = {}
-    steps = int(np.ceil(np.log2(n)))
-    net_data["n_lines"] = 2**steps
-    net_data["swaps_pattern"] = []
-    initial_swaps = int(net_data["n_lines"] / 2)
-
-    _get_pattern_bitonic_sorter(
-        0, initial_swaps, int(net_data["n_lines"] / 2), 0, net_data
+    # Nodes of the recursion tree, in pre-order: first line, swap step, level
+    offsets = np.empty(0, dtype=np.int32)
+    steps = np.empty(0, dtype=np.int32)
+    levels = np.empty(0, dtype=np.int32)
+    step = 1
+    while step <= swap_step:
+        offsets = np.concatenate(([0], offsets, offsets + step))
+        steps = np.concatenate(([step], steps, steps))
+        levels = np.concatenate(([0], levels + 1, levels + 1))
+        step *= 2
+    node = np.repeat(np.arange(len(steps)), steps)
+    first = np.repeat(np.cumsum(steps) - steps, steps)
+    a = offsets[node] + np.arange(len(node), dtype=np.int32) - first
+    return np.stack((a, a + steps[node]), axis=1), levels[node]
+
+
+@functools.lru_cache(maxsize=None)
+def _bitonic_template(n_lines: int) -> Tuple[np.ndarray, Tuple[np.ndarray, ...]]:
+    lines, levels = _half_cleaners(n_lines // 2)
+    return _template(lines, levels)
+
+
+@functools.lru_cache(maxsize=None)
+def _merger_template(n_lines: int) -> Tuple[np.ndarray, Tuple[np.ndarray, ...]]:
+    # The first comparators flip the second half, then the circuit is
+    # identical to the bitonic sorter on each half
+    flip = np.arange(n_lines // 2, dtype=np.int32)
+    half_lines, half_levels = _half_cleaners(n_lines // 4)
+    lines = np.concatenate(
+        (
+            np.stack((flip, n_lines - 1 - flip), axis=1),
+            half_lines,
+            half_lines + n_lines // 2,
+        )
     )
-    net_data["n_comps"] = len(net_data["swaps_pattern"])
-    return net_data
-
-
-def _get_pattern_bitonic_sorter(start, end, swap_step, comp_q_idx, net_data):
-    _LOGGER.debug("Start: %d, end: %d, swap_step: %d", start, end, swap_step)
-    if swap_step == 0 or start >= end:
-        _LOGGER.debug("Base case recursion")
-        return comp_q_idx
-
-    for_iter = 0
-    for i in range(start, end):
-        for_iter += 1
-        _LOGGER.info("cswap(%d, %d, %d)", comp_q_idx, i, i + swap_step)
-        net_data["swaps_pattern"].append((comp_q_idx, i, i + swap_step))
-        comp_q_idx += 1
-
-    for_iter_next = min(for_iter, int(swap_step / 2))
-    _LOGGER.debug(
-        "Before rec1, start: %d, end: %d, swap_step: %d, for_iter_next %d",
-        start,
-        end,
-        swap_step,
-        for_iter_next,
+    levels = np.concatenate(
+        (np.zeros(len(flip), dtype=np.int32), half_levels + 1, half_levels + 1)
     )
-    comp_q_idx = _get_pattern_bitonic_sorter(
-        start, start + for_iter_next, int(swap_step / 2), comp_q_idx, net_data
+    return _template(lines, levels)
+
+
+def _template(lines, levels):
+    """Return the lines and, for each level, the indexes of its comparators."""
+    lines = lines.astype(np.int32)
+    lines.setflags(write=False)
+    groups = tuple(
+        np.flatnonzero(levels == lvl) for lvl in range(levels.max(initial=-1) + 1)
     )
-    _LOGGER.debug(
-        "Before rec, start: %d, end: %d, swap_step: %d, for_iter_next %d",
-        start,
-        end,
-        swap_step,
-        for_iter_next,
+    return lines, groups
+
+
+def _get_pattern(n_lines: int, blocks) -> FrozenDict:
+    """Concatenate the comparators of the given (template, first line)
+    blocks and compute their layers."""
+    lines = np.concatenate(
+        [np.empty((0, 2), dtype=np.int32)]
+        + [template[0] + start for template, start in blocks]
     )
-    comp_q_idx = _get_pattern_bitonic_sorter(
-        start + swap_step,
-        start + swap_step + for_iter_next,
-        int(swap_step / 2),
-        comp_q_idx,
-        net_data,
+    n_comps = len(lines)
+    layers = np.empty(n_comps, dtype=np.int32)
+    last = np.zeros(int(lines.max(initial=n_lines - 1)) + 1, dtype=np.int32)
+    offset = 0
+    for (template_lines, groups), start in blocks:
+        # The comparators of a level act on disjoint lines
+        for group in groups:
+            a = template_lines[group, 0] + start
+            b = template_lines[group, 1] + start
+            layer = np.maximum(last[a], last[b]) + 1
+            last[a] = last[b] = layer
+            layers[offset + group] = layer - 1
+        offset += len(template_lines)
+    return FrozenDict(
+        n_lines=n_lines,
+        n_comps=n_comps,
+        swaps_pattern=np.column_stack(
+            (np.arange(n_comps, dtype=np.int32), lines)
+        ).astype(np.int32),
+        layers=layers,
+        n_layers=int(last.max(initial=0)),
     )
-    return comp_q_idx
 
 
 @build_gate("MERGER", [dict])
+@cached_routine
 def build_gate_merger(net_data: dict):
     return _build_gate_common(net_data)
 
 
 def get_pattern_merger(n):
-    net_data = {}
-    comp_q_idx = _get_pattern_merger_support(n, net_data, 0)
-
-    net_data["n_comps"] = len(net_data["swaps_pattern"])
-    return net_data
-
-
-def _get_pattern_merger_support(n, net_data, comp_q_idx, start_shift=0):
-    steps = int(np.ceil(np.log2(n)))
-    net_data["n_lines"] = 2**steps
-    net_data["swaps_pattern"] = net_data.get("swaps_pattern", [])
-    initial_swaps = int(net_data["n_lines"] / 2)
-
-    for i in range(initial_swaps):
-        net_data["swaps_pattern"].append(
-            (comp_q_idx, i + start_shift, net_data["n_lines"] - i - 1 + start_shift)
-        )
-        comp_q_idx += 1
-
-    # the second half of the circuit is identical to the bitonic sorter
-    start = start_shift
-    swap_step = int(initial_swaps / 2)
-    comp_q_idx = _get_pattern_bitonic_sorter(
-        start, start + swap_step, swap_step, comp_q_idx, net_data
-    )
-    comp_q_idx = _get_pattern_bitonic_sorter(
-        start + swap_step * 2, start + swap_step * 3, swap_step, comp_q_idx, net_data
-    )
-    return comp_q_idx
+    n_lines = _get_n_lines(n)
+    return _get_pattern(n_lines, [(_merger_template(n_lines), 0)])
 
 
 @build_gate("SORTER", [dict])
+@cached_routine
 def build_gate_sorter(net_data):
     return _build_gate_common(net_data)
 
 
 def get_pattern_sorter(n):
-    net_data = {}
     lis = []
 
     _get_pattern_sorter_support(0, n, lis)
 
-    comp_q_idx = 0
     # Note that, since the last pattern to be analyzed is the greatest one, we
     # obtain as side effect the right number of 'n_lines'
-    for start, end in reversed(lis):
-        n = len(range(start, end))
-        comp_q_idx = _get_pattern_merger_support(n, net_data, comp_q_idx, start)
-        net_data["n_comps"] = len(net_data["swaps_pattern"])
-    return net_data
+    blocks = [
+        (_merger_template(_get_n_lines(end - start)), start)
+        for start, end in reversed(lis)
+    ]
+    return _get_pattern(_get_n_lines(n), blocks)
 
 
 def _get_pattern_sorter_support(start, end, acc, depth=0):
@@ -190,3 +249,88 @@ def _get_pattern_sorter_support(start, end, acc, depth=0):
     # print(f"{rec_string}before recursion 2")
     _get_pattern_sorter_support(mid, end, acc, depth + 1)
     return
+
+
+@functools.lru_cache(maxsize=None)
+def _batcher_template(n_lines: int) -> Tuple[np.ndarray, Tuple[np.ndarray, ...]]:
+    """Comparators of Batcher's odd-even mergesort on n_lines (a power of 2)
+    lines, one level per pass."""
+    lines = [np.empty((0, 2), dtype=np.int32)]
+    levels = [np.empty(0, dtype=np.int32)]
+    merged = 1
+    while merged < n_lines:
+        step = merged
+        while step >= 1:
+            starts = np.arange(step % merged, n_lines - step, 2 * step)
+            a = (starts[:, np.newaxis] + np.arange(step)).ravel()
+            # Only within the blocks of 2 * merged lines being merged
+            block = 2 * merged
+            a = a[(a + step < n_lines) & (a // block == (a + step) // block)]
+            lines.append(np.stack((a, a + step), axis=1))
+            levels.append(np.full(len(a), len(levels) - 1, dtype=np.int32))
+            step //= 2
+        merged *= 2
+    return _template(np.concatenate(lines), np.concatenate(levels))
+
+
+@build_gate("BATCHER_SORTER", [dict])
+@cached_routine
+def build_gate_batcher_sorter(net_data: Dict[str, Any]) -> QRoutine:
+    return _build_gate_common(net_data)
+
+
+def get_pattern_batcher_sorter(n) -> Dict[str, Any]:
+    """Batcher's odd-even mergesort, on n rounded up to the closest power of
+    2. The dictionary is the same of :func:`get_pattern_bitonic_sorter`."""
+    n_lines = _get_n_lines(n)
+    return _get_pattern(n_lines, [(_batcher_template(n_lines), 0)])
+
+
+def prune_pattern(net_data: Dict[str, Any], n: int) -> FrozenDict:
+    """Drop the lines from n on, and the comparators touching them.
+
+    The dropped lines are considered as holding 1 (f.e. the padding columns
+    of :func:`~qat.external.qroutines.linalg.matrix.move_columns_end_data`):
+    since every comparator moves the 1 to its higher line, they keep their 1
+    and the comparators touching them never swap. So if net_data sorts, the
+    pruned network sorts any n bits, with n_lines equal to n.
+    """
+    lines = net_data["swaps_pattern"][:, 1:]
+    keep = (lines < n).all(axis=1)
+    return _get_pattern(n, [(_template(lines[keep], net_data["layers"][keep]), 0)])
+
+
+# The sorting networks, taking the number of lines
+NETWORKS: Dict[str, Callable[[int], Dict[str, Any]]] = {
+    "bitonic": get_pattern_sorter,
+    "batcher": get_pattern_batcher_sorter,
+}
+
+
+def get_pattern_network(n: int, network: str = "bitonic", exact: bool = False):
+    """The pattern of one of the :data:`NETWORKS` sorting n bits.
+
+    :param exact: if True, the network on the next power of 2 is pruned to n
+        lines (see :func:`prune_pattern`), otherwise the lines are padded
+    """
+    try:
+        get_pattern = NETWORKS[network]
+    except KeyError:
+        raise ValueError(
+            f"Unknown network {network}, expected one of {list(NETWORKS)}"
+        ) from None
+    if not exact:
+        return get_pattern(n)
+    return prune_pattern(get_pattern(_get_n_lines(n)), n)
+
+
+def compare_networks(n: int) -> Dict[str, Tuple[int, int]]:
+    """The number of comparators and the depth of each network sorting n
+    bits, padded and exact (with the `_exact` suffix)."""
+    stats = {}
+    for network in NETWORKS:
+        for exact in (False, True):
+            pattern = get_pattern_network(n, network, exact)
+            name = f"{network}_exact" if exact else network
+            stats[name] = (pattern["n_comps"], pattern["n_layers"])
+    return stats
@@ -0,0 +1,101 @@
+"""Rewriting of the multi-controlled X of compiled circuits.
+
+The QLM linker replaces an abstract gate by its implementation, and a
+controlled gate by the controlled implementation, so it can't turn an X with
+n controls (f.e. the ones of :func:`~qat.external.qroutines.hamming_weight_compute.
+fpc.set_qubit_if_true` or of the controlled qubits initialization) into
+smaller gates. :func:`link_mctrls` does it on the compiled circuit, with the
+synthesis of :mod:`.mcx`, so that the circuit only contains gates with 1 or 2
+controls:
+
+- dirty (default): the ancillae are borrowed among the qubits the gate does
+  not act on, so no qubit is added unless the circuit is too narrow
+- clean: n - 2 ancillae are appended to the circuit, and shared by all the
+  gates, since each gate restores them to 0
+
+The circuits must be compiled with `to_circ(inline=True)`, so that the gates
+of the routines are not boxed.
+"""
+import copy
+import logging
+from typing import TYPE_CHECKING, List
+
+from qat.comm.datamodel.ttypes import Op
+from qat.core.plugins import AbstractPlugin
+from qat.core.util import OpType, has_non_inlined
+from qat.external.synthesis.mctrls.mcx import get_required_ancillae, mcx_ops
+from qat.external.utils.resources import split_gate_name
+
+if TYPE_CHECKING:
+    from qat.core import Batch, HardwareSpecs
+    from qat.core.wrappers.circuit import Circuit
+
+LOGGER = logging.getLogger(__name__)
+
+# The kinds of ancillae of link_mctrls, the relative-phase Toffoli is not part
+# of the gate set of the circuits
+LINK_ANCILLAE = ("dirty", "clean")
+
+
+def link_mctrls(circuit: "Circuit", ancillae: str = "dirty") -> "Circuit":
+    """Replace the X gates with 3 or more controls by Toffolis, see
+    :func:`~qat.external.synthesis.mctrls.mcx.mcx_ops`.
+
+    :param circuit: a circuit compiled with `inline=True`
+    :param ancillae: one of :data:`LINK_ANCILLAE`. The clean ancillae, and the
+        dirty ones missing in narrow circuits, are new qubits appended to the
+        circuit, and they are 0 at the end
+    :raises ValueError: if the circuit contains boxed routines
+    """
+    if ancillae not in LINK_ANCILLAE:
+        raise ValueError(
+            f"Unknown ancillae {ancillae}, expected one of {LINK_ANCILLAE}"
+        )
+    if has_non_inlined(circuit):
+        raise ValueError("Circuit has boxed routines, compile it with inline=True")
+    nbqbits = circuit.nbqbits
+    # The qubits appended to the circuit, always back to 0
+    extra: List[int] = []
+    ops = []
+    linked = 0
+    for op, (name, _, qbits) in zip(circuit.ops, circuit.iterate_simple()):
+        base, nctrls = split_gate_name(name) if op.type == OpType.GATETYPE else ("", 0)
+        if base != "X" or nctrls < 3:
+            ops.append(op)
+            continue
+        n_anc = get_required_ancillae(nctrls)
+        anc = []
+        if ancillae == "dirty":
+            used = set(qbits)
+            anc = [q for q in range(nbqbits) if q not in used][:n_anc]
+        missing = n_anc - len(anc)
+        if missing > len(extra):
+            extra.extend(range(nbqbits + len(extra), nbqbits + missing))
+        # The clean ones are 0, so they can act as dirty ones too
+        anc += extra[:missing]
+        kind = "clean" if missing == n_anc else "dirty"
+        for gate, gate_qbits in mcx_ops(qbits[:-1], qbits[-1], anc, kind):
+            ops.append(Op(gate=gate, qbits=list(gate_qbits), type=OpType.GATETYPE))
+        linked += 1
+
+    linked_circuit = copy.copy(circuit)
+    linked_circuit.ops = ops
+    linked_circuit.nbqbits = nbqbits + len(extra)
+    LOGGER.info(
+        "Linked %d multi-controlled X, %d ancillae appended", linked, len(extra)
+    )
+    return linked_circuit
+
+
+class MctrlsPlugin(AbstractPlugin):
+    """Plugin applying :func:`link_mctrls` to all the jobs of a batch, f.e.
+    `(MctrlsPlugin() | MPS()).submit(job)`."""
+
+    def __init__(self, ancillae: str = "dirty"):
+        super().__init__()
+        self.ancillae = ancillae
+
+    def compile(self, batch: "Batch", hardware_specs: "HardwareSpecs") -> "Batch":
+        for job in batch.jobs:
+            job.circuit = link_mctrls(job.circuit, self.ancillae)
+        return batch
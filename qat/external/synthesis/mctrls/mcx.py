@@ -0,0 +1,216 @@
+"""Multi-controlled X with a linear number of Toffolis, based on [BBCD95]
+Barenco, Adriano et al.: Elementary gates for quantum computation. Phys. Rev.
+A 52, 3457 (1995), and on [Mas16] Maslov, Dmitri: Advantages of using
+relative-phase Toffoli gates with an application to multiple control Toffoli
+optimization. Phys. Rev. A 93, 022311 (2016).
+
+An X with n >= 3 controls is written with 1 or 2 controls gates only, using
+n - 2 ancillae:
+
+- clean: the ancillae are in state 0 and they are restored. The AND of the
+  controls is computed along the ancillae (a V-chain), 2n - 3 Toffolis
+- dirty: the ancillae are borrowed in any state, f.e. idle qubits of the
+  circuit, and they are restored. 4(n - 2) Toffolis (Lemma 7.2 of [BBCD95])
+- relative: as clean, but the Toffolis computing and uncomputing the chain
+  are relative-phase Toffolis (:data:`rccx`), whose phases cancel out. Only
+  the Toffoli on the target is a full one. It is not a reversible circuit, so
+  the bit-sliced simulator does not support it
+
+:data:`ccnot` and :data:`x` are linked by the simulators lacking the Toffoli
+(f.e. Stabs), see :mod:`.link` for the rewriting of the compiled circuits.
+"""
+import logging
+from typing import Iterator, Sequence, Tuple
+
+import numpy as np
+
+from qat.external.utils.cache import cached_routine
+from qat.external.utils.resources import Resources
+from qat.lang.AQASM.gates import CCNOT, CNOT, H, T, X, Z, AbstractGate
+from qat.lang.AQASM.misc import build_gate
+from qat.lang.AQASM.routines import QRoutine
+
+LOGGER = logging.getLogger(__name__)
+
+# The kinds of ancillae of :func:`mcx`
+ANCILLAE = ("clean", "dirty", "relative")
+
+
+def _ccnot_circuit() -> QRoutine:
+    """Toffoli with Clifford+T gates: 7 T and 6 CNOT."""
+    qfun = QRoutine()
+    a, b, t = qfun.new_wires(3)
+    qfun.apply(H, t)
+    qfun.apply(CNOT, b, t)
+    qfun.apply(T.dag(), t)
+    qfun.apply(CNOT, a, t)
+    qfun.apply(T, t)
+    qfun.apply(CNOT, b, t)
+    qfun.apply(T.dag(), t)
+    qfun.apply(CNOT, a, t)
+    qfun.apply(T, b)
+    qfun.apply(T, t)
+    qfun.apply(H, t)
+    qfun.apply(CNOT, a, b)
+    qfun.apply(T, a)
+    qfun.apply(T.dag(), b)
+    qfun.apply(CNOT, a, b)
+    return qfun
+
+
+def _rccx_circuit() -> QRoutine:
+    """Relative-phase Toffoli, with 4 T and 3 CNOT: |101> gets the phase -1,
+    and the target of |11x> the phases -i, i (see :func:`_rccx_matrix`)."""
+    qfun = QRoutine()
+    a, b, t = qfun.new_wires(3)
+    qfun.apply(H, t)
+    qfun.apply(T, t)
+    qfun.apply(CNOT, b, t)
+    qfun.apply(T.dag(), t)
+    qfun.apply(CNOT, a, t)
+    qfun.apply(T, t)
+    qfun.apply(CNOT, b, t)
+    qfun.apply(T.dag(), t)
+    qfun.apply(H, t)
+    return qfun
+
+
+def _x_circuit() -> QRoutine:
+    """X as H Z H, so that the X with one control become CSIGN."""
+    qfun = QRoutine()
+    wire = qfun.new_wires(1)
+    qfun.apply(H, wire)
+    qfun.apply(Z, wire)
+    qfun.apply(H, wire)
+    return qfun
+
+
+def _rccx_matrix() -> np.ndarray:
+    mat = np.eye(8, dtype=complex)
+    mat[6:, 6:] = [[0, -1j], [1j, 0]]
+    mat[5, 5] = -1
+    return mat
+
+
+# Linked in place of the Toffoli of the QLM
+ccnot = AbstractGate("CCNOT", [], arity=3, circuit_generator=_ccnot_circuit)
+# Linked in place of the X of the QLM
+x = AbstractGate("X", [], arity=1, circuit_generator=_x_circuit)
+rccx = AbstractGate(
+    "RCCX",
+    [],
+    arity=3,
+    matrix_generator=_rccx_matrix,
+    circuit_generator=_rccx_circuit,
+)
+
+_GATES = {"X": X, "CNOT": CNOT, "CCNOT": CCNOT, "RCCX": rccx(), "D-RCCX": rccx().dag()}
+
+
+def get_required_ancillae(nctrls: int) -> int:
+    """The ancillae of an X with nctrls controls, of any kind."""
+    return max(nctrls - 2, 0)
+
+
+def _check_ancillae(ancillae: str):
+    if ancillae not in ANCILLAE:
+        raise ValueError(f"Unknown ancillae {ancillae}, expected one of {ANCILLAE}")
+
+
+def _chain(ctrls: Sequence, anc: Sequence, name: str) -> Iterator[Tuple[str, tuple]]:
+    """anc[i] ^= AND of ctrls[: i + 2], for the clean ancillae."""
+    yield name, (ctrls[0], ctrls[1], anc[0])
+    for i in range(2, len(anc) + 1):
+        yield name, (ctrls[i], anc[i - 2], anc[i - 1])
+
+
+def _ladder(ctrls: Sequence, anc: Sequence) -> Iterator[Tuple[str, tuple]]:
+    """Toggle anc[-1] by the AND of ctrls[:-1], leaving the other dirty
+    ancillae toggled by the partial ANDs (Lemma 7.2 of [BBCD95])."""
+    m = len(anc)
+    for i in range(m, 1, -1):
+        yield "CCNOT", (ctrls[i], anc[i - 2], anc[i - 1])
+    yield "CCNOT", (ctrls[0], ctrls[1], anc[0])
+    for i in range(2, m + 1):
+        yield "CCNOT", (ctrls[i], anc[i - 2], anc[i - 1])
+
+
+def mcx_ops(
+    ctrls: Sequence, target, anc: Sequence, ancillae: str = "clean"
+) -> Iterator[Tuple[str, tuple]]:
+    """Yield the gates of an X on target controlled by ctrls, as (name, qbits)
+    with name X, CNOT, CCNOT, RCCX or D-RCCX.
+
+    :param anc: at least len(ctrls) - 2 ancillae, the extra ones are not used
+    :param ancillae: the kind of the ancillae, one of :data:`ANCILLAE`
+    """
+    _check_ancillae(ancillae)
+    n = len(ctrls)
+    if n <= 2:
+        yield ("X", "CNOT", "CCNOT")[n], tuple(ctrls) + (target,)
+        return
+    anc = anc[: n - 2]
+    if len(anc) < n - 2:
+        raise ValueError(f"{n} controls need {n - 2} ancillae, got {len(anc)}")
+    last = ("CCNOT", (ctrls[-1], anc[-1], target))
+    if ancillae == "dirty":
+        yield last
+        yield from _ladder(ctrls, anc)
+        yield last
+        yield from _ladder(ctrls, anc)
+        return
+    name = "RCCX" if ancillae == "relative" else "CCNOT"
+    yield from _chain(ctrls, anc, name)
+    yield last
+    for name, qbits in reversed(list(_chain(ctrls, anc, name))):
+        yield ("D-RCCX" if name == "RCCX" else name), qbits
+
+
+@build_gate("MCX", [int, str])
+@cached_routine
+def mcx(nctrls: int, ancillae: str = "clean") -> QRoutine:
+    """X on the wire after the nctrls controls. The dirty ancillae are the
+    wires following the target, the clean ones are ancillae of the routine.
+
+    :param ancillae: one of :data:`ANCILLAE`
+    """
+    _check_ancillae(ancillae)
+    qfun = QRoutine()
+    ctrls = qfun.new_wires(nctrls)
+    target = qfun.new_wires(1)[0]
+    n_anc = get_required_ancillae(nctrls)
+    anc = qfun.new_wires(n_anc) if n_anc else []
+    if n_anc and ancillae != "dirty":
+        qfun.set_ancillae(*anc)
+    for name, qbits in mcx_ops(ctrls, target, anc, ancillae):
+        qfun.apply(_GATES[name], *qbits)
+    return qfun
+
+
+def mcx_resources(
+    nctrls: int,
+    ancillae: str = "clean",
+    track_depth: bool = True,
+    tracker=Resources,
+) -> Resources:
+    """Resources of :func:`mcx`, without building it.
+
+    :param tracker: the Resources class (or factory) replaying the gates, f.e.
+        an :class:`~qat.external.utils.opstream.OpStreamWriter`
+    """
+    n_anc = get_required_ancillae(nctrls)
+    if ancillae == "dirty":
+        res = tracker(nctrls + 1 + n_anc, 0, track_depth)
+        anc = list(range(nctrls + 1, nctrls + 1 + n_anc))
+    else:
+        res = tracker(nctrls + 1, 0, track_depth)
+        anc = res.new_ancillae(n_anc)
+    _mcx_track(res, list(range(nctrls)), nctrls, anc, ancillae)
+    if ancillae != "dirty":
+        res.release_ancillae(anc)
+    return res
+
+
+def _mcx_track(res: Resources, ctrls, target: int, anc, ancillae: str):
+    for name, qbits in mcx_ops(ctrls, target, anc, ancillae):
+        res.apply(name, *qbits)
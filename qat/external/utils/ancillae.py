@@ -0,0 +1,102 @@
+"""Pool of ancilla qubits shared by the routines applied to a Program.
+
+Inside a QRoutine, the QLM already reuses the wires tagged with
+`set_ancillae` (f.e. the cin of the Cuccaro adder) once the routine returns.
+The routines that leave their ancillae dirty, or whose ancillae must outlive
+them, take them as explicit arguments instead, so each call adds new qubits
+to the circuit.
+
+:class:`AncillaPool` hands out the qubits of a Program to the routines applied
+one after the other:
+
+- :meth:`AncillaPool.release` returns qubits that have been uncomputed (i.e.
+  they are back to 0), so that the next :meth:`AncillaPool.get` reuses them
+- :meth:`AncillaPool.discard` is for qubits that only hold classical garbage
+  (f.e. the swap ancillae of the GJISD). If the pool is created with
+  measure_reset, they are measured into new cbits and reset, and then
+  reused; otherwise they stay allocated until the end of the circuit
+
+The pool counts the live qubits, i.e. the ones taken and not yet given back,
+and records the peak reached inside each named routine (see
+:meth:`AncillaPool.routine`).
+
+WARN: intermediate measurements make the circuit non-unitary, so it can't be
+daggered nor controlled anymore, and the simulators sample it shot by shot.
+"""
+import contextlib
+import logging
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence
+
+if TYPE_CHECKING:
+    from qat.lang.AQASM.bits import Cbit, Qbit
+    from qat.lang.AQASM.program import Program
+
+LOGGER = logging.getLogger(__name__)
+
+
+class AncillaPool:
+    """Allocator of the ancillae of a Program.
+
+    :param program: the Program the qubits are allocated in
+    :param measure_reset: if True, the discarded qubits are measured and reset,
+        and then reused
+    """
+
+    def __init__(self, program: "Program", measure_reset: bool = False):
+        self.program = program
+        self.measure_reset = measure_reset
+        # The number of qubits allocated by the pool
+        self.allocated = 0
+        self.live = 0
+        self.peak = 0
+        # The peak of live qubits reached inside each routine
+        self.peaks: Dict[str, int] = {}
+        self._free: List["Qbit"] = []
+        self._scopes: List[str] = []
+
+    def get(self, n: int = 1) -> List["Qbit"]:
+        """Return n qubits in state 0, reusing the released ones first."""
+        reused = min(n, len(self._free))
+        qbits = [self._free.pop() for _ in range(reused)]
+        if n > reused:
+            qbits.extend(self.program.qalloc(n - reused))
+            self.allocated += n - reused
+        self.live += n
+        if self.live > self.peak:
+            self.peak = self.live
+        for name in self._scopes:
+            self.peaks[name] = max(self.peaks[name], self.live)
+        return qbits
+
+    def release(self, qbits: Sequence["Qbit"]):
+        """Give back qubits that are in state 0 again."""
+        self.live -= len(qbits)
+        # Reused last released, first
+        self._free.extend(reversed(list(qbits)))
+
+    def discard(self, qbits: Sequence["Qbit"]) -> Optional[List["Cbit"]]:
+        """Give back qubits holding garbage.
+
+        :returns: the cbits with the measured values if measure_reset, None
+            otherwise (the qubits are not reused, and keep their values until
+            the end of the circuit)
+        """
+        if not self.measure_reset:
+            return None
+        cbits = list(self.program.calloc(len(qbits)))
+        self.program.measure(list(qbits), cbits)
+        self.program.reset(list(qbits))
+        self.release(qbits)
+        return cbits
+
+    @contextlib.contextmanager
+    def routine(self, name: str) -> Iterator["AncillaPool"]:
+        """Record in :attr:`peaks` the peak of live qubits reached while
+        applying the routine `name`, nested routines included."""
+        self._scopes.append(name)
+        self.peaks[name] = max(self.peaks.get(name, 0), self.live)
+        try:
+            yield self
+        finally:
+            self._scopes.pop()
+            LOGGER.debug("%s: peak of %d live qubits", name, self.peaks[name])
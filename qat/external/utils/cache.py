@@ -0,0 +1,235 @@
+"""Memoization of the routine builders.
+
+The functions decorated with `build_gate` are called each time a routine is
+built directly (f.e. `(~adder)(...)`) or linked by `Program.to_circ`, so
+identical sub-routines are rebuilt from scratch. :func:`cached_routine` keeps
+a bounded LRU cache of the built routines, keyed on the parameters.
+
+Since the parameters of the builders are often unhashable (dict patterns,
+sets, numpy arrays), they are turned into hashable keys by :func:`freeze`.
+The patterns can be frozen once, when they are generated, using
+:class:`FrozenDict`, so that their hash is computed only once.
+
+The calls of the builders are recorded by the active trace of
+:mod:`qat.external.utils.tracing`, if any.
+"""
+import functools
+import importlib
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, NamedTuple
+
+import numpy as np
+
+from qat.external.utils import tracing
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MAXSIZE = 128
+
+_CACHES: Dict[str, "RoutineCache"] = {}
+_BUILDERS: Dict[str, "CachedRoutine"] = {}
+
+
+def freeze(obj: Any) -> Any:
+    """Return an immutable version of obj: dicts become :class:`FrozenDict`,
+    lists and tuples become tuples, sets become frozensets and numpy arrays
+    become read-only copies."""
+    if isinstance(obj, FrozenDict):
+        return obj
+    if isinstance(obj, dict):
+        return FrozenDict(obj)
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(i) for i in obj)
+    if isinstance(obj, (set, frozenset)):
+        return frozenset(obj)
+    if isinstance(obj, np.ndarray):
+        if not obj.flags.writeable:
+            return obj
+        arr = obj.copy()
+        arr.setflags(write=False)
+        return arr
+    return obj
+
+
+def hashable_key(obj: Any) -> Hashable:
+    """Return a hashable key identifying the content of obj."""
+    if isinstance(obj, FrozenDict):
+        return obj
+    if isinstance(obj, dict):
+        return FrozenDict(obj)
+    if isinstance(obj, (list, tuple)):
+        return tuple(hashable_key(i) for i in obj)
+    if isinstance(obj, (set, frozenset)):
+        return frozenset(obj)
+    if isinstance(obj, np.ndarray):
+        return ("ndarray", obj.shape, obj.dtype.str, obj.tobytes())
+    return obj
+
+
+class FrozenDict(dict):
+    """An immutable and hashable dict. Being a dict, it can be passed to the
+    gates whose parameters are declared as dict. The values are frozen as
+    well."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(
+            (k, freeze(v)) for k, v in dict(*args, **kwargs).items()
+        )
+        self._key = None
+        self._hash = None
+
+    def key(self) -> Hashable:
+        if self._key is None:
+            self._key = tuple(
+                sorted((k, hashable_key(v)) for k, v in self.items())
+            )
+        return self._key
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(self.key())
+        return self._hash
+
+    def __eq__(self, other):
+        if isinstance(other, FrozenDict):
+            return self is other or (
+                hash(self) == hash(other) and self.key() == other.key()
+            )
+        if isinstance(other, dict):
+            return self.key() == FrozenDict(other).key()
+        return NotImplemented
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("FrozenDict is immutable")
+
+    __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class RoutineCache:
+    """Bounded LRU cache of built routines, with hit/miss counters."""
+
+    def __init__(self, name: str, maxsize: int = DEFAULT_MAXSIZE):
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            value = build()
+            self._data[key] = value
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return value
+        self.hits += 1
+        self._data.move_to_end(key)
+        return value
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+    def clear(self):
+        self.hits = self.misses = 0
+        self._data.clear()
+
+
+class CachedRoutine:
+    """A routine builder wrapped with a :class:`RoutineCache`, see
+    :func:`cached_routine`."""
+
+    def __init__(self, func: Callable, maxsize: int = DEFAULT_MAXSIZE):
+        functools.update_wrapper(self, func)
+        # build_gate copies the __dict__ of the builder into the gate, which is
+        # serialized by value: keep the cache out of it
+        self._cache_name = f"{func.__module__}:{func.__qualname__}"
+        _CACHES[self._cache_name] = RoutineCache(self._cache_name, maxsize)
+        _BUILDERS[self._cache_name] = self
+
+    @property
+    def cache(self) -> RoutineCache:
+        return _CACHES[self._cache_name]
+
+    def __call__(self, *args, **kwargs):
+        key = (hashable_key(args), hashable_key(tuple(sorted(kwargs.items()))))
+        if tracing.ACTIVE:
+            cache = self.cache
+            misses = cache.misses
+            return tracing.call(
+                self._cache_name,
+                lambda: cache.get(key, lambda: self.__wrapped__(*args, **kwargs)),
+                lambda: cache.misses == misses,
+            )
+        return self.cache.get(key, lambda: self.__wrapped__(*args, **kwargs))
+
+    def cache_info(self) -> CacheInfo:
+        return self.cache.info()
+
+    def cache_clear(self):
+        self.cache.clear()
+
+    def __reduce__(self):
+        # The QLM serializes the gate generators: pickle the builder by
+        # reference, otherwise the whole cache would be serialized with it
+        return (_get_builder, (self._cache_name,))
+
+
+def _get_builder(name: str) -> CachedRoutine:
+    if name not in _BUILDERS:
+        importlib.import_module(name.split(":")[0])
+    return _BUILDERS[name]
+
+
+def cached_routine(func: Callable = None, *, maxsize: int = DEFAULT_MAXSIZE):
+    """Decorator memoizing a routine builder. It must be applied below
+    `build_gate`, i.e. directly on the builder, f.e.
+
+    .. code-block::
+
+        @build_gate("ROWADD", [int, int, int, frozenset])
+        @cached_routine
+        def get_row_addition(r, n, pivot_idx, skip_cols):
+            ...
+
+    The returned routine is shared among all the callers with the same
+    parameters, so it must not be modified after it is returned.
+    """
+    if func is None:
+        return functools.partial(cached_routine, maxsize=maxsize)
+    return CachedRoutine(func, maxsize)
+
+
+def get_cache(builder: Callable) -> RoutineCache:
+    """Return the cache of a builder decorated with :func:`cached_routine`.
+    builder can also be the gate returned by `build_gate`."""
+    return getattr(builder, "circuit_generator", builder).cache
+
+
+def cache_info() -> Dict[str, CacheInfo]:
+    """Return the statistics of all the routine caches, by builder name."""
+    return {name: cache.info() for name, cache in _CACHES.items()}
+
+
+def cache_clear():
+    """Empty all the routine caches and reset their counters."""
+    for cache in _CACHES.values():
+        cache.clear()
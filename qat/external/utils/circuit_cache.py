@@ -0,0 +1,222 @@
+"""Persistent cache of the compiled circuits.
+
+Compiling a program (`Program.to_circ`) links and serializes all its gates,
+and it's often the most expensive step of a test or of a sweep, while the
+same routines are compiled again and again, f.e. the GJISD of the same size
+for each random matrix. :class:`CircuitCache` stores the compiled circuits on
+disk, content addressed: the key is the digest of
+
+- the name of the routine (or any name identifying the program)
+- its parameters, see :func:`digest`
+- the version of the sources of `qat.external` and of myQLM
+- the arguments of `to_circ`, f.e. include_matrices or submatrices_only
+
+so that a change of any of them is a miss, and stale entries are never
+loaded. The circuits are loaded by memory-mapping their files, and the
+least recently used ones are evicted when the size of the cache exceeds
+max_bytes.
+"""
+import functools
+import hashlib
+import logging
+import mmap
+import os
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from qat.core.wrappers.circuit import Circuit
+
+LOGGER = logging.getLogger(__name__)
+
+# Environment variable overriding the default directory of the cache
+CACHE_DIR_ENV = "QAT_CIRCUIT_CACHE"
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "qat-external" / "circuits"
+DEFAULT_MAX_BYTES = 1 << 30
+_SUFFIX = ".circ"
+
+
+def _encode(obj: Any) -> Any:
+    """A canonical form of obj, whose repr does not depend on the insertion
+    order of dicts and sets."""
+    if isinstance(obj, dict):
+        return ("dict", tuple(sorted((repr(k), _encode(v)) for k, v in obj.items())))
+    if isinstance(obj, (list, tuple)):
+        return ("seq", tuple(_encode(i) for i in obj))
+    if isinstance(obj, (set, frozenset)):
+        return ("set", tuple(sorted(repr(_encode(i)) for i in obj)))
+    if isinstance(obj, np.ndarray):
+        return ("ndarray", obj.shape, obj.dtype.str, obj.tobytes())
+    if isinstance(obj, np.generic):
+        return _encode(obj.item())
+    if obj is None or isinstance(obj, (bool, int, float, complex, str, bytes)):
+        return (type(obj).__name__, repr(obj))
+    raise TypeError(f"Can't digest a {type(obj).__name__}")
+
+
+def digest(*parts: Any) -> str:
+    """The sha256 of the canonical form of parts, made of dicts, sequences,
+    sets, numpy arrays and scalars."""
+    return hashlib.sha256(repr(_encode(parts)).encode()).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def source_version() -> str:
+    """The digest of the sources of `qat.external`, and the version of
+    myQLM."""
+    sha = hashlib.sha256()
+    root = Path(__file__).resolve().parents[1]
+    for path in sorted(root.rglob("*.py")):
+        sha.update(str(path.relative_to(root)).encode())
+        sha.update(path.read_bytes())
+    try:
+        from importlib.metadata import version
+
+        sha.update(version("myqlm").encode())
+    except Exception:  # pylint: disable=broad-except
+        LOGGER.debug("myqlm version not found")
+    return sha.hexdigest()
+
+
+class CircuitCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    max_bytes: int
+    entries: int
+    size: int
+
+
+class CircuitCache:
+    """Bounded on-disk LRU cache of compiled circuits.
+
+    :param directory: default the `QAT_CIRCUIT_CACHE` environment variable,
+        or ~/.cache/qat-external/circuits
+    :param max_bytes: the size of the cache after an insertion
+    """
+
+    def __init__(
+        self,
+        directory: Optional[os.PathLike] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        if directory is None:
+            directory = os.getenv(CACHE_DIR_ENV, DEFAULT_CACHE_DIR)
+        self.directory = Path(directory)
+        self._tmp_dir = self.directory / "tmp"
+        self._tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, name: str, params: Any = (), compile_kwargs: Optional[Dict] = None):
+        """The key of the circuit of the routine name with parameters params,
+        compiled with `to_circ(**compile_kwargs)`."""
+        return digest(name, params, compile_kwargs or {}, source_version())
+
+    def _path(self, key: str) -> Path:
+        return self.directory / (key + _SUFFIX)
+
+    def get(self, key: str) -> Optional["Circuit"]:
+        """The circuit stored with key, None if missing."""
+        from qat.core import Circuit
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fin:
+                with mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    circuit = Circuit.from_bytes(data)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:  # pylint: disable=broad-except
+            # Truncated or written by an incompatible version
+            LOGGER.warning("Removing the unreadable entry %s", path, exc_info=True)
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+        # The modification time orders the entries for the eviction
+        os.utime(path)
+        self.hits += 1
+        return circuit
+
+    def put(self, key: str, circuit: "Circuit"):
+        """Store circuit, then evict the least recently used entries."""
+        # Written aside and renamed, so that the concurrent readers never see
+        # a partial file. dump adds the suffix if missing
+        fd, tmp = tempfile.mkstemp(dir=self._tmp_dir, suffix=_SUFFIX)
+        os.close(fd)
+        try:
+            circuit.dump(tmp)
+            os.replace(tmp, self._path(key))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        self.evict()
+
+    def get_or_compile(self, key: str, build: Callable[[], "Circuit"]) -> "Circuit":
+        """The circuit stored with key, built by build and stored if missing."""
+        circuit = self.get(key)
+        if circuit is None:
+            circuit = build()
+            self.put(key, circuit)
+        return circuit
+
+    def compile_routine(self, gate, *params, **compile_kwargs) -> "Circuit":
+        """The circuit of a gate built by `build_gate`, applied to all the
+        qubits of a new program.
+
+        :param compile_kwargs: the arguments of `to_circ`
+        """
+        from qat.lang.AQASM.program import Program
+
+        builder = getattr(gate, "circuit_generator", gate)
+        name = f"{builder.__module__}:{builder.__qualname__}"
+
+        def build():
+            program = Program()
+            arity = builder(*params).arity
+            program.apply(gate(*params), program.qalloc(arity))
+            return program.to_circ(**compile_kwargs)
+
+        return self.get_or_compile(self.key(name, params, compile_kwargs), build)
+
+    def _entries(self) -> List[os.DirEntry]:
+        return [
+            entry
+            for entry in os.scandir(self.directory)
+            if entry.name.endswith(_SUFFIX)
+        ]
+
+    def evict(self):
+        """Remove the least recently used entries, until the size of the
+        cache is max_bytes at most."""
+        entries = sorted(self._entries(), key=lambda e: e.stat().st_mtime_ns)
+        size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if size <= self.max_bytes:
+                break
+            size -= entry.stat().st_size
+            LOGGER.debug("Evicting %s", entry.name)
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def info(self) -> CircuitCacheInfo:
+        entries = self._entries()
+        return CircuitCacheInfo(
+            self.hits,
+            self.misses,
+            self.max_bytes,
+            len(entries),
+            sum(entry.stat().st_size for entry in entries),
+        )
+
+    def clear(self):
+        """Remove all the entries and reset the counters."""
+        for entry in self._entries():
+            os.remove(entry.path)
+        self.hits = self.misses = 0
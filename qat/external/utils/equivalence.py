@@ -0,0 +1,162 @@
+"""Equivalence of the reversible circuits of two variants of a routine.
+
+The optimized variants of a routine (f.e. the GJISD of
+:mod:`~qat.external.qroutines.linalg.gauss_jordan_isd4` w.r.t. the RREF of
+:mod:`~qat.external.qroutines.linalg._rref`, or the TKK adder w.r.t. the
+Cuccaro one) must compute the same function on the qubits that matter, while
+the ancillae and the garbage may differ. :func:`check_equivalence` compares
+two :class:`~qat.external.utils.template.CircuitTemplate` with the same input
+registers on the chosen output qubits:
+
+- exhaustively, if the inputs have max_exhaustive bits at most, running all
+  of them through the bit-sliced reversible simulator, batch inputs at a time
+- otherwise on samples random inputs, so that the equivalence is not proven,
+  see :attr:`EquivalenceResult.exhaustive`
+
+The first mismatch found is returned as a counterexample, as the value of
+each input register, which can be passed to
+:meth:`~qat.external.utils.template.CircuitTemplate.run` to inspect it.
+"""
+import logging
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from qat.external.qpus import reversible
+from qat.external.utils.template import CircuitTemplate
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MAX_EXHAUSTIVE = 20
+DEFAULT_SAMPLES = 1 << 16
+DEFAULT_BATCH = 1 << 16
+
+
+class EquivalenceResult(NamedTuple):
+    equivalent: bool
+    # True if all the inputs have been checked, i.e. the equivalence is proven
+    exhaustive: bool
+    # The number of inputs checked, up to the counterexample included
+    checked: int
+    # The values of the input registers on which the circuits differ, as ints
+    # (MSB on the first qubit), None if equivalent
+    counterexample: Optional[Dict[str, int]]
+
+    def __bool__(self) -> bool:
+        return self.equivalent
+
+
+def _exhaustive_batches(nbits: int, batch: int) -> Iterator[tuple]:
+    """All the nbits-long inputs, as (nbits x nwords) words, MSB first."""
+    for start in range(0, 1 << nbits, batch):
+        values = np.arange(start, min(start + batch, 1 << nbits), dtype=np.int64)
+        yield reversible.pack_ints(values, nbits)[::-1], len(values)
+
+
+def _random_batches(
+    nbits: int, samples: int, batch: int, rng: np.random.Generator
+) -> Iterator[tuple]:
+    for start in range(0, samples, batch):
+        size = min(batch, samples - start)
+        words = rng.integers(
+            0, 1 << 64, size=(nbits, -(-size // 64)), dtype=np.uint64
+        )
+        yield words.astype("<u8"), size
+
+
+def _run(template: CircuitTemplate, qbits: List[int], inputs, size) -> np.ndarray:
+    rpr = template.rprogram
+    words = rpr.new_words(size)
+    words[qbits] = inputs
+    return rpr.run_words(words)
+
+
+def _first_mismatch(diff: np.ndarray, size: int) -> Optional[int]:
+    """The first of the size lanes set in the (nwords,) diff, None if none."""
+    tail = size % 64
+    if tail:
+        diff[-1] &= np.uint64((1 << tail) - 1)
+    words = np.flatnonzero(diff)
+    if not len(words):
+        return None
+    word = int(diff[words[0]])
+    return 64 * int(words[0]) + (word & -word).bit_length() - 1
+
+
+def _lane_values(
+    inputs: np.ndarray, lane: int, sizes: Dict[str, int]
+) -> Dict[str, int]:
+    """The value of each input register in a lane of the inputs words."""
+    bits = (inputs[:, lane // 64] >> np.uint64(lane % 64)) & np.uint64(1)
+    values = {}
+    start = 0
+    for name, size in sizes.items():
+        values[name] = int("".join(map(str, bits[start : start + size])) or "0", 2)
+        start += size
+    return values
+
+
+def check_equivalence(
+    template_a: CircuitTemplate,
+    template_b: CircuitTemplate,
+    outputs_a: Sequence[int],
+    outputs_b: Sequence[int],
+    max_exhaustive: int = DEFAULT_MAX_EXHAUSTIVE,
+    samples: int = DEFAULT_SAMPLES,
+    batch: int = DEFAULT_BATCH,
+    seed: Optional[int] = None,
+) -> EquivalenceResult:
+    """Check that two circuits compute the same outputs for the same inputs.
+
+    :param template_a: the reference circuit, whose qubits other than the
+        inputs start at 0
+    :param template_b: the variant, with the same input names and sizes
+    :param outputs_a: the output qubits of template_a, compared in order with
+        outputs_b, f.e. `template_a.qubits("a", "b")`
+    :param outputs_b: the output qubits of template_b
+    :param max_exhaustive: the number of input bits up to which all the inputs
+        are checked
+    :param samples: the number of random inputs checked beyond max_exhaustive
+    :param batch: the number of inputs simulated at once
+    :param seed: the seed of the random inputs
+    :raises ValueError: if the inputs or the outputs don't match
+    """
+    sizes = {name: len(qbits) for name, qbits in template_a.inputs.items()}
+    sizes_b = {name: len(qbits) for name, qbits in template_b.inputs.items()}
+    if sizes != sizes_b:
+        raise ValueError(f"Inputs {sizes} and {sizes_b} don't match")
+    if len(outputs_a) != len(outputs_b):
+        raise ValueError(
+            f"{len(outputs_a)} and {len(outputs_b)} output qubits don't match"
+        )
+    if batch <= 0 or batch % 64:
+        raise ValueError(f"Batch {batch} is not a positive multiple of 64")
+    qbits_a = template_a.qubits(*sizes)
+    qbits_b = template_b.qubits(*sizes)
+    nbits = len(qbits_a)
+    exhaustive = nbits <= max_exhaustive
+    if exhaustive:
+        batches = _exhaustive_batches(nbits, batch)
+    else:
+        batches = _random_batches(nbits, samples, batch, np.random.default_rng(seed))
+    LOGGER.info(
+        "Checking %d input bits, %s",
+        nbits,
+        "exhaustively" if exhaustive else f"on {samples} samples",
+    )
+
+    checked = 0
+    for inputs, size in batches:
+        words_a = _run(template_a, qbits_a, inputs, size)
+        words_b = _run(template_b, qbits_b, inputs, size)
+        diff = np.bitwise_or.reduce(
+            words_a[list(outputs_a)] ^ words_b[list(outputs_b)], axis=0
+        )
+        lane = _first_mismatch(diff, size)
+        if lane is not None:
+            checked += lane + 1
+            counterexample = _lane_values(inputs, lane, sizes)
+            LOGGER.info("Circuits differ on %s", counterexample)
+            return EquivalenceResult(False, exhaustive, checked, counterexample)
+        checked += size
+    return EquivalenceResult(True, exhaustive, checked, None)
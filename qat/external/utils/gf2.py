@@ -0,0 +1,268 @@
+"""Matrices over GF(2), with the rows packed in 64-bit words.
+
+Row additions are XORs of whole words, so the reductions of matrices with
+hundreds of rows take milliseconds. Besides the usual reduced row echelon form,
+:func:`gji_rref` reproduces exactly the classical behaviour of
+:func:`qat.external.qroutines.linalg.gauss_jordan_isd4.get_rref`, and is thus
+the reference for its outputs.
+"""
+import logging
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+WORD_BITS = 64
+
+
+def n_words(ncols: int) -> int:
+    return (ncols + WORD_BITS - 1) // WORD_BITS
+
+
+def pack_rows(array: np.ndarray) -> np.ndarray:
+    """Pack the last axis of a binary array in 64-bit words; column c is bit
+    c % 64 of word c // 64."""
+    array = np.asarray(array, dtype=np.uint8)
+    ncols = array.shape[-1]
+    padded = np.zeros(array.shape[:-1] + (n_words(ncols) * WORD_BITS,), np.uint8)
+    padded[..., :ncols] = array & 1
+    packed = np.packbits(padded, axis=-1, bitorder="little")
+    return packed.view("<u8").astype(np.uint64)
+
+
+def unpack_rows(words: np.ndarray, ncols: int) -> np.ndarray:
+    """Inverse of :func:`pack_rows`."""
+    as_bytes = np.ascontiguousarray(words, dtype="<u8").view(np.uint8)
+    return np.unpackbits(as_bytes, axis=-1, count=ncols, bitorder="little")
+
+
+def columns_mask(ncols: int, cols: Iterable[int]) -> np.ndarray:
+    """The words of a row having 1 in the given columns."""
+    mask = np.zeros(ncols, dtype=np.uint8)
+    mask[list(cols)] = 1
+    return pack_rows(mask)
+
+
+class GF2Matrix:
+    """Matrix over GF(2).
+
+    :param words: the (nrows x ceil(ncols / 64)) uint64 array of the packed
+        rows, see :func:`pack_rows`. The padding bits must be 0
+    :param ncols: the number of columns
+    """
+
+    __slots__ = ("words", "ncols")
+    __hash__ = None
+
+    def __init__(self, words: np.ndarray, ncols: int):
+        if words.ndim != 2 or words.shape[1] != n_words(ncols):
+            raise ValueError(f"Wrong shape {words.shape} for {ncols} columns")
+        self.words = words
+        self.ncols = ncols
+
+    @classmethod
+    def from_array(cls, array) -> "GF2Matrix":
+        array = np.asarray(array)
+        if array.ndim != 2:
+            raise ValueError("Only 2D arrays can be converted")
+        return cls(pack_rows(array), array.shape[1])
+
+    @classmethod
+    def zeros(cls, nrows: int, ncols: int) -> "GF2Matrix":
+        return cls(np.zeros((nrows, n_words(ncols)), dtype=np.uint64), ncols)
+
+    @classmethod
+    def identity(cls, n: int) -> "GF2Matrix":
+        return cls.from_array(np.eye(n, dtype=np.uint8))
+
+    @classmethod
+    def random(
+        cls, nrows: int, ncols: int, rng: Optional[np.random.Generator] = None
+    ) -> "GF2Matrix":
+        rng = np.random.default_rng() if rng is None else rng
+        return cls.from_array(rng.integers(0, 2, (nrows, ncols), dtype=np.uint8))
+
+    @property
+    def nrows(self) -> int:
+        return self.words.shape[0]
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.nrows, self.ncols
+
+    def to_array(self) -> np.ndarray:
+        return unpack_rows(self.words, self.ncols)
+
+    def copy(self) -> "GF2Matrix":
+        return GF2Matrix(self.words.copy(), self.ncols)
+
+    def __getitem__(self, key: Tuple[int, int]) -> int:
+        row, col = key
+        word, bit = divmod(col, WORD_BITS)
+        return int(self.words[row, word] >> np.uint64(bit)) & 1
+
+    def column(self, col: int) -> np.ndarray:
+        """The bits of a column, as a bool array."""
+        word, bit = divmod(col, WORD_BITS)
+        return ((self.words[:, word] >> np.uint64(bit)) & np.uint64(1)).astype(bool)
+
+    def columns(self, cols: Iterable[int]) -> "GF2Matrix":
+        """The submatrix with the given columns, in the given order."""
+        return GF2Matrix.from_array(self.to_array()[:, list(cols)])
+
+    def add_row(self, dst, src: int, mask: Optional[np.ndarray] = None):
+        """Add in place row src to row(s) dst, only on the columns of mask (see
+        :func:`columns_mask`) if given."""
+        row = self.words[src] if mask is None else self.words[src] & mask
+        self.words[dst] ^= row
+
+    def rref(self) -> Tuple["GF2Matrix", List[int]]:
+        """The reduced row echelon form, with row swaps to find the pivots.
+
+        :returns: the reduced matrix and the columns of the pivots
+        """
+        words = self.words.copy()
+        pivots = []
+        row = 0
+        for col in range(self.ncols):
+            if row == self.nrows:
+                break
+            word, bit = divmod(col, WORD_BITS)
+            ones = np.flatnonzero((words[:, word] >> np.uint64(bit)) & np.uint64(1))
+            below = ones[ones >= row]
+            if not below.size:
+                continue
+            if below[0] != row:
+                words[[row, below[0]]] = words[[below[0], row]]
+            ones = ones[ones != row] if below[0] == row else ones[ones != below[0]]
+            words[ones] ^= words[row]
+            pivots.append(col)
+            row += 1
+        return GF2Matrix(words, self.ncols), pivots
+
+    def rank(self) -> int:
+        return len(self.rref()[1])
+
+    def transpose(self) -> "GF2Matrix":
+        return GF2Matrix.from_array(self.to_array().T)
+
+    @property
+    def T(self) -> "GF2Matrix":
+        return self.transpose()
+
+    def __matmul__(self, other: "GF2Matrix") -> "GF2Matrix":
+        if self.ncols != other.nrows:
+            raise ValueError(f"Can't multiply {self.shape} by {other.shape}")
+        # Each row of the result is the sum of the rows of other selected by
+        # the row of self
+        words = np.zeros((self.nrows, other.words.shape[1]), dtype=np.uint64)
+        selection = self.to_array().astype(bool)
+        for k in range(self.ncols):
+            words[selection[:, k]] ^= other.words[k]
+        return GF2Matrix(words, other.ncols)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, GF2Matrix):
+            return NotImplemented
+        return self.ncols == other.ncols and np.array_equal(self.words, other.words)
+
+    def __repr__(self) -> str:
+        return f"GF2Matrix(\n{self.to_array()})"
+
+
+class GJIResult(NamedTuple):
+    """Output of :func:`gji_rref`.
+
+    - matrix: the matrix as left by the circuit. Apart from the pivots, the
+      pivot columns keep the values they had when the pivot was processed
+    - swaps: the values of the swap ancillae, in the order of the circuit
+    - transform: the r x r matrix U of the row operations, i.e. U @ original
+      is equal to matrix on the columns never skipped, and on the pivot columns
+      it is the (clean) reduced column
+    """
+
+    matrix: GF2Matrix
+    swaps: np.ndarray
+    transform: GF2Matrix
+
+    @property
+    def success(self) -> bool:
+        """If all the pivots are 1, i.e. the leftmost r x r submatrix is
+        invertible."""
+        return all(self.matrix[x, x] for x in range(self.matrix.nrows))
+
+
+def gji_rref(
+    matrix: GF2Matrix, skip_rightmost: bool = False, norig: int = -1
+) -> GJIResult:
+    """Classical equivalent of
+    :func:`~qat.external.qroutines.linalg.gauss_jordan_isd4.get_rref`.
+
+    For each pivot x, the rows below are added to row x as long as the pivot is
+    0 (phase 1), then row x is added to each other row having 1 in column x,
+    except on column x itself (phase 2). The columns of the previous pivots,
+    and the columns r..norig-1 if skip_rightmost, are never changed.
+
+    :param matrix: the r x n matrix, possibly with the syndrome(s) appended
+    :param skip_rightmost: same as in get_rref
+    :param norig: same as in get_rref
+    """
+    r, n = matrix.shape
+    words = matrix.words.copy()[np.newaxis]
+    transform = GF2Matrix.identity(r).words[np.newaxis]
+    swaps = gji_reduce(words, n, skip_rightmost, norig, transform)
+    return GJIResult(GF2Matrix(words[0], n), swaps[0], GF2Matrix(transform[0], r))
+
+
+def gji_reduce(
+    words: np.ndarray,
+    ncols: int,
+    skip_rightmost: bool = False,
+    norig: int = -1,
+    transform: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Batched, in place version of :func:`gji_rref`.
+
+    :param words: the (batch x r x words) array of the packed matrices
+    :param ncols: the number of columns of the matrices
+    :param transform: if given, the (batch x r x words) array of packed
+        matrices to which the same row operations are applied, f.e. identities
+        to get the transforms
+    :returns: the (batch x swap_ancilla) array of the swap ancillae
+    """
+    batch, r, _ = words.shape
+    if r > ncols:
+        raise ValueError("The matrix must have at least as many columns as rows")
+    if norig < 0:
+        norig = ncols
+    swaps = np.zeros((batch, (r * (r - 1)) // 2), dtype=np.uint8)
+    swap_idx = 0
+    skip_cols = set(range(r, norig)) if skip_rightmost else set()
+    keep = columns_mask(ncols, (c for c in range(ncols) if c not in skip_cols))
+    for x in range(r):
+        word, bit = divmod(x, WORD_BITS)
+        col = (words[:, :, word] >> np.uint64(bit)) & np.uint64(1)
+        if x != r - 1:
+            # The rows below are added as long as the pivot is 0, i.e. up to
+            # the first one having 1 in the pivot column, included
+            below = col[:, x + 1 :]
+            added = (col[:, [x]] == 0) & (np.cumsum(below, axis=1) == below)
+            select = (np.uint64(0) - added.astype(np.uint64))[..., np.newaxis]
+            words[:, x] ^= np.bitwise_xor.reduce(words[:, x + 1 :] & select, 1) & keep
+            if transform is not None:
+                transform[:, x] ^= np.bitwise_xor.reduce(
+                    transform[:, x + 1 :] & select, 1
+                )
+            swaps[:, swap_idx : swap_idx + r - 1 - x] = added
+            swap_idx += r - 1 - x
+        keep = keep & ~columns_mask(ncols, [x])
+        col[:, x] = 0
+        select = (np.uint64(0) - col)[..., np.newaxis]
+        words ^= words[:, [x]] & keep & select
+        if transform is not None:
+            transform ^= transform[:, [x]] & select
+    if r == 1:
+        # The circuit never undoes the initial X on the only pivot
+        words[:, 0, 0] ^= np.uint64(1)
+    return swaps
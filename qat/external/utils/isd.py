@@ -0,0 +1,264 @@
+"""Classical Prange / Lee-Brickell information set decoding, mirroring the
+quantum circuits.
+
+Each iteration selects the columns moved to the end of the parity check matrix
+H with the same sorting network of
+:func:`qat.external.qroutines.linalg.matrix.move_columns_end_gate`, reduces the
+matrix with the syndrome appended with the same RREF of
+:func:`qat.external.qroutines.linalg.gauss_jordan_isd4.get_rref` (see
+:func:`qat.external.utils.gf2.gji_reduce`) and checks the weight of the
+reduced syndrome as :func:`qat.external.qroutines.hamming_weight_compute.fpc.
+get_qroutine_for_qubits_weight_check` does. The iterations are run in batches
+on bit-packed matrices, and the batches in a pool of worker processes.
+
+It is used to cross-validate the outputs of the circuits on random instances,
+and to measure the classical iteration rate.
+"""
+import concurrent.futures
+import itertools
+import logging
+import os
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from qat.external.qroutines.linalg import matrix as qmatrix
+from qat.external.utils.gf2 import gji_reduce, pack_rows, unpack_rows
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 256
+
+
+class ISDInstance(NamedTuple):
+    """Find e with weight(e) == weight and h @ e == syndrome (mod 2)."""
+
+    h: np.ndarray
+    syndrome: np.ndarray
+    weight: int
+
+    def check(self, error: np.ndarray) -> bool:
+        return int(error.sum()) == self.weight and np.array_equal(
+            self.h @ error % 2, self.syndrome
+        )
+
+
+class BatchResult(NamedTuple):
+    """The outcome of a batch of iterations: the errors found, the number of
+    iterations and how many of them had an invertible r x r submatrix."""
+
+    errors: List[np.ndarray]
+    iterations: int
+    invertible: int
+
+
+class ISDResult(NamedTuple):
+    error: Optional[np.ndarray]
+    iterations: int
+    elapsed: float
+
+    @property
+    def rate(self) -> float:
+        """Iterations per second."""
+        return self.iterations / self.elapsed if self.elapsed else float("inf")
+
+
+def random_instance(
+    r: int, n: int, weight: int, rng: Optional[np.random.Generator] = None
+) -> Tuple[ISDInstance, np.ndarray]:
+    """A random r x n parity check matrix and the syndrome of a random error
+    of the given weight.
+
+    :returns: the instance and the error
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    h = rng.integers(0, 2, (r, n), dtype=np.uint8)
+    error = np.zeros(n, dtype=np.uint8)
+    error[rng.choice(n, weight, replace=False)] = 1
+    return ISDInstance(h, h @ error % 2, weight), error
+
+
+def random_combs(
+    batch: int, r: int, n: int, n_lines: int, rng: np.random.Generator
+) -> np.ndarray:
+    """Random selections of the columns moved to the end: all but r of the n
+    columns of H, plus the padding ones up to n_lines.
+
+    :returns: the (batch x n_lines) bool array of the selections
+    """
+    combs = np.ones((batch, n_lines), dtype=bool)
+    left = np.argsort(rng.random((batch, n)), axis=1)[:, :r]
+    np.put_along_axis(combs, left, False, axis=1)
+    return combs
+
+
+def selection_permutations(combs: np.ndarray, data: dict) -> np.ndarray:
+    """The column permutations applied by `move_columns_end_gate`.
+
+    :param combs: the (batch x n_lines) bool array of the selected columns
+    :param data: data obtained from `matrix.move_columns_end_data`
+    :returns: the (batch x n_lines) array of the permutations, i.e. column j of
+        the output is column perms[:, j] of the input
+
+    WARN: if n is not a power of 2, the network doesn't move all the selected
+    columns to the end for every selection. The iterations use the actual
+    permutation, so the errors found are still correct.
+    """
+    combs = np.array(combs, dtype=bool)
+    perms = np.broadcast_to(np.arange(data["n_cols"]), combs.shape).copy()
+    swaps_pattern = data["swaps_pattern"]
+    order = np.argsort(data["layers"], kind="stable")
+    bounds = np.searchsorted(data["layers"][order], np.arange(data["n_layers"] + 1))
+    # The comparators of a layer act on disjoint lines
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        a = swaps_pattern[order[start:end], 1]
+        b = swaps_pattern[order[start:end], 2]
+        # The comparator swaps the lines when b is 0, see _build_gate_common
+        swap = ~combs[:, b]
+        for arr in (combs, perms):
+            arr_a, arr_b = arr[:, a], arr[:, b]
+            arr[:, a] = np.where(swap, arr_b, arr_a)
+            arr[:, b] = np.where(swap, arr_a, arr_b)
+    return perms
+
+
+def run_batch(
+    instance: ISDInstance, combs: np.ndarray, p: int = 0, data: Optional[dict] = None
+) -> BatchResult:
+    """Run one iteration for each selection.
+
+    :param instance: the instance to solve
+    :param combs: the selections, see :func:`random_combs`
+    :param p: the Lee-Brickell parameter, 0 for Prange. If p > 0, the rightmost
+        columns are reduced too (skip_rightmost is False) and the sums of up to
+        p of them are added to the syndrome
+    :param data: data obtained from `matrix.move_columns_end_data`, computed if
+        not given
+    """
+    r, n = instance.h.shape
+    if data is None:
+        data = qmatrix.move_columns_end_data(r, n)
+    n_lines = data["n_cols"]
+    perms = selection_permutations(combs, data)
+    # The syndrome is the last column, after the padding ones
+    ext = np.zeros((r, n_lines + 1), dtype=np.uint8)
+    ext[:, :n] = instance.h
+    ext[:, n_lines] = instance.syndrome
+    columns = np.concatenate(
+        (perms, np.full((len(perms), 1), n_lines, dtype=perms.dtype)), axis=1
+    )
+    words = pack_rows(np.moveaxis(ext[:, columns], 1, 0))
+    gji_reduce(words, n_lines + 1, p == 0, n_lines)
+    reduced = unpack_rows(words, n_lines + 1)
+    invertible = reduced[:, np.arange(r), np.arange(r)].all(axis=1)
+
+    errors = []
+    for idx in np.flatnonzero(invertible):
+        for error in _errors(instance, reduced[idx], perms[idx], p):
+            errors.append(error)
+    return BatchResult(errors, len(combs), int(invertible.sum()))
+
+
+def _errors(instance: ISDInstance, reduced: np.ndarray, perm: np.ndarray, p: int):
+    r, n = instance.h.shape
+    n_lines = len(perm)
+    syndrome = reduced[:, n_lines]
+    # Only the columns of H, not the padding ones
+    right = np.flatnonzero(perm[r:] < n) + r
+    for q in range(min(p, len(right)) + 1):
+        for cols in itertools.combinations(right, q):
+            candidate = syndrome ^ np.bitwise_xor.reduce(
+                reduced[:, list(cols)], axis=1, initial=0
+            ).astype(np.uint8)
+            if candidate.sum() == instance.weight - q:
+                error = np.zeros(n, dtype=np.uint8)
+                error[perm[:r]] = candidate
+                error[perm[list(cols)]] = 1
+                yield error
+
+
+def _run_random_batch(instance, p, data, batch_size, seed) -> BatchResult:
+    r, n = instance.h.shape
+    combs = random_combs(
+        batch_size, r, n, data["n_cols"], np.random.default_rng(seed)
+    )
+    return run_batch(instance, combs, p, data)
+
+
+def solve(
+    instance: ISDInstance,
+    p: int = 0,
+    max_iterations: Optional[int] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_workers: Optional[int] = None,
+    seed: Optional[int] = None,
+    stop: bool = True,
+) -> ISDResult:
+    """Run random iterations until an error is found.
+
+    :param instance: the instance to solve
+    :param p: the Lee-Brickell parameter, 0 for Prange
+    :param max_iterations: stop after (about) this many iterations, rounded up
+        to a multiple of batch_size. Required if stop is False
+    :param batch_size: the iterations of each task of the pool
+    :param max_workers: the number of worker processes, default the number of
+        cores. With 1, the iterations are run in this process
+    :param seed: the seed of the selections
+    :param stop: if False, run all the iterations even if an error is found,
+        f.e. to measure the iteration rate
+    :returns: the first error found (or None), the iterations run and the time
+    """
+    if max_iterations is None and not stop:
+        raise ValueError("max_iterations is required if stop is False")
+    r, n = instance.h.shape
+    data = qmatrix.move_columns_end_data(r, n)
+    max_workers = max_workers or os.cpu_count() or 1
+    seeds = np.random.SeedSequence(seed)
+    n_batches = (
+        itertools.count()
+        if max_iterations is None
+        else range(-(-max_iterations // batch_size))
+    )
+    args = ((instance, p, data, batch_size, s) for s in _spawn(seeds, n_batches))
+
+    error = None
+    iterations = 0
+    start = time.perf_counter()
+    if max_workers == 1:
+        for batch_args in args:
+            res = _run_random_batch(*batch_args)
+            iterations += res.iterations
+            if res.errors and error is None:
+                error = res.errors[0]
+                if stop:
+                    break
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+            # At most two pending tasks per worker
+            pending = {
+                executor.submit(_run_random_batch, *batch_args)
+                for batch_args in itertools.islice(args, 2 * max_workers)
+            }
+            while pending:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    res = future.result()
+                    iterations += res.iterations
+                    if res.errors and error is None:
+                        error = res.errors[0]
+                if error is not None and stop:
+                    for future in pending:
+                        future.cancel()
+                    break
+                for batch_args in itertools.islice(args, len(done)):
+                    pending.add(executor.submit(_run_random_batch, *batch_args))
+    elapsed = time.perf_counter() - start
+    LOGGER.info("%d iterations in %.3fs", iterations, elapsed)
+    return ISDResult(error, iterations, elapsed)
+
+
+def _spawn(seeds: np.random.SeedSequence, n_batches):
+    for _ in n_batches:
+        yield seeds.spawn(1)[0]
@@ -0,0 +1,255 @@
+"""Streaming of the gates of a routine to a binary file.
+
+The circuits of a full ISD iteration at cryptographic sizes have too many gates
+to be built as nested QRoutines and flattened by `to_circ`. The
+`<routine>_resources` functions of the qroutines (see
+:mod:`qat.external.utils.resources`) replay the exact gates of a routine on a
+tracker, so passing them an :class:`OpStreamWriter` as tracker writes the gates
+to disk as they are generated, keeping in memory at most one chain of gates
+(f.e. a row operation). See :func:`stream_routine`.
+
+The file is made of a 32 bytes header followed by a (n_ops x (1 + width))
+int32 array, so it can be memory-mapped by :class:`OpStream`. Each record
+contains the code of the operation, opcode + 4 * number of controls (the
+opcodes being the ones of :mod:`qat.external.qpus.reversible`), followed by
+the controls, the targets and -1 as padding.
+"""
+import logging
+import struct
+from collections import Counter
+from typing import Callable, Iterator, Optional, Sequence
+
+import numpy as np
+from qat.external.qpus.reversible import (
+    OP_SWAP,
+    OP_X,
+    RBits,
+    ROp,
+    decode_gate,
+    run_ops,
+    run_ops_batch,
+)
+from qat.external.utils.resources import Resources, canonical_gate_name
+
+LOGGER = logging.getLogger(__name__)
+
+MAGIC = b"QATOPS01"
+# magic, width, nbqbits, n_ops
+_HEADER = struct.Struct("<8sQQQ")
+DEFAULT_WIDTH = 3
+DEFAULT_CHUNK = 1 << 16
+
+
+def encode_op(op: ROp) -> int:
+    return op.opcode + 4 * len(op.ctrls)
+
+
+def _n_targets(opcode: int) -> int:
+    return 2 if opcode == OP_SWAP else 1
+
+
+def op_name(code: int) -> str:
+    """The canonical name of the gate of an encoded operation."""
+    opcode, nctrls = code & 3, code >> 2
+    base = {OP_X: "X", OP_SWAP: "SWAP"}[opcode]
+    return canonical_gate_name("C-" * nctrls + base)
+
+
+class OpStreamWriter(Resources):
+    """A :class:`Resources` tracker that also writes the gates to a file.
+
+    :param path: the output file
+    :param width: the maximum number of qubits of a gate
+    :param chunk_size: the number of single gates buffered before writing
+    """
+
+    def __init__(
+        self,
+        path: str,
+        nbqbits: int,
+        ancillae: int = 0,
+        track_depth: bool = False,
+        width: int = DEFAULT_WIDTH,
+        chunk_size: int = DEFAULT_CHUNK,
+    ):
+        super().__init__(nbqbits, ancillae, track_depth)
+        self.path = path
+        self.width = width
+        self.chunk_size = chunk_size
+        self.n_ops = 0
+        self._buffer = []
+        self._codes = {}
+        self._file = open(path, "wb")
+        self._file.write(_HEADER.pack(MAGIC, width, 0, 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _code(self, name: str) -> int:
+        try:
+            return self._codes[name]
+        except KeyError:
+            op = decode_gate(name, list(range(self.width + 1)))
+            nqbits = len(op.ctrls) + _n_targets(op.opcode)
+            if nqbits > self.width:
+                raise ValueError(
+                    f"Gate {name} acts on {nqbits} qubits, max is {self.width}"
+                )
+            self._codes[name] = encode_op(op)
+            return self._codes[name]
+
+    def apply(self, name: str, *qbits: int):
+        code = self._code(name)
+        super().apply(name, *qbits)
+        record = [code, *qbits]
+        record += [-1] * (self.width + 1 - len(record))
+        self._buffer.append(record)
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def apply_chain(self, name: str, shared: Sequence[int], *columns: Sequence[int]):
+        code = self._code(name)
+        super().apply_chain(name, shared, *columns)
+        m = len(columns[0])
+        if m == 0:
+            return
+        self.flush()
+        records = np.full((m, self.width + 1), -1, dtype=np.int32)
+        records[:, 0] = code
+        records[:, 1 : len(shared) + 1] = shared
+        for i, col in enumerate(columns, len(shared) + 1):
+            records[:, i] = col
+        self._write(records)
+
+    def _write(self, records: np.ndarray):
+        self._file.write(records.astype("<i4", copy=False).tobytes())
+        self.n_ops += len(records)
+
+    def flush(self):
+        if self._buffer:
+            self._write(np.array(self._buffer, dtype=np.int32))
+            self._buffer = []
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.seek(0)
+        self._file.write(_HEADER.pack(MAGIC, self.width, self.qubits, self.n_ops))
+        self._file.close()
+        LOGGER.debug("%s: %d qubits, %d ops", self.path, self.qubits, self.n_ops)
+
+
+class OpStream:
+    """Memory-mapped reader of a file written by :class:`OpStreamWriter`."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, width, nbqbits, n_ops = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an op stream")
+        self.width = width
+        self.nbqbits = nbqbits
+        self.n_ops = n_ops
+        if n_ops:
+            self.records = np.memmap(
+                path,
+                dtype="<i4",
+                mode="r",
+                offset=_HEADER.size,
+                shape=(n_ops, width + 1),
+            )
+        else:
+            self.records = np.empty((0, width + 1), dtype="<i4")
+
+    def __len__(self):
+        return self.n_ops
+
+    def iter_ops(self, chunk_size: int = DEFAULT_CHUNK) -> Iterator[ROp]:
+        """Yield the operations, reading chunk_size records at a time."""
+        for start in range(0, self.n_ops, chunk_size):
+            for record in self.records[start : start + chunk_size].tolist():
+                code = record[0]
+                nctrls = code >> 2
+                end = 1 + nctrls + _n_targets(code & 3)
+                yield ROp(
+                    code & 3,
+                    tuple(record[1 : nctrls + 1]),
+                    tuple(record[nctrls + 1 : end]),
+                )
+
+    __iter__ = iter_ops
+
+    def gate_counts(self, chunk_size: int = DEFAULT_CHUNK) -> Counter:
+        """The number of gates by canonical name."""
+        counts = np.zeros(0, dtype=np.int64)
+        for start in range(0, self.n_ops, chunk_size):
+            chunk = np.bincount(self.records[start : start + chunk_size, 0])
+            if len(chunk) > len(counts):
+                counts = np.pad(counts, (0, len(chunk) - len(counts)))
+            counts[: len(chunk)] += chunk
+        return Counter({op_name(code): int(n) for code, n in enumerate(counts) if n})
+
+    def resources(self, track_depth: bool = True) -> Resources:
+        """Replay the operations on a :class:`Resources` tracker."""
+        res = Resources(self.nbqbits, 0, track_depth)
+        if not track_depth:
+            res.gates = self.gate_counts()
+            return res
+        names = {}
+        for op in self.iter_ops():
+            code = encode_op(op)
+            if code not in names:
+                names[code] = op_name(code)
+            res.apply(names[code], *op.ctrls, *op.targets)
+        return res
+
+    def run(self, initial: Optional[Sequence[int]] = None) -> RBits:
+        """Run the operations on the reversible simulator, see
+        :meth:`~qat.external.qpus.reversible.RProgram.run`."""
+        rbits = RBits(self.nbqbits) if initial is None else RBits(initial)
+        if len(rbits) != self.nbqbits:
+            raise ValueError(
+                f"Initial state has {len(rbits)} bits, expected {self.nbqbits}"
+            )
+        return run_ops(self.iter_ops(), rbits)
+
+    def run_words(self, words: np.ndarray) -> np.ndarray:
+        """Run the operations, in place, over a bit-sliced state, see
+        :meth:`~qat.external.qpus.reversible.RProgram.run_words`."""
+        if words.shape[0] != self.nbqbits:
+            raise ValueError(
+                f"State has {words.shape[0]} qubits, expected {self.nbqbits}"
+            )
+        return run_ops_batch(self.iter_ops(), words)
+
+
+def stream_routine(path: str, resources_func: Callable, *args, **kwargs) -> OpStream:
+    """Write the gates of a routine to path, f.e.
+
+    .. code-block::
+
+        stream = stream_routine(path, gji.get_rref_resources, r, n, True, norig)
+
+    :param resources_func: the `<routine>_resources` function of the routine
+    :param args, kwargs: the arguments of resources_func
+    :returns: the :class:`OpStream` reading the file
+    """
+    writer: Optional[OpStreamWriter] = None
+
+    def tracker(*t_args, **t_kwargs):
+        nonlocal writer
+        writer = OpStreamWriter(path, *t_args, **t_kwargs)
+        return writer
+
+    kwargs.setdefault("track_depth", False)
+    try:
+        resources_func(*args, tracker=tracker, **kwargs)
+    finally:
+        if writer is not None:
+            writer.close()
+    return OpStream(path)
@@ -0,0 +1,188 @@
+"""Resource estimation without building the QRoutines.
+
+Each qroutine module exposes a `<routine>_resources` function that replays the
+structure of the routine on a :class:`Resources` tracker, using only qubit
+indexes. The gates are never materialized, so the estimation is feasible even
+at cryptographic sizes (e.g. r=768, n=3488).
+
+The gate names are the ones yielded by
+:meth:`~qat.core.Circuit.iterate_simple`, normalized so that an X gate with k
+controls is named X, CNOT, CCNOT or `C-...-C-X` (k >= 3), and any other gate
+`C-...-C-<name>`. This way the estimates can be checked against
+:func:`circuit_resources` of the compiled circuit.
+
+The Toffoli depth is the depth of the circuit when only the non-Clifford gates
+have unit duration, i.e. the X gates with 2 or more controls and any other
+controlled gate (C-SWAP, controlled rotations, ...); all the other gates take
+no time, but still synchronize the qubits they act on (ASAP scheduling).
+"""
+from collections import Counter
+from typing import TYPE_CHECKING, Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from qat.core.wrappers.circuit import Circuit
+
+# Gates that do not act on the qubits state
+_IGNORED = {"MEASURE", "RESET", "BREAK", "LOCK", "RELEASE", "LOGIC", "I"}
+_X_CTRLS = {"X": 0, "CNOT": 1, "CCNOT": 2}
+
+
+def split_gate_name(name: str) -> Tuple[str, int]:
+    """Return (base gate, number of controls) of a gate name as yielded by
+    `iterate_simple`, f.e. C-CCNOT -> (X, 3), D-C-RY -> (RY, 1)."""
+    nctrls = 0
+    while True:
+        if name.startswith("C-"):
+            nctrls += 1
+            name = name[2:]
+        elif name.startswith("D-"):
+            name = name[2:]
+        else:
+            break
+    if name in _X_CTRLS:
+        return "X", nctrls + _X_CTRLS[name]
+    return name, nctrls
+
+
+def canonical_gate_name(name: str) -> str:
+    base, nctrls = split_gate_name(name)
+    if base == "X" and nctrls <= 2:
+        return ("X", "CNOT", "CCNOT")[nctrls]
+    return "C-" * nctrls + base
+
+
+def is_toffoli_class(name: str) -> bool:
+    """True if the gate counts for the Toffoli depth."""
+    base, nctrls = split_gate_name(name)
+    return nctrls >= 2 if base == "X" else nctrls >= 1
+
+
+class Resources:
+    """Tracker of the resources required by a routine.
+
+    - qubits: the total number of qubits, including the ancillae
+    - ancillae: the number of qubits that are not inputs of the routine, both
+      the explicit wires (f.e. the couts of the FPC) and the ones allocated by
+      the compiler (f.e. the cin of the Cuccaro adder)
+    - gates: the number of gates by (canonical) name
+    - toffoli_depth: see the module documentation
+
+    If track_depth is False only the qubits and the gates are counted, which
+    takes time proportional to the number of sub-routines instead of the
+    number of gates.
+    """
+
+    def __init__(self, nbqbits: int, ancillae: int = 0, track_depth: bool = True):
+        self.qubits = nbqbits
+        self.ancillae = ancillae
+        self.gates: Counter = Counter()
+        self.track_depth = track_depth
+        self._times = np.zeros(nbqbits if track_depth else 0, dtype=np.int64)
+        self._free_ancillae: List[int] = []
+        self._names: Dict[str, Tuple[str, int]] = {}
+
+    @property
+    def toffoli_depth(self) -> int:
+        if not self.track_depth:
+            raise ValueError("Depth not tracked")
+        return int(self._times.max(initial=0))
+
+    def _gate(self, name: str) -> Tuple[str, int]:
+        try:
+            return self._names[name]
+        except KeyError:
+            gate = (canonical_gate_name(name), int(is_toffoli_class(name)))
+            self._names[name] = gate
+            return gate
+
+    def new_ancillae(self, n: int) -> List[int]:
+        """Allocate n ancillae, reusing the released ones first (as done by
+        the QLM compiler for the ancillae of the routines)."""
+        qbits = []
+        for _ in range(n):
+            if self._free_ancillae:
+                qbits.append(self._free_ancillae.pop())
+            else:
+                qbits.append(self.qubits)
+                self.qubits += 1
+                self.ancillae += 1
+        if self.track_depth and self.qubits > len(self._times):
+            self._times = np.concatenate(
+                (self._times, np.zeros(self.qubits - len(self._times), np.int64))
+            )
+        return qbits
+
+    def release_ancillae(self, qbits: Iterable[int]):
+        self._free_ancillae.extend(sorted(qbits, reverse=True))
+
+    def apply(self, name: str, *qbits: int):
+        """Apply a single gate."""
+        name, weight = self._gate(name)
+        self.gates[name] += 1
+        if self.track_depth:
+            times = self._times
+            end = max(times[q] for q in qbits) + weight
+            for q in qbits:
+                times[q] = end
+
+    def apply_chain(self, name: str, shared: Sequence[int], *columns: Sequence[int]):
+        """Apply the same gate len(columns[0]) times, in order. The j-th gate
+        acts on all the shared qubits and on the j-th qubit of each column,
+        f.e. the CCNOTs of a row addition are a chain sharing the control.
+
+        The qubits of the columns must be distinct, and different from the
+        shared ones.
+        """
+        name, weight = self._gate(name)
+        m = len(columns[0])
+        if m == 0:
+            return
+        self.gates[name] += m
+        if not self.track_depth:
+            return
+        times = self._times
+        cols = [np.asarray(c, dtype=np.intp) for c in columns]
+        ready = times[cols[0]]
+        for c in cols[1:]:
+            ready = np.maximum(ready, times[c])
+        if len(shared) == 0:
+            ends = ready + weight
+        else:
+            # e_j = max(e_{j-1}, ready_j) + w, with e_{-1} the time of the
+            # shared qubits, i.e. e_j = (j + 1) w + max(e_{-1}, max_i<=j
+            # (ready_i - i w))
+            shared = list(shared)
+            j_w = np.arange(m, dtype=np.int64) * weight
+            start = times[shared].max()
+            ends = (
+                j_w + weight + np.maximum(start, np.maximum.accumulate(ready - j_w))
+            )
+            times[shared] = ends[-1]
+        for c in cols:
+            times[c] = ends
+
+    def to_dict(self) -> dict:
+        res = {
+            "qubits": self.qubits,
+            "ancillae": self.ancillae,
+            "gates": dict(self.gates),
+        }
+        if self.track_depth:
+            res["toffoli_depth"] = self.toffoli_depth
+        return res
+
+    def __repr__(self):
+        return f"Resources({self.to_dict()})"
+
+
+def circuit_resources(circuit: "Circuit") -> Resources:
+    """Compute the resources of a compiled circuit, gate by gate. The ancillae
+    cannot be distinguished from the other qubits, so they are not counted."""
+    res = Resources(circuit.nbqbits)
+    for instr in circuit.iterate_simple():
+        if instr[0] in _IGNORED:
+            continue
+        res.apply(instr[0], *instr[2])
+    return res
@@ -0,0 +1,154 @@
+"""Circuits compiled once and run on many classical inputs.
+
+The tests and the sweeps usually build a program made of a thin prefix of X
+gates, setting the input registers to a classical value (f.e.
+:func:`~qat.external.qroutines.linalg.matrix.initialize_qureg_to_binary_matrix`),
+followed by an expensive body (f.e. the GJISD), and compile the whole program
+for each input. A :class:`CircuitTemplate` is the body compiled once, with
+named input registers, whose values are bound later:
+
+- :meth:`CircuitTemplate.bind` prepends the X gates of the values to the
+  compiled circuit, for any QPU
+- :meth:`CircuitTemplate.basis_state` returns the values as the initial state
+  of the reversible simulator, see :meth:`CircuitTemplate.run` and
+  :meth:`CircuitTemplate.run_batch`, which runs a whole batch of inputs at
+  once
+
+A value is a sequence (or array) of bits, set to the qubits of the register
+in order, f.e. a binary matrix row-wise, or an int, whose MSB is set to the
+first qubit as done by `initialize_qureg_given_int(value, n, False)`. For the
+little endian registers, pass the qubits in reverse order.
+"""
+import copy
+import logging
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from qat.comm.datamodel.ttypes import Op
+from qat.core.util import OpType
+from qat.external.qpus.reversible import RBits, RProgram, decode_circuit
+
+if TYPE_CHECKING:
+    from qat.core.wrappers.circuit import Circuit
+    from qat.lang.AQASM.bits import Qbit
+    from qat.lang.AQASM.program import Program
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _bits(value: Any, nbits: int) -> np.ndarray:
+    """The bits of a single value, see the module doc."""
+    if isinstance(value, (int, np.integer)):
+        if value < 0 or value >> nbits:
+            raise ValueError(f"{value} does not fit in {nbits} bits")
+        return (int(value) >> np.arange(nbits - 1, -1, -1)) & 1
+    bits = np.asarray(value).ravel()
+    if len(bits) != nbits:
+        raise ValueError(f"{len(bits)} bits given, expected {nbits}")
+    return bits
+
+
+def _batch_bits(values: Any, nbits: int) -> np.ndarray:
+    """The (batch x nbits) bits of a batch of values: a 1-D array of ints, or
+    an array of bit values with the batch on the first axis."""
+    values = np.asarray(values)
+    if values.ndim == 1:
+        if np.any(values < 0) or np.any(values >> nbits):
+            raise ValueError(f"Values do not fit in {nbits} bits")
+        return (values[:, np.newaxis] >> np.arange(nbits - 1, -1, -1)) & 1
+    bits = values.reshape(len(values), -1)
+    if bits.shape[1] != nbits:
+        raise ValueError(f"{bits.shape[1]} bits given, expected {nbits}")
+    return bits
+
+
+class CircuitTemplate:
+    """A compiled circuit with named input registers.
+
+    :param circuit: the compiled body, starting from the all-zero state
+    :param inputs: the qubit indexes of each input register
+    """
+
+    def __init__(self, circuit: "Circuit", inputs: Dict[str, Sequence[int]]):
+        self.circuit = circuit
+        self.inputs = {name: list(qbits) for name, qbits in inputs.items()}
+        self._rprogram: Optional[RProgram] = None
+
+    @classmethod
+    def compile(
+        cls, program: "Program", inputs: Dict[str, Sequence["Qbit"]], **compile_kwargs
+    ) -> "CircuitTemplate":
+        """Compile the program, with the input registers still at 0.
+
+        :param compile_kwargs: the arguments of `to_circ`
+        """
+        circuit = program.to_circ(**compile_kwargs)
+        return cls(circuit, {k: [qb.index for qb in v] for k, v in inputs.items()})
+
+    @property
+    def rprogram(self) -> RProgram:
+        """The reversible program of the circuit, decoded once."""
+        if self._rprogram is None:
+            ops = decode_circuit(self.circuit)
+            self._rprogram = RProgram(self.circuit.nbqbits, ops)
+        return self._rprogram
+
+    def _check(self, values: Dict[str, Any]):
+        unknown = set(values) - set(self.inputs)
+        if unknown:
+            raise ValueError(f"Unknown inputs {sorted(unknown)}")
+
+    def basis_state(self, **values) -> np.ndarray:
+        """The initial state, as one 0/1 per qubit, with the inputs set to
+        values. The inputs not given are 0."""
+        self._check(values)
+        state = np.zeros(self.circuit.nbqbits, dtype=np.uint8)
+        for name, value in values.items():
+            qbits = self.inputs[name]
+            state[qbits] = _bits(value, len(qbits))
+        return state
+
+    def bind(self, **values) -> "Circuit":
+        """The circuit with the X gates setting the inputs to values in front
+        of the compiled body, which is shared and not copied."""
+        state = self.basis_state(**values)
+        prefix = [
+            Op(gate="X", qbits=[int(q)], type=OpType.GATETYPE)
+            for q in np.flatnonzero(state)
+        ]
+        bound = copy.copy(self.circuit)
+        bound.ops = prefix + list(self.circuit.ops)
+        return bound
+
+    def run(self, **values) -> RBits:
+        """The final state of the reversible simulation, starting from the
+        inputs set to values."""
+        return self.rprogram.run(self.basis_state(**values))
+
+    def run_batch(self, **values) -> np.ndarray:
+        """Run a batch of inputs at once with the bit-sliced reversible
+        simulator.
+
+        :param values: for each input, a 1-D array of ints, or an array of
+            bits with the batch on the first axis. All of them must have the
+            same batch size
+        :returns: a (batch x nbqbits) uint8 array with the final states
+        """
+        self._check(values)
+        bits = {
+            name: _batch_bits(value, len(self.inputs[name]))
+            for name, value in values.items()
+        }
+        batches = {len(b) for b in bits.values()}
+        if len(batches) != 1:
+            raise ValueError(f"Inputs with different batch sizes {sorted(batches)}")
+        inputs = np.zeros((batches.pop(), self.circuit.nbqbits), dtype=np.uint8)
+        for name, value in bits.items():
+            inputs[:, self.inputs[name]] = value
+        LOGGER.debug("Running a batch of %d inputs", len(inputs))
+        return self.rprogram.run_batch(inputs)
+
+    def qubits(self, *names: str) -> List[int]:
+        """The qubit indexes of the inputs names, in order."""
+        return [q for name in names for q in self.inputs[name]]
@@ -0,0 +1,241 @@
+"""Instrumentation of the construction of the routines.
+
+The builders decorated with :func:`~qat.external.utils.cache.cached_routine`
+report each call to the active :class:`Trace`, if any. The trace is a call
+tree: a builder called while another one is building (f.e. the weight routine
+built by the weight check) is a child of the latter, and the calls with the
+same name under the same parent are merged into a single node. The gates
+applied by a routine are built later, when `Program.to_circ` links them, so
+they are at the top level. Each node records:
+
+- calls, and cache hits among them
+- the wall time, children included
+- the gates applied by the built routines, by canonical name (see
+  :func:`~qat.external.utils.resources.canonical_gate_name`). The sub-routines
+  count as one gate, named after the routine
+- the wires and the ancillae of the largest built routine
+
+Only the routines in the routines argument of :func:`tracing` (all of them by
+default) are recorded, the others are transparent. When no trace is active,
+the builders only pay the check of :data:`ACTIVE`.
+
+The trace can be printed as a tree (:meth:`Trace.tree`) or exported as folded
+stacks (:meth:`Trace.folded`), the input of flamegraph.pl and speedscope.
+"""
+import contextlib
+import logging
+import time
+from collections import Counter
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+)
+
+from qat.external.utils.resources import canonical_gate_name
+
+if TYPE_CHECKING:
+    from qat.lang.AQASM.routines import QRoutine
+
+LOGGER = logging.getLogger(__name__)
+
+# True if a trace is active, checked by the builders before anything else
+ACTIVE = False
+_TRACE: Optional["Trace"] = None
+
+
+class TraceNode:
+    """The calls of a routine with the same parents, see :class:`Trace`."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.hits = 0
+        # Seconds, children included
+        self.wall = 0.0
+        self.gates: Counter = Counter()
+        self.wires = 0
+        self.ancillae = 0
+        self.children: Dict[str, "TraceNode"] = {}
+
+    def child(self, name: str) -> "TraceNode":
+        try:
+            return self.children[name]
+        except KeyError:
+            node = self.children[name] = TraceNode(name)
+            return node
+
+    @property
+    def self_wall(self) -> float:
+        """Wall time spent in the routine itself."""
+        return max(self.wall - sum(c.wall for c in self.children.values()), 0.0)
+
+    def walk(self, path=()) -> Iterator[tuple]:
+        """Yield (path, node) of the node and its descendants, depth first."""
+        path = path + (self.name,)
+        yield path, self
+        for child in self.children.values():
+            yield from child.walk(path)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "hits": self.hits,
+            "wall": self.wall,
+            "gates": dict(self.gates),
+            "wires": self.wires,
+            "ancillae": self.ancillae,
+            "children": [c.to_dict() for c in self.children.values()],
+        }
+
+
+def _gate_name(gate) -> str:
+    prefix = ""
+    while gate.name is None:
+        if gate.nb_ctrls:
+            prefix += "C-" * gate.nb_ctrls
+        elif gate.is_dag:
+            prefix += "D-"
+        elif gate.subgate is None:
+            # An anonymous QRoutine
+            return prefix + "ROUTINE"
+        gate = gate.subgate
+    return canonical_gate_name(prefix + gate.name)
+
+
+def _routine_stats(node: TraceNode, routine: "QRoutine"):
+    """Add the gates of routine to node. Lock and release of the ancillae are
+    not gates."""
+    node.gates.update(
+        name
+        for name in (_gate_name(op.gate) for op in routine.op_list)
+        if name not in ("LOCK", "RELEASE")
+    )
+    node.wires = max(node.wires, routine.arity)
+    node.ancillae = max(node.ancillae, len(routine.ancillae))
+
+
+class Trace:
+    """Call tree of the routine builders, see :func:`tracing`.
+
+    :param routines: the names of the recorded routines, as the qualified name
+        of the builders (f.e. `get_row_swap`) or as `module:qualname`; None to
+        record all of them
+    """
+
+    def __init__(self, routines: Optional[Iterable[str]] = None):
+        self.routines = None if routines is None else set(routines)
+        self.root = TraceNode("root")
+        self._stack: List[TraceNode] = [self.root]
+
+    def records(self, name: str) -> bool:
+        return self.routines is None or (
+            name in self.routines or name.split(":")[-1] in self.routines
+        )
+
+    def call(self, name: str, build: Callable[[], Any], is_hit: Callable[[], bool]):
+        """Run build as a call of the routine name.
+
+        :param is_hit: tells, after build, if the routine came from the cache
+        """
+        if not self.records(name):
+            return build()
+        node = self._stack[-1].child(name.split(":")[-1])
+        self._stack.append(node)
+        start = time.perf_counter()
+        try:
+            routine = build()
+        finally:
+            node.wall += time.perf_counter() - start
+            self._stack.pop()
+        node.calls += 1
+        if is_hit():
+            node.hits += 1
+        elif hasattr(routine, "op_list"):
+            _routine_stats(node, routine)
+        return routine
+
+    def totals(self) -> Dict[str, TraceNode]:
+        """The nodes merged by routine name, wherever they are called. The
+        wall time of the merged node is the self time of the routine."""
+        merged: Dict[str, TraceNode] = {}
+        for _, node in self.root.walk():
+            if node is self.root:
+                continue
+            total = merged.setdefault(node.name, TraceNode(node.name))
+            total.calls += node.calls
+            total.hits += node.hits
+            total.wall += node.self_wall
+            total.gates.update(node.gates)
+            total.wires = max(total.wires, node.wires)
+            total.ancillae = max(total.ancillae, node.ancillae)
+        return merged
+
+    def tree(self) -> str:
+        """The call tree, one routine per line."""
+        lines = []
+        for path, node in self.root.walk():
+            if node is self.root:
+                continue
+            gates = ", ".join(f"{k}: {v}" for k, v in sorted(node.gates.items()))
+            lines.append(
+                f"{'  ' * (len(path) - 2)}{node.name} calls={node.calls} "
+                f"hits={node.hits} wall={node.wall * 1e3:.3f}ms "
+                f"wires={node.wires} ancillae={node.ancillae} gates={{{gates}}}"
+            )
+        return "\n".join(lines)
+
+    def folded(self, gates: bool = False) -> str:
+        """Folded stacks, one `a;b;c value` line per node.
+
+        :param gates: if True, the value is the number of gates applied by the
+            routine itself, otherwise its self time in microseconds
+        """
+        lines = []
+        for path, node in self.root.walk():
+            if node is self.root:
+                continue
+            if gates:
+                value = sum(node.gates.values())
+            else:
+                value = round(node.self_wall * 1e6)
+            lines.append(f"{';'.join(path[1:])} {value}")
+        return "\n".join(lines)
+
+
+def call(name: str, build: Callable[[], Any], is_hit: Callable[[], bool]):
+    """Report a call of a builder to the active trace, see :meth:`Trace.call`."""
+    if _TRACE is None:
+        return build()
+    return _TRACE.call(name, build, is_hit)
+
+
+@contextlib.contextmanager
+def tracing(routines: Optional[Iterable[str]] = None) -> Iterator[Trace]:
+    """Record the construction of the routines inside the block, f.e.
+
+    .. code-block::
+
+        with tracing(["get_row_swap", "get_row_addition"]) as trace:
+            program.apply(get_rref(r, n), qregs)
+        print(trace.tree())
+
+    The traces can't be nested.
+    """
+    global ACTIVE, _TRACE
+    if _TRACE is not None:
+        raise RuntimeError("A trace is already active")
+    _TRACE = Trace(routines)
+    ACTIVE = True
+    try:
+        yield _TRACE
+    finally:
+        LOGGER.debug("trace\n%s", _TRACE.tree())
+        ACTIVE = False
+        _TRACE = None
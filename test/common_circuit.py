@@ -1,15 +1,65 @@
+import atexit
+import functools
 import os
 from test.common import BasicTestCase
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, List, Optional, Tuple
 
 from qat.core.console import display
+from qat.external.qpus.jobqueue import JobQueue
 
 if TYPE_CHECKING:
     from qat.core.wrappers.circuit import Circuit
+    from qat.core.wrappers.job import Job
     from qat.core.wrappers.result import Result
     from qat.lang.AQASM.program import Program
 
 
+_JOB_QUEUE: Optional[JobQueue] = None
+
+
+def get_qpu(simulator: str) -> Tuple[Any, List]:
+    """Return the QPU with the given name, and the gates to link for it."""
+    links = []
+    if simulator.lower() == "pylinalg":
+        from qat.pylinalg import PyLinalg
+
+        qpu = PyLinalg()
+    elif simulator.lower() == "linalg":
+        # default to linalg
+        from qat.qpus import LinAlg
+
+        qpu = LinAlg()
+    elif simulator.lower() == "stabs":
+        from qat.external.synthesis.mctrls.mcx import ccnot, x
+        from qat.qpus import Stabs
+
+        qpu = Stabs()
+        links = [ccnot, x]
+    elif simulator.lower() == "feynman":
+        from qat.qpus import Feynman
+
+        qpu = Feynman()
+    elif simulator.lower() == "mps":
+        from qat.qpus import MPS
+
+        qpu = MPS(lnnize=True)
+    elif simulator.lower() == "bdd":
+        from qat.qpus import Bdd
+
+        qpu = Bdd(48)
+    elif simulator.lower() == "sparse":
+        from qat.external.qpus.sparse import SparseQPU
+
+        qpu = SparseQPU()
+    else:
+        raise Exception(f"Simulator choice {simulator} not correct")
+    return qpu, links
+
+
+def get_qpu_only(simulator: str):
+    return get_qpu(simulator)[0]
+
+
 class CircuitTestCase(BasicTestCase):
     SLOW_TEST_ON = os.getenv("SLOW_ON") is not None
     SLOW_TEST_ON_REASON = "slow test"
@@ -22,49 +72,44 @@ class CircuitTestCase(BasicTestCase):
     # Try to use reversible simulator whenever possible
     REVERSIBLE_ON = os.getenv("REVERSIBLE_ON") is not None
 
+    # Number of worker processes used by simulate_jobs, 0 to simulate serially
+    WORKERS = int(os.getenv("WORKERS", "0"))
+
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
-        cls.logger.info("using simulator: ")
-        cls.links = []
-        if cls.SIMULATOR.lower() == "pylinalg":
-            cls.logger.info("PyLinalg")
-            from qat.pylinalg import PyLinalg
-
-            cls.qpu = PyLinalg()
-        elif cls.SIMULATOR.lower() == "linalg":
-            # default to linalg
-            from qat.qpus import LinAlg
-
-            cls.logger.info("LinAlg")
-            cls.qpu = LinAlg()
-        elif cls.SIMULATOR.lower() == "stabs":
-            cls.logger.info("Stabs")
-            from qat.external.synthesis.mctrls.mcx import ccnot, x
-            from qat.qpus import Stabs
-
-            cls.qpu = Stabs()
-            cls.links = [ccnot, x]
-        elif cls.SIMULATOR.lower() == "feynman":
-            cls.logger.info("Feynman")
-            from qat.qpus import Feynman
-
-            cls.qpu = Feynman()
-        elif cls.SIMULATOR.lower() == "mps":
-            cls.logger.info("MPS")
-            from qat.qpus import MPS
-
-            cls.qpu = MPS(lnnize=True)
-        elif cls.SIMULATOR.lower() == "bdd":
-            cls.logger.info("BDD")
-            from qat.qpus import Bdd
-
-            cls.qpu = Bdd(48)
-        else:
-            raise Exception(f"Simulator choice {cls.SIMULATOR} not correct")
+        cls.logger.info("using simulator: %s", cls.SIMULATOR)
+        cls.qpu, cls.links = get_qpu(cls.SIMULATOR)
         print(f"Selected simulator is {cls.qpu}")
         print(f"Reversible simulation is {cls.REVERSIBLE_ON}")
 
+    @classmethod
+    def job_queue(cls) -> JobQueue:
+        """The queue shared by all the test cases, see :meth:`simulate_jobs`."""
+        global _JOB_QUEUE
+        if _JOB_QUEUE is None:
+            _JOB_QUEUE = JobQueue(
+                functools.partial(get_qpu_only, cls.SIMULATOR), cls.WORKERS
+            )
+            atexit.register(_JOB_QUEUE.shutdown)
+        return _JOB_QUEUE
+
+    @classmethod
+    def simulate_jobs(cls, jobs: List["Job"]) -> List["Result"]:
+        """Simulate independent jobs, in parallel if WORKERS is set."""
+        if cls.WORKERS > 0:
+            return cls.job_queue().run(jobs)
+        return [cls.simulate_job(job) for job in jobs]
+
+    @classmethod
+    def simulate_programs(
+        cls, programs: List["Program"], circ_args={}, job_args={}
+    ) -> List["Result"]:
+        if len(cls.links) > 0 and "link" not in circ_args:
+            circ_args = dict(circ_args, link=cls.links)
+        jobs = [program.to_circ(**circ_args).to_job(**job_args) for program in programs]
+        return cls.simulate_jobs(jobs)
+
     @classmethod
     def simulate_program(cls, program, circ_args={}, job_args={}):
         if len(cls.links) > 0 and "link" not in circ_args:
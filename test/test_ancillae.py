@@ -0,0 +1,151 @@
+import itertools
+from test.common_circuit import CircuitTestCase
+
+import numpy as np
+from qat.comm.datamodel.ttypes import OpType
+from qat.external.qpus.reversible import RProgram
+from qat.external.qroutines import qregs_init as qregs
+from qat.external.qroutines.hamming_weight_compute import fpc
+from qat.external.qroutines.linalg import gauss_jordan_isd4 as gji
+from qat.external.qroutines.linalg import matrix as qmatrix
+from qat.external.utils.ancillae import AncillaPool
+from qat.external.utils.gf2 import GF2Matrix, gji_rref
+from qat.lang.AQASM.gates import X
+from qat.lang.AQASM.program import Program
+from qat.pylinalg import PyLinalg
+
+
+def _cbits_values(circuit, sample):
+    """The values of the cbits, from the intermediate measurements. The
+    circuit must be inlined, since the positions are the ones of the inlined
+    gates."""
+    values = {}
+    for meas in sample.intermediate_measurements:
+        op = circuit.ops[meas.gate_pos]
+        if op.type == OpType.MEASURE:
+            values.update(zip(op.cbits, meas.cbits))
+    return values
+
+
+class AncillaPoolTestCase(CircuitTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Not all the simulators support intermediate measurements
+        cls.shots_qpu = PyLinalg()
+
+    def test_reuse(self):
+        pr = Program()
+        pool = AncillaPool(pr)
+        with pool.routine("outer"):
+            first = pool.get(3)
+            with pool.routine("inner"):
+                second = pool.get(2)
+                pool.release(second)
+            pool.release(first[1:])
+            # Last released, first reused
+            self.assertEqual(pool.get(3), first[1:] + second[:1])
+        self.assertEqual(pool.allocated, 5)
+        self.assertEqual((pool.live, pool.peak), (4, 5))
+        self.assertEqual(pool.peaks, {"outer": 5, "inner": 5})
+        # Not reused without measure_reset
+        self.assertIsNone(pool.discard(first[:1]))
+        self.assertEqual(pool.live, 4)
+        self.assertEqual(len(pool.get(2)), 2)
+        self.assertEqual(pool.allocated, 6)
+
+    def test_measure_reset(self):
+        pr = Program()
+        pool = AncillaPool(pr, measure_reset=True)
+        values = []
+        for value in (1, 0, 1):
+            anc = pool.get(1)
+            if value:
+                pr.apply(X, anc)
+            values.extend(pool.discard(anc))
+        circ = pr.to_circ()
+        self.assertEqual(circ.nbqbits, 1)
+        res = self.shots_qpu.submit(circ.to_job(nbshots=1))
+        cbits = _cbits_values(circ, res[0])
+        self.assertEqual([cbits[cbit.index] for cbit in values], [1, 0, 1])
+
+    def _rref_program(self, matrix, skip_rightmost, measure_reset):
+        r, n = matrix.shape
+        pr = Program()
+        qr = pr.qalloc(r * n)
+        pr.apply(qmatrix.initialize_qureg_to_binary_matrix(matrix), qr)
+        pool = AncillaPool(pr, measure_reset)
+        swaps = gji.apply_rref(pr, qr, r, n, skip_rightmost, n - 1, pool)
+        return pr, swaps, pool
+
+    def test_rref(self):
+        """Same output of get_rref, with a single swap ancilla if the
+        ancillae are measured and reset."""
+        rng = np.random.default_rng(0)
+        for (r, n), skip_rightmost in itertools.product(
+            [(2, 4), (3, 6), (5, 11)], (False, True)
+        ):
+            with self.subTest(r=r, n=n, skip_rightmost=skip_rightmost):
+                matrix = rng.integers(0, 2, (r, n), dtype=np.uint8)
+                expected = gji_rref(
+                    GF2Matrix.from_array(matrix), skip_rightmost, n - 1
+                )
+                swap_n, _ = gji.get_required_ancillae(r)
+                for measure_reset in (False, True):
+                    pr, swaps, pool = self._rref_program(
+                        matrix, skip_rightmost, measure_reset
+                    )
+                    self.assertEqual(len(swaps), swap_n)
+                    # Reset, each swap ancilla is reused by the next swap
+                    peak = min(swap_n, 1) if measure_reset else swap_n
+                    self.assertEqual(pool.peaks["GJISD"], peak)
+                    circ = pr.to_circ()
+                    self.assertEqual(circ.nbqbits, r * n + peak)
+                    rbits = RProgram.circuit_to_rprogram(circ).rbits
+                    bits = np.array(list(rbits), dtype=np.uint8)
+                    np.testing.assert_array_equal(
+                        bits[: r * n].reshape(r, n), expected.matrix.to_array()
+                    )
+                    if not measure_reset:
+                        np.testing.assert_array_equal(
+                            bits[[q.index for q in swaps]], expected.swaps
+                        )
+
+    def test_rref_swaps_measured(self):
+        matrix = np.array([[0, 1, 1, 0], [0, 0, 1, 1], [1, 1, 0, 1]], np.uint8)
+        expected = gji_rref(GF2Matrix.from_array(matrix), True, 3)
+        pr, swaps, _ = self._rref_program(matrix, True, True)
+        circ = pr.to_circ(inline=True)
+        res = self.shots_qpu.submit(circ.to_job(nbshots=1))
+        cbits = _cbits_values(circ, res[0])
+        self.assertEqual(
+            [cbits[cbit.index] for cbit in swaps], list(expected.swaps)
+        )
+
+    def test_weight_check(self):
+        """Sequential weight checks reuse the same couts."""
+        n, weights = 5, (2, 3)
+        pattern = fpc.get_qroutine_for_qubits_weight_get_pattern(n)
+        for value in (0b10100, 0b01101, 0b11111):
+            with self.subTest(value=value):
+                pr = Program()
+                a_qs = pr.qalloc(n)
+                eq_qs = pr.qalloc(len(weights))
+                pr.apply(qregs.initialize_qureg_given_int(value, n, False), a_qs)
+                pool = AncillaPool(pr)
+                for weight, eq_q in zip(weights, eq_qs):
+                    fpc.apply_qubits_weight_check(pr, a_qs, weight, eq_q, pool)
+                self.assertEqual(pool.live, 0)
+                extra = pattern["n_lines"] - n + pattern["n_couts"]
+                self.assertEqual(pool.peaks["FPC_WCHE"], extra)
+                circ = pr.to_circ()
+                # The cin of the adders is allocated by the compiler
+                self.assertEqual(circ.nbqbits, n + len(weights) + extra + 1)
+                rbits = RProgram.circuit_to_rprogram(circ).rbits
+                weight = bin(value).count("1")
+                self.assertEqual(
+                    list(rbits[n : n + len(weights)]),
+                    [int(weight == w) for w in weights],
+                )
+                self.assertEqual(rbits.to01()[:n], f"{value:0{n}b}")
+                self.assertEqual(sum(rbits[n + len(weights) :]), 0)
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks import harness
+from qat.external.qroutines.linalg import gauss_jordan_isd4 as gji
+from qat.lang.AQASM.program import Program
+
+
+class BenchmarksTestCase(unittest.TestCase):
+    def test_time_case(self):
+        from qat.pylinalg import PyLinalg
+
+        results = harness.run(
+            [harness.CASES["adder_cuccaro"], harness.CASES["gji"]],
+            PyLinalg(),
+            repeat=1,
+            max_sim_qubits=10,
+            quick=True,
+        )
+        self.assertEqual(list(results["adder_cuccaro"]), ["2", "4"])
+        self.assertEqual(list(results["gji"]), ["2x4", "3x6"])
+        adder = results["adder_cuccaro"]["4"]
+        self.assertEqual(adder["qubits"], 10)
+        self.assertGreater(adder["definitions"], 0)
+        self.assertGreater(adder["size"], 0)
+        self.assertGreater(adder["to_circ"], 0)
+        self.assertIsNotNone(adder["submit"])
+        # Too many qubits
+        self.assertIsNone(results["gji"]["3x6"]["submit"])
+        self.assertIn("dominant", harness.format_results(results))
+
+    def test_gji_skips_rightmost(self):
+        """The gji case is the Prange variant, skipping the rightmost
+        submatrix."""
+        r, n = 3, 6
+        qrout, nargs = harness._gji((r, n))
+        full = (~gji.get_rref)(r, n, False, n)
+        counts = []
+        for routine in (qrout, full):
+            pr = Program()
+            pr.apply(routine, pr.qalloc(nargs))
+            counts.append(len(pr.to_circ(inline=True).ops))
+        self.assertLess(counts[0], counts[1])
+
+    def test_regressions(self):
+        baseline = {"a": {"4": {"build": 0.1, "to_circ": 1.0, "submit": None}}}
+        results = {
+            "a": {"4": {"build": 0.1004, "to_circ": 1.5, "submit": 2.0}},
+            "b": {"4": {"build": 1.0}},
+        }
+        regressions = harness.find_regressions(results, baseline)
+        self.assertEqual(
+            regressions, [harness.Regression("a", "4", "to_circ", 1.0, 1.5)]
+        )
+        self.assertEqual(harness.find_regressions(results, baseline, threshold=0.6), [])
+        # Below the noise
+        baseline["a"]["4"]["build"] = 0.0001
+        results["a"]["4"]["build"] = 0.0009
+        self.assertEqual(len(harness.find_regressions(results, baseline)), 1)
+
+    def test_history(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "history.json")
+            args = ["--cases", "merger", "--quick", "--repeat", "1"]
+            args += ["--simulator", "none", "--history", path]
+            self.assertEqual(harness.main(args), 0)
+            history = harness.load_history(path)
+            self.assertEqual(len(history), 1)
+            self.assertIsNone(history[0]["results"]["merger"]["4"]["submit"])
+            # Slower than the baseline, and any slowdown is a regression
+            history[0]["results"]["merger"]["4"]["to_circ"] = 0.0
+            harness.save_history(path, history)
+            args += ["--threshold", "0", "--min-delta", "0"]
+            self.assertEqual(harness.main(args), 1)
+            self.assertEqual(len(harness.load_history(path)), 2)
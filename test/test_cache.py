@@ -0,0 +1,79 @@
+import pickle
+import unittest
+
+import dill
+import numpy as np
+from qat.external.qroutines.hamming_weight_compute import fpc
+from qat.external.qroutines.linalg import gauss_jordan_isd4 as gji
+from qat.external.utils import cache
+from qat.lang.AQASM.program import Program
+
+
+class CacheTestCase(unittest.TestCase):
+    def test_frozen_dict(self):
+        fd = cache.FrozenDict({"a": [1, 2], "b": {"c": {3, 4}}})
+        self.assertEqual(fd, {"a": (1, 2), "b": {"c": frozenset((3, 4))}})
+        self.assertEqual(hash(fd), hash(cache.FrozenDict(fd)))
+        self.assertIsInstance(fd["b"], cache.FrozenDict)
+        with self.assertRaises(TypeError):
+            fd["a"] = 1
+        with self.assertRaises(TypeError):
+            fd.update(a=1)
+        self.assertEqual(pickle.loads(pickle.dumps(fd)), fd)
+
+    def test_hashable_key(self):
+        a = np.arange(4)
+        self.assertEqual(cache.hashable_key(a), cache.hashable_key(a.copy()))
+        self.assertNotEqual(cache.hashable_key(a), cache.hashable_key(a[::-1]))
+        self.assertEqual(
+            cache.hashable_key([{1}, {"a": 1}]), (frozenset({1}), {"a": 1})
+        )
+
+    def test_lru(self):
+        calls = []
+
+        @cache.cached_routine(maxsize=2)
+        def builder(n, skip):
+            calls.append(n)
+            return [n]
+
+        self.assertIs(builder(1, {0}), builder(1, {0}))
+        builder(2, {0})
+        builder(3, {0})
+        builder(1, {0})
+        self.assertEqual(calls, [1, 2, 3, 1])
+        self.assertEqual(builder.cache_info(), cache.CacheInfo(1, 4, 2, 2))
+        builder.cache_clear()
+        self.assertEqual(builder.cache_info(), cache.CacheInfo(0, 0, 2, 0))
+
+    def test_routines(self):
+        cache.cache_clear()
+        pattern = fpc.get_qroutine_for_qubits_weight_get_pattern(8)
+        infos = []
+        for _ in range(2):
+            pr = Program()
+            qr = pr.qalloc(3 * 6 + gji.get_required_ancillae(3)[0])
+            pr.apply(gji.get_rref(3, 6, True, 5), qr)
+            pr.to_circ()
+            infos.append(cache.get_cache(gji.get_row_addition).info())
+        self.assertGreater(infos[0].misses, 0)
+        self.assertEqual(infos[1].misses, infos[0].misses)
+        self.assertGreater(infos[1].hits, infos[0].hits)
+        for _ in range(3):
+            fpc.get_qroutine_for_qubits_weight.circuit_generator(
+                pattern["n_lines"], pattern["n_couts"], pattern
+            )
+        info = cache.get_cache(fpc.get_qroutine_for_qubits_weight).info()
+        self.assertEqual((info.hits, info.misses), (2, 1))
+
+    def test_serialization(self):
+        # The cache must not be serialized along with the builders
+        generator = gji.get_row_addition.circuit_generator
+        size = len(dill.dumps(generator))
+        # nor with the gates, which get the attributes of the builders
+        gate_size = len(dill.dumps(gji.get_row_addition))
+        for i in range(10):
+            generator(6, 12, 1, frozenset(range(i)))
+        self.assertEqual(len(dill.dumps(generator)), size)
+        self.assertEqual(len(dill.dumps(gji.get_row_addition)), gate_size)
+        self.assertIs(dill.loads(dill.dumps(generator)), generator)
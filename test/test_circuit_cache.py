@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from qat.external.qpus.reversible import RProgram
+from qat.external.qroutines.arith import cuccaro_arith
+from qat.external.qroutines.linalg import gauss_jordan_isd4 as gji
+from qat.external.utils import circuit_cache
+from qat.external.utils.cache import FrozenDict
+
+
+class CircuitCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = circuit_cache.CircuitCache(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_digest(self):
+        self.assertEqual(
+            circuit_cache.digest({"a": 1, "b": {2, 3}}),
+            circuit_cache.digest({"b": {3, 2}, "a": 1}),
+        )
+        arr = np.arange(4)
+        self.assertEqual(
+            circuit_cache.digest(FrozenDict(a=arr)), circuit_cache.digest({"a": arr})
+        )
+        self.assertNotEqual(circuit_cache.digest(arr), circuit_cache.digest(arr[::-1]))
+        self.assertNotEqual(circuit_cache.digest(1), circuit_cache.digest(True))
+        self.assertNotEqual(circuit_cache.digest(1), circuit_cache.digest("1"))
+        with self.assertRaises(TypeError):
+            circuit_cache.digest(object())
+
+    def test_compile_routine(self):
+        params = (4, 4, True, True)
+        circ = self.cache.compile_routine(cuccaro_arith.adder, *params)
+        self.assertEqual(self.cache.info()[:2], (0, 1))
+        cached = self.cache.compile_routine(cuccaro_arith.adder, *params)
+        self.assertEqual(self.cache.info()[:2], (1, 1))
+        self.assertEqual(list(cached.iterate_simple()), list(circ.iterate_simple()))
+        self.assertEqual(cached.nbqbits, circ.nbqbits)
+        # Other compile arguments, other entry
+        self.cache.compile_routine(cuccaro_arith.adder, *params, include_matrices=False)
+        self.assertEqual(self.cache.info().entries, 2)
+        # A new cache on the same directory skips the compilation
+        other = circuit_cache.CircuitCache(self.tmp.name)
+        other.compile_routine(cuccaro_arith.adder, *params)
+        self.assertEqual(other.info()[:2], (1, 0))
+
+    def test_gjisd(self):
+        r, n = 3, 6
+        circ = self.cache.compile_routine(gji.get_rref, r, n, False, n)
+        cached = self.cache.compile_routine(gji.get_rref, r, n, False, n)
+        self.assertEqual(
+            RProgram.circuit_to_rprogram(cached).rbits,
+            RProgram.circuit_to_rprogram(circ).rbits,
+        )
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_eviction(self):
+        for bits in (2, 3, 4):
+            self.cache.compile_routine(cuccaro_arith.adder, bits, bits, True, True)
+        # Stored in order, one second apart
+        entries = sorted(
+            (e for e in os.scandir(self.tmp.name) if e.name.endswith(".circ")),
+            key=lambda e: e.stat().st_mtime_ns,
+        )
+        for age, entry in enumerate(reversed(entries)):
+            os.utime(entry.path, (0, entry.stat().st_mtime - 10 - age))
+        size = self.cache.info().size
+        # The hit makes the 3 bits adder the least recently used one
+        self.cache.compile_routine(cuccaro_arith.adder, 2, 2, True, True)
+        self.cache.max_bytes = size - 1
+        self.cache.evict()
+        self.assertEqual(self.cache.info().entries, 2)
+        hits = self.cache.hits
+        self.cache.compile_routine(cuccaro_arith.adder, 2, 2, True, True)
+        self.cache.compile_routine(cuccaro_arith.adder, 4, 4, True, True)
+        self.assertEqual(self.cache.hits, hits + 2)
+
+    def test_unreadable(self):
+        key = self.cache.key("empty")
+        open(os.path.join(self.tmp.name, key + ".circ"), "wb").close()
+        self.assertIsNone(self.cache.get(key))
+        self.assertEqual(self.cache.info().entries, 0)
+        self.cache.clear()
+        self.assertEqual(self.cache.info()[:2], (0, 0))
@@ -0,0 +1,132 @@
+from test.common_circuit import CircuitTestCase
+
+from parameterized import parameterized
+from qat.external.qroutines.arith import cla_arith, cuccaro_arith, perriello_arith
+from qat.external.qroutines.arith import tkk_arith
+from qat.external.qroutines.linalg import _rref
+from qat.external.qroutines.linalg import gauss_jordan_isd4 as gji
+from qat.external.qroutines.linalg import matrix as qmatrix
+from qat.external.qroutines.sorting import sorting_network as sn
+from qat.external.utils.equivalence import check_equivalence
+from qat.external.utils.template import CircuitTemplate
+from qat.lang.AQASM.gates import SWAP
+from qat.lang.AQASM.program import Program
+from qat.lang.AQASM.routines import QRoutine
+
+
+def _adder_template(gate, bits):
+    """The template of a little endian adder with overflow, and its outputs
+    cout and b, MSB first."""
+    pr = Program()
+    a = pr.qalloc(bits)
+    b = pr.qalloc(bits)
+    cout = pr.qalloc(1)
+    pr.apply(gate(bits, bits, True, True), a, b, cout)
+    template = CircuitTemplate.compile(pr, {"a": list(a)[::-1], "b": list(b)[::-1]})
+    return template, [cout[0].index] + template.qubits("b")
+
+
+def _rref_template(gate, r, n, n_ancillae):
+    pr = Program()
+    qr_matrix = pr.qalloc(r * n)
+    rows = qmatrix.get_rows_as_qubit_list(r, n, qr_matrix)
+    pr.apply(gate, rows, pr.qalloc(n_ancillae))
+    return CircuitTemplate.compile(pr, {"matrix": qr_matrix})
+
+
+def _sorter_template(routine, pattern):
+    pr = Program()
+    lines = pr.qalloc(pattern["n_lines"])
+    pr.apply(routine, lines, pr.qalloc(pattern["n_comps"]))
+    return CircuitTemplate.compile(pr, {"lines": lines})
+
+
+def _sorter_ccnot(pattern):
+    """The sorter with the comparator before its rewriting, i.e. the swap
+    controlled by a > b."""
+    routine = QRoutine()
+    lines = routine.new_wires(pattern["n_lines"])
+    comps = routine.new_wires(pattern["n_comps"])
+    for ctrl, a, b in pattern["swaps_pattern"].tolist():
+        routine.apply(
+            perriello_arith.two_bit_comparator(), lines[a], lines[b], comps[ctrl]
+        )
+        routine.apply(SWAP.ctrl(), comps[ctrl], lines[a], lines[b])
+    return routine
+
+
+class EquivalenceTestCase(CircuitTestCase):
+    @parameterized.expand([(tkk_arith.adder,), (cla_arith.adder,)])
+    def test_adders(self, gate):
+        bits = 4
+        cuccaro, outputs = _adder_template(cuccaro_arith.adder, bits)
+        other, other_outputs = _adder_template(gate, bits)
+        result = check_equivalence(cuccaro, other, outputs, other_outputs, batch=64)
+        self.assertTrue(result.equivalent)
+        self.assertTrue(result.exhaustive)
+        self.assertEqual(result.checked, 4**bits)
+        self.assertIsNone(result.counterexample)
+
+    def test_adders_sampled(self):
+        """Beyond max_exhaustive, the equivalence is only sampled."""
+        bits = 11
+        cuccaro, outputs = _adder_template(cuccaro_arith.adder, bits)
+        tkk, tkk_outputs = _adder_template(tkk_arith.adder, bits)
+        result = check_equivalence(
+            cuccaro, tkk, outputs, tkk_outputs, samples=1000, seed=3
+        )
+        self.assertTrue(result.equivalent)
+        self.assertFalse(result.exhaustive)
+        self.assertEqual(result.checked, 1000)
+
+    def test_counterexample(self):
+        bits = 4
+        adder, outputs = _adder_template(cuccaro_arith.adder, bits)
+        subtractor, sub_outputs = _adder_template(tkk_arith.subtractor, bits)
+        result = check_equivalence(adder, subtractor, outputs, sub_outputs)
+        self.assertFalse(result)
+        self.assertTrue(result.exhaustive)
+        self.assertEqual(set(result.counterexample), {"a", "b"})
+        adder_bits = adder.run(**result.counterexample)
+        sub_bits = subtractor.run(**result.counterexample)
+        self.assertNotEqual(
+            [adder_bits[q] for q in outputs], [sub_bits[q] for q in sub_outputs]
+        )
+
+    def test_gjisd_rref(self):
+        """The GJISD skips the pivot columns once reduced, and it's equal to the
+        RREF on the other ones."""
+        r, n = 3, 5
+        rref = _rref_template(
+            _rref.get_rref(r, n), r, n, sum(_rref.get_required_ancillae(r, n))
+        )
+        gjisd = _rref_template(
+            gji.get_rref(r, n, False, n), r, n, gji.get_required_ancillae(r)[0]
+        )
+        columns = [q for i, q in enumerate(rref.qubits("matrix")) if i % n >= r]
+        self.assertTrue(check_equivalence(rref, gjisd, columns, columns))
+        matrix = rref.qubits("matrix")
+        self.assertFalse(check_equivalence(rref, gjisd, matrix, matrix))
+
+    def test_sorter_comparator(self):
+        """The rewritten comparator sorts the lines as the CCNOT one, but it
+        leaves different comparison results."""
+        pattern = sn.get_pattern_sorter(8)
+        ccnot = _sorter_template(_sorter_ccnot(pattern), pattern)
+        sorter = _sorter_template(sn.build_gate_sorter(pattern), pattern)
+        lines = ccnot.qubits("lines")
+        result = check_equivalence(ccnot, sorter, lines, lines)
+        self.assertTrue(result.equivalent)
+        self.assertEqual(result.checked, 2 ** len(lines))
+        comps = list(range(len(lines), len(lines) + pattern["n_comps"]))
+        self.assertFalse(check_equivalence(ccnot, sorter, comps, comps))
+
+    def test_errors(self):
+        adder, outputs = _adder_template(cuccaro_arith.adder, 2)
+        other, _ = _adder_template(cuccaro_arith.adder, 3)
+        with self.assertRaises(ValueError):
+            check_equivalence(adder, other, outputs, outputs)
+        with self.assertRaises(ValueError):
+            check_equivalence(adder, adder, outputs, outputs[1:])
+        with self.assertRaises(ValueError):
+            check_equivalence(adder, adder, outputs, outputs, batch=100)
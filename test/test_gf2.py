@@ -0,0 +1,144 @@
+import unittest
+
+import numpy as np
+from parameterized import parameterized
+from qat.external.qpus.reversible import RProgram
+from qat.external.qroutines.linalg import _rref
+from qat.external.qroutines.linalg import gauss_jordan_isd4 as gji
+from qat.external.qroutines.linalg import matrix as qmatrix
+from qat.external.utils.gf2 import GF2Matrix, gji_rref, pack_rows, unpack_rows
+from qat.lang.AQASM.program import Program
+
+
+class GF2TestCase(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    @parameterized.expand([(1, 1), (3, 64), (5, 65), (2, 200)])
+    def test_pack(self, nrows, ncols):
+        array = self.rng.integers(0, 2, (nrows, ncols), dtype=np.uint8)
+        words = pack_rows(array)
+        self.assertEqual(words.shape, (nrows, (ncols + 63) // 64))
+        np.testing.assert_array_equal(unpack_rows(words, ncols), array)
+        matrix = GF2Matrix.from_array(array)
+        self.assertEqual(matrix.shape, (nrows, ncols))
+        self.assertEqual(matrix[nrows - 1, ncols - 1], array[-1, -1])
+        np.testing.assert_array_equal(matrix.column(ncols - 1), array[:, -1])
+
+    def test_matmul(self):
+        a = self.rng.integers(0, 2, (70, 130))
+        b = self.rng.integers(0, 2, (130, 90))
+        product = GF2Matrix.from_array(a) @ GF2Matrix.from_array(b)
+        np.testing.assert_array_equal(product.to_array(), a @ b % 2)
+        with self.assertRaises(ValueError):
+            GF2Matrix.from_array(a) @ GF2Matrix.from_array(a)
+
+    def test_rref(self):
+        array = np.array([[0, 1, 1, 0], [0, 1, 0, 1], [0, 0, 1, 1], [1, 0, 0, 0]])
+        reduced, pivots = GF2Matrix.from_array(array).rref()
+        self.assertEqual(pivots, [0, 1, 2])
+        np.testing.assert_array_equal(
+            reduced.to_array(),
+            [[1, 0, 0, 0], [0, 1, 0, 1], [0, 0, 1, 1], [0, 0, 0, 0]],
+        )
+
+    def test_rank(self):
+        # The product of a 100 x 40 and a 40 x 150 full rank matrices
+        a = GF2Matrix.random(100, 40, self.rng)
+        b = GF2Matrix.random(40, 150, self.rng)
+        self.assertEqual(a.rank(), 40)
+        self.assertEqual(b.rank(), 40)
+        self.assertEqual((a @ b).rank(), 40)
+        self.assertEqual(GF2Matrix.identity(130).rank(), 130)
+        self.assertEqual(GF2Matrix.zeros(3, 3).rank(), 0)
+
+    def _circuit_gji(self, array, skip_rightmost, norig):
+        r, n = array.shape
+        pr = Program()
+        qr = pr.qalloc(r * n)
+        pr.apply(qmatrix.initialize_qureg_to_binary_matrix(array), qr)
+        swap_anc_n, _ = gji.get_required_ancillae(r)
+        rows = qmatrix.get_rows_as_qubit_list(r, n, qr)
+        pr.apply(
+            gji.get_rref(r, n, skip_rightmost, norig), rows, pr.qalloc(swap_anc_n)
+        )
+        rbits = RProgram.circuit_to_rprogram(pr.to_circ()).rbits
+        bits = np.array([int(b) for b in rbits.to01()], dtype=np.uint8)
+        return bits[: r * n].reshape(r, n), bits[r * n :]
+
+    @parameterized.expand([(2, 3), (3, 5), (4, 5), (4, 8)])
+    def test_gji_rref(self, r, n):
+        """The classical rref is equal to the circuit, with the transform
+        reducing the original matrix."""
+        norig = n - 1
+        for _ in range(10):
+            array = self.rng.integers(0, 2, (r, n), dtype=np.uint8)
+            matrix = GF2Matrix.from_array(array)
+            for skip_rightmost in (False, True):
+                expected, swaps = self._circuit_gji(array, skip_rightmost, norig)
+                result = gji_rref(matrix, skip_rightmost, norig)
+                np.testing.assert_array_equal(result.matrix.to_array(), expected)
+                np.testing.assert_array_equal(result.swaps, swaps)
+                self.assertEqual(result.success, matrix.columns(range(r)).rank() == r)
+                reduced = (result.transform @ matrix).to_array()
+                cols = range(norig if skip_rightmost else r, n)
+                np.testing.assert_array_equal(reduced[:, cols], expected[:, cols])
+                if result.success:
+                    np.testing.assert_array_equal(reduced[:, :r], np.eye(r))
+
+    def test_gji_rref_big(self):
+        r = 300
+        matrix = GF2Matrix.random(r, 2 * r + 1, self.rng)
+        result = gji_rref(matrix)
+        reduced, pivots = matrix.rref()
+        self.assertEqual(result.success, pivots[r - 1] == r - 1)
+        self.assertEqual(result.transform @ matrix == reduced, result.success)
+        np.testing.assert_array_equal(
+            (result.transform @ matrix).to_array()[:, r:],
+            result.matrix.to_array()[:, r:],
+        )
+
+    def test_u_from_bitlists(self):
+        nsquare = 4
+        swaps = self.rng.integers(0, 2, 6)
+        adds = self.rng.integers(0, 2, 12)
+        expected = np.eye(nsquare, dtype=np.uint8)
+        swap_idx = add_idx = 0
+        for i in range(nsquare):
+            for j in range(i + 1, nsquare):
+                if swaps[swap_idx]:
+                    expected[i] ^= expected[j]
+                swap_idx += 1
+            for j in range(nsquare):
+                if j != i:
+                    if adds[add_idx]:
+                        expected[j] ^= expected[i]
+                    add_idx += 1
+        np.testing.assert_array_equal(
+            _rref.build_u_matrix_from_bitlists(swaps, adds, nsquare), expected
+        )
+
+    @parameterized.expand([(5,), (1,)])
+    def test_u_batched(self, nsquare):
+        samples = 50
+        nswaps = nsquare * (nsquare - 1) // 2
+        swaps = self.rng.integers(0, 2, (samples, nswaps), dtype=np.uint8)
+        adds = self.rng.integers(0, 2, (samples, 2 * nswaps), dtype=np.uint8)
+        u = _rref.build_u_matrices_from_bitarrays(swaps, adds, nsquare)
+        self.assertEqual(u.shape, (samples, nsquare, 1))
+        for k in range(samples):
+            np.testing.assert_array_equal(
+                unpack_rows(u[k], nsquare),
+                _rref.build_u_matrix_from_bitlists(swaps[k], adds[k], nsquare),
+            )
+
+    @parameterized.expand([(70, 141), (1, 3)])
+    def test_gji_u_matrices(self, r, n):
+        results = [gji_rref(GF2Matrix.random(r, n, self.rng), True, n - 1)]
+        results += [gji_rref(GF2Matrix.random(r, n, self.rng)) for _ in range(9)]
+        u = gji.build_u_matrices(
+            [res.swaps for res in results],
+            [res.matrix.to_array() for res in results],
+        )
+        for k, res in enumerate(results):
+            np.testing.assert_array_equal(u[k], res.transform.words)
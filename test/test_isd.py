@@ -0,0 +1,99 @@
+import unittest
+
+import numpy as np
+from parameterized import parameterized
+from qat.external.qpus.reversible import RProgram
+from qat.external.qroutines import qregs_init as qregs
+from qat.external.qroutines.linalg import matrix as qmatrix
+from qat.external.utils import isd
+from qat.lang.AQASM.program import Program
+
+
+class ISDTestCase(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    @parameterized.expand(
+        [(2, 3), (2, 4), (3, 6), (2, 8), (2, 5, "batcher"), (3, 6, "batcher", True)]
+    )
+    def test_selection_permutations(self, nrows, ncols, network="bitonic", exact=False):
+        """Same permutation of the circuit."""
+        data = qmatrix.move_columns_end_data(nrows, ncols, network, exact)
+        n_lines = data["n_cols"]
+        combs = isd.random_combs(4, 1, ncols, n_lines, self.rng)
+        perms = isd.selection_permutations(combs, data)
+        for comb, perm in zip(combs, perms):
+            matrix = self.rng.integers(0, 2, (nrows, n_lines), dtype=np.uint8)
+            pr = Program()
+            qr = pr.qalloc(nrows * n_lines)
+            pr.apply(qmatrix.initialize_qureg_to_binary_matrix(matrix), qr)
+            comb_qr = pr.qalloc(n_lines)
+            pr.apply(
+                qregs.initialize_qureg_given_bitarray(comb.astype(int).tolist(), False),
+                comb_qr,
+            )
+            pr.apply(
+                qmatrix.move_columns_end_gate(data),
+                qr,
+                comb_qr,
+                pr.qalloc(data["n_comps"]),
+            )
+            rbits = RProgram.circuit_to_rprogram(pr.to_circ()).rbits.to01()
+            bits = np.array([int(b) for b in rbits], dtype=np.uint8)
+            np.testing.assert_array_equal(
+                bits[: nrows * n_lines].reshape(nrows, n_lines), matrix[:, perm]
+            )
+            np.testing.assert_array_equal(
+                bits[nrows * n_lines : (nrows + 1) * n_lines], comb[perm]
+            )
+
+    def test_moved_to_end(self):
+        data = qmatrix.move_columns_end_data(5, 16)
+        combs = isd.random_combs(100, 5, 16, 16, self.rng)
+        perms = isd.selection_permutations(combs, data)
+        for comb, perm in zip(combs, perms):
+            self.assertEqual(set(perm[:5]), set(np.flatnonzero(~comb)))
+
+    @parameterized.expand([("bitonic",), ("batcher",)])
+    def test_moved_to_end_exact(self, network):
+        """The pruned networks move all the selected columns to the end, without
+        padding columns."""
+        data = qmatrix.move_columns_end_data(5, 13, network, True)
+        self.assertEqual(data["n_cols"], 13)
+        combs = isd.random_combs(100, 5, 13, 13, self.rng)
+        perms = isd.selection_permutations(combs, data)
+        for comb, perm in zip(combs, perms):
+            self.assertEqual(set(perm[:5]), set(np.flatnonzero(~comb)))
+
+    def test_run_batch(self):
+        instance, _ = isd.random_instance(10, 20, 2, self.rng)
+        combs = isd.random_combs(200, 10, 20, 32, self.rng)
+        res = isd.run_batch(instance, combs)
+        self.assertEqual(res.iterations, 200)
+        self.assertLessEqual(res.invertible, 200)
+        self.assertGreater(len(res.errors), 0)
+        for error in res.errors:
+            self.assertTrue(instance.check(error))
+
+    @parameterized.expand([(0,), (1,), (2,)])
+    def test_solve(self, p):
+        instance, _ = isd.random_instance(16, 32, 4, self.rng)
+        res = isd.solve(instance, p, max_iterations=10000, max_workers=1, seed=1)
+        self.assertIsNotNone(res.error)
+        self.assertTrue(instance.check(res.error))
+
+    def test_solve_pool(self):
+        instance, _ = isd.random_instance(8, 16, 2, self.rng)
+        res = isd.solve(instance, batch_size=16, max_workers=2, seed=2)
+        self.assertTrue(instance.check(res.error))
+        self.assertEqual(res.iterations % 16, 0)
+
+    def test_rate(self):
+        instance, _ = isd.random_instance(16, 32, 8, self.rng)
+        res = isd.solve(
+            instance, max_iterations=100, batch_size=32, max_workers=1, stop=False
+        )
+        self.assertEqual(res.iterations, 128)
+        self.assertGreater(res.rate, 0)
+        with self.assertRaises(ValueError):
+            isd.solve(instance, stop=False)
@@ -0,0 +1,77 @@
+import asyncio
+import functools
+import gc
+from test.common_circuit import CircuitTestCase, get_qpu_only
+from unittest import mock
+
+from qat.external.qpus.jobqueue import JobQueue
+from qat.lang.AQASM import CNOT, RY, H, Program
+
+
+class JobQueueTestCase(CircuitTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.queue = JobQueue(functools.partial(get_qpu_only, cls.SIMULATOR), 2, 3)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.queue.shutdown()
+        super().tearDownClass()
+
+    def _jobs(self, n):
+        jobs = []
+        for i in range(n):
+            pr = Program()
+            qr = pr.qalloc(2)
+            pr.apply(RY(0.1 * i), qr[0])
+            pr.apply(H, qr[1])
+            pr.apply(CNOT, qr[1], qr[0])
+            jobs.append(pr.to_circ().to_job())
+        return jobs
+
+    def _probs(self, res):
+        return {sample.state.int: sample.probability for sample in res}
+
+    def _check(self, obtained, jobs):
+        self.assertEqual(len(obtained), len(jobs))
+        for res, job in zip(obtained, jobs):
+            expected = self._probs(self.qpu.submit(job))
+            for state, prob in self._probs(res).items():
+                self.assertAlmostEqual(prob, expected[state])
+
+    def test_run(self):
+        jobs = self._jobs(8)
+        self._check(self.queue.run(jobs), jobs)
+
+    def test_run_bounded(self):
+        """run keeps at most max_pending jobs in the pool."""
+        jobs = self._jobs(8)
+        submit = self.queue.submit
+        futures = []
+
+        def counting_submit(job):
+            running = sum(not future.done() for future in futures)
+            self.assertLess(running, self.queue.max_pending)
+            futures.append(submit(job))
+            return futures[-1]
+
+        with mock.patch.object(self.queue, "submit", counting_submit):
+            self._check(self.queue.run(jobs), jobs)
+        self.assertEqual(len(futures), len(jobs))
+
+    def test_gather(self):
+        jobs = self._jobs(8)
+        self._check(asyncio.run(self.queue.gather(jobs)), jobs)
+        self._check(asyncio.run(self.queue.gather(jobs)), jobs)
+        # The semaphores of the closed loops are not kept
+        gc.collect()
+        self.assertLessEqual(len(self.queue._semaphores), 1)
+
+    def test_future(self):
+        job = self._jobs(1)[0]
+        self._check([self.queue.submit(job).result()], [job])
+
+    def test_simulate_jobs(self):
+        jobs = self._jobs(3)
+        self._check(self.simulate_jobs(jobs), jobs)
@@ -0,0 +1,131 @@
+import os
+import tempfile
+from test.common_circuit import CircuitTestCase
+
+import numpy as np
+from parameterized import parameterized
+from qat.external.qpus import reversible
+from qat.external.qroutines.arith import cuccaro_arith
+from qat.external.qroutines.hamming_weight_compute import fpc
+from qat.external.qroutines.linalg import gauss_jordan_isd4 as gji
+from qat.external.qroutines.linalg import matrix as qmatrix
+from qat.external.qroutines.sorting import sorting_network as sn
+from qat.external.utils import opstream, resources
+from qat.lang.AQASM.program import Program
+
+
+class OpStreamTestCase(CircuitTestCase):
+    """Check the streamed gates against the compiled circuits."""
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.NamedTemporaryFile(suffix=".ops", delete=False)
+        tmp.close()
+        self.path = tmp.name
+
+    def tearDown(self):
+        os.remove(self.path)
+        super().tearDown()
+
+    def _check(self, stream, qrout, nbqbits):
+        pr = Program()
+        qr = pr.qalloc(nbqbits)
+        pr.apply(qrout, qr)
+        circuit = pr.to_circ()
+        self.assertEqual(stream.nbqbits, circuit.nbqbits)
+        self.assertEqual(list(stream), reversible.decode_circuit(circuit))
+        expected = resources.circuit_resources(circuit)
+        self.assertEqual(dict(stream.gate_counts()), dict(expected.gates))
+        self.assertEqual(stream.resources().toffoli_depth, expected.toffoli_depth)
+
+    @parameterized.expand([(1, True), (3, False), (4, True)])
+    def test_cuccaro_adder(self, bits, overflow):
+        stream = opstream.stream_routine(
+            self.path, cuccaro_arith.adder_resources, bits, bits, overflow
+        )
+        qrout = cuccaro_arith.adder(bits, bits, overflow, True)
+        self._check(stream, qrout, 2 * bits + overflow)
+
+    def test_fpc(self):
+        pattern = fpc.get_qroutine_for_qubits_weight_get_pattern(8)
+        stream = opstream.stream_routine(
+            self.path, fpc.get_qroutine_for_qubits_weight_resources, pattern
+        )
+        a_len, cout_len = pattern["n_lines"], pattern["n_couts"]
+        qrout = fpc.get_qroutine_for_qubits_weight(a_len, cout_len, pattern)
+        self._check(stream, qrout, a_len + cout_len)
+
+    def test_sorter(self):
+        pattern = sn.get_pattern_sorter(6)
+        stream = opstream.stream_routine(
+            self.path, sn.build_gate_sorter_resources, pattern
+        )
+        qrout = sn.build_gate_sorter(pattern)
+        self._check(stream, qrout, pattern["n_lines"] + pattern["n_comps"])
+
+    def test_move_columns_end(self):
+        data = qmatrix.move_columns_end_data(3, 5)
+        stream = opstream.stream_routine(
+            self.path, qmatrix.move_columns_end_gate_resources, data
+        )
+        nbqbits = 4 * data["n_cols"] + data["n_comps"]
+        self._check(stream, qmatrix.move_columns_end_gate(data), nbqbits)
+
+    @parameterized.expand([(3, 6, False), (4, 8, True)])
+    def test_gji(self, r, n, skip_rightmost):
+        stream = opstream.stream_routine(
+            self.path, gji.get_rref_resources, r, n, skip_rightmost, n - 1
+        )
+        swap_anc_n, _ = gji.get_required_ancillae(r)
+        qrout = gji.get_rref(r, n, skip_rightmost, n - 1)
+        self._check(stream, qrout, r * n + swap_anc_n)
+
+    def test_run(self):
+        stream = opstream.stream_routine(
+            self.path, cuccaro_arith.adder_resources, 4, 4, True
+        )
+        values = np.arange(256)
+        words = np.zeros((stream.nbqbits, 4), dtype="<u8")
+        words[:8] = reversible.pack_ints(values, 8)
+        stream.run_words(words)
+        obtained = reversible.unpack_ints(words[4:9], len(values))
+        np.testing.assert_array_equal(obtained, (values & 15) + (values >> 4))
+        # a=3, b=5
+        rbits = stream.run([1, 1, 0, 0, 1, 0, 1, 0, 0, 0])
+        self.assertEqual(rbits.to01(), "1100000100")
+
+    def test_small_chunks(self):
+        writer = opstream.OpStreamWriter(self.path, 4, chunk_size=2)
+        with writer:
+            for q in range(3):
+                writer.apply("CNOT", q, q + 1)
+            writer.apply_chain("CCNOT", [0], [1, 2], [3, 3])
+            writer.apply("C-SWAP", 0, 1, 2)
+            with self.assertRaises(ValueError):
+                writer.apply("C-CCNOT", 0, 1, 2, 3)
+            with self.assertRaises(ValueError):
+                writer.apply("H", 0)
+        stream = opstream.OpStream(self.path)
+        self.assertEqual(len(stream), 6)
+        self.assertEqual(
+            list(stream.iter_ops(chunk_size=4)),
+            [
+                reversible.ROp(reversible.OP_X, (0,), (1,)),
+                reversible.ROp(reversible.OP_X, (1,), (2,)),
+                reversible.ROp(reversible.OP_X, (2,), (3,)),
+                reversible.ROp(reversible.OP_X, (0, 1), (3,)),
+                reversible.ROp(reversible.OP_X, (0, 2), (3,)),
+                reversible.ROp(reversible.OP_SWAP, (0,), (1, 2)),
+            ],
+        )
+        self.assertEqual(
+            dict(stream.gate_counts(chunk_size=4)),
+            {"CNOT": 3, "CCNOT": 2, "C-SWAP": 1},
+        )
+        self.assertEqual(writer.gates, stream.gate_counts())
+
+    def test_not_a_stream(self):
+        with open(self.path, "wb") as f:
+            f.write(b"\0" * 64)
+        with self.assertRaises(ValueError):
+            opstream.OpStream(self.path)
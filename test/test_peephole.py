@@ -0,0 +1,112 @@
+from test.common_circuit import CircuitTestCase
+
+from qat.external.plugins.peephole import PeepholePlugin, cancel_inverse_pairs
+from qat.external.qpus.reversible import RProgram
+from qat.external.qroutines import qregs_init as qregs
+from qat.external.qroutines.arith import cuccaro_arith
+from qat.lang.AQASM import CCNOT, CNOT, RY, SWAP, H, Program, S, X
+
+
+class PeepholeTestCase(CircuitTestCase):
+    def _optimize(self, *gates, nbqbits=4):
+        pr = Program()
+        qr = pr.qalloc(nbqbits)
+        for gate, *qbits in gates:
+            if gate == "MEASURE":
+                pr.measure(qr[qbits[0]])
+            else:
+                pr.apply(gate, *[qr[q] for q in qbits])
+        circuit = pr.to_circ(inline=True)
+        return cancel_inverse_pairs(circuit)
+
+    def _remaining(self, circuit):
+        return [(name, qbits) for name, _, qbits in circuit.iterate_simple()]
+
+    def test_adjacent(self):
+        circuit, report = self._optimize((X, 0), (X, 0), (CNOT, 0, 1), (CNOT, 0, 1))
+        self.assertEqual(self._remaining(circuit), [])
+        self.assertEqual(report.before, {"X": 2, "CNOT": 2})
+        self.assertEqual(report.after, {})
+        self.assertEqual(report.removed, 4)
+
+    def test_commute_disjoint(self):
+        circuit, _ = self._optimize((X, 0), (CNOT, 1, 2), (H, 3), (X, 0))
+        self.assertEqual(self._remaining(circuit), [("CNOT", [1, 2]), ("H", [3])])
+
+    def test_blocked(self):
+        circuit, report = self._optimize((X, 0), (CNOT, 0, 1), (X, 0))
+        self.assertEqual(report.removed, 0)
+        # Different targets
+        circuit, report = self._optimize((CNOT, 0, 1), (CNOT, 1, 0))
+        self.assertEqual(report.removed, 0)
+        # Never across a measure
+        circuit, report = self._optimize((X, 0), ("MEASURE", 0), (X, 0))
+        self.assertEqual(report.removed, 0)
+
+    def test_cascade(self):
+        circuit, _ = self._optimize(
+            (X, 1),
+            (CNOT, 0, 1),
+            (CCNOT, 2, 3, 0),
+            (CCNOT, 3, 2, 0),
+            (CNOT, 0, 1),
+            (X, 1),
+        )
+        self.assertEqual(self._remaining(circuit), [])
+
+    def test_symmetric(self):
+        circuit, _ = self._optimize(
+            (SWAP, 0, 1), (SWAP, 1, 0), (SWAP.ctrl(), 2, 0, 1), (SWAP.ctrl(), 2, 1, 0)
+        )
+        self.assertEqual(self._remaining(circuit), [])
+
+    def test_dag(self):
+        circuit, _ = self._optimize((S, 0), (S.dag(), 0), (S, 1), (S, 1))
+        self.assertEqual(self._remaining(circuit), [("S", [1]), ("S", [1])])
+        circuit, _ = self._optimize(
+            (RY(0.5).ctrl(), 0, 1),
+            (RY(0.5).ctrl().dag(), 0, 1),
+            (RY(0.5), 2),
+            (RY(0.3).dag(), 2),
+        )
+        self.assertEqual(len(self._remaining(circuit)), 2)
+
+    def test_boxed(self):
+        pr = Program()
+        qr = pr.qalloc(9)
+        pr.apply(cuccaro_arith.adder(4, 4, True, True), qr)
+        with self.assertRaises(ValueError):
+            cancel_inverse_pairs(pr.to_circ())
+
+    def test_init_subtractor(self):
+        pr = Program()
+        a = pr.qalloc(4)
+        b = pr.qalloc(4)
+        o = pr.qalloc(1)
+        pr.apply(qregs.initialize_qureg_given_bitstring("1011", True), a)
+        pr.apply(qregs.initialize_qureg_given_bitstring("0110", True), b)
+        pr.apply(cuccaro_arith.subtractor(4, 4, True, True), a, b, o)
+        circuit = pr.to_circ(inline=True)
+        optimized, report = cancel_inverse_pairs(circuit)
+        # The 3 X initializing a are cancelled by the first flip of the
+        # subtractor
+        self.assertEqual(report.removed, 6)
+        self.assertEqual(
+            RProgram.circuit_to_rprogram(optimized).rbits,
+            RProgram.circuit_to_rprogram(circuit).rbits,
+        )
+
+    def test_plugin(self):
+        pr = Program()
+        qr = pr.qalloc(2)
+        pr.apply(H, qr[0])
+        pr.apply(X, qr[1])
+        pr.apply(CNOT, qr[0], qr[1])
+        pr.apply(CNOT, qr[0], qr[1])
+        pr.apply(X, qr[1])
+        plugin = PeepholePlugin()
+        res = (plugin | self.qpu).submit(pr.to_circ(inline=True).to_job())
+        probs = {sample.state.int: sample.probability for sample in res}
+        self.assertAlmostEqual(probs[0], 0.5)
+        self.assertAlmostEqual(probs[2], 0.5)
+        self.assertEqual(plugin.reports[0].after, {"H": 1})
@@ -0,0 +1,109 @@
+import random
+from test.common_circuit import CircuitTestCase
+
+import numpy as np
+from parameterized import parameterized
+from qat.external.qpus import reversible
+from qat.external.qpus.reversible import RProgram
+from qat.external.qroutines import qregs_init as qregs
+from qat.external.qroutines.arith import cuccaro_arith
+from qat.external.qroutines.linalg import matrix as qmatrix
+from qat.lang.AQASM import CCNOT, CNOT, H, SWAP, X
+from qat.lang.AQASM.program import Program
+
+
+class ReversibleTestCase(CircuitTestCase):
+    @parameterized.expand(
+        [
+            ("X", X, [1], "11001"),
+            ("CNOT", CNOT, [0, 1], "11001"),
+            ("CCNOT", CCNOT, [0, 4, 1], "11001"),
+            ("SWAP", SWAP, [0, 1], "01001"),
+            ("C-SWAP", SWAP.ctrl(), [4, 0, 2], "00101"),
+            ("C-C-C-X", X.ctrl(3), [0, 4, 2, 3], "10001"),
+        ]
+    )
+    def test_gates(self, name, gate, qbits, expected):
+        pr = Program()
+        qr = pr.qalloc(5)
+        pr.apply(X, qr[0])
+        pr.apply(X, qr[4])
+        pr.apply(gate, [qr[i] for i in qbits])
+        rpr = RProgram.circuit_to_rprogram(pr.to_circ())
+        self.assertEqual(rpr.rbits.to01(), expected)
+
+    def test_not_reversible(self):
+        pr = Program()
+        qr = pr.qalloc(1)
+        pr.apply(H, qr)
+        with self.assertRaises(ValueError):
+            RProgram.circuit_to_rprogram(pr.to_circ())
+
+    def test_same_as_qpu(self):
+        """Random initial states of a routine with ancillae, daggers and
+        controlled boxes must give the same output of the simulator."""
+        nbits = 3
+        for _ in range(8):
+            a_int, b_int, ctrl = (
+                random.randrange(2**nbits),
+                random.randrange(2**nbits),
+                random.randrange(2),
+            )
+            with self.subTest(a=a_int, b=b_int, ctrl=ctrl):
+                pr = Program()
+                a = pr.qalloc(nbits)
+                b = pr.qalloc(nbits)
+                c = pr.qalloc(1)
+                pr.apply(qregs.initialize_qureg_given_int(a_int, nbits, True), a)
+                pr.apply(qregs.initialize_qureg_given_int(b_int, nbits, True), b)
+                pr.apply(qregs.initialize_qureg_given_int(ctrl, 1, True), c)
+                pr.apply(cuccaro_arith.adder(nbits, nbits, False, True).dag(), a, b)
+                pr.apply(qmatrix.buildg_swap_columns(nbits).ctrl(), c, a, b)
+                cr = pr.to_circ()
+
+                rpr = RProgram.circuit_to_rprogram(cr)
+                res = self.simulate_circuit(cr)
+                self.assertEqual(len(res), 1)
+                self.assertEqual(rpr.rbits.to01(), res[0].state.bitstring)
+
+    def test_run_initial(self):
+        pr = Program()
+        qr = pr.qalloc(3)
+        pr.apply(CCNOT, qr)
+        rpr = RProgram.circuit_to_rprogram(pr.to_circ())
+        self.assertEqual(rpr.rbits.to01(), "000")
+        rpr.run([1, 1, 0])
+        self.assertEqual(rpr.rbits.to01(), "111")
+        with self.assertRaises(ValueError):
+            rpr.run([1, 1])
+
+    @parameterized.expand([(1,), (63,), (64,), (65,), (200,)])
+    def test_pack_unpack(self, batch):
+        bits = np.random.randint(0, 2, size=(batch, 7), dtype=np.uint8)
+        words = reversible.pack_bits(bits)
+        self.assertEqual(words.shape, (7, -(-batch // 64)))
+        np.testing.assert_array_equal(reversible.unpack_bits(words, batch), bits)
+
+        ints = np.random.randint(0, 2**7, size=batch)
+        words = reversible.pack_ints(ints, 7)
+        np.testing.assert_array_equal(reversible.unpack_ints(words, batch), ints)
+
+    def test_batch_same_as_single(self):
+        nbits = 3
+        pr = Program()
+        a = pr.qalloc(nbits)
+        b = pr.qalloc(nbits)
+        c = pr.qalloc(1)
+        pr.apply(cuccaro_arith.adder(nbits, nbits, False, True), a, b)
+        pr.apply(qmatrix.buildg_swap_columns(nbits).ctrl(), c, a, b)
+        pr.reset(c)
+        rpr = RProgram.circuit_to_rprogram(pr.to_circ())
+
+        inputs = np.random.randint(0, 2, size=(150, rpr.nbqbits), dtype=np.uint8)
+        # ancillae must start from 0
+        inputs[:, 2 * nbits + 1 :] = 0
+        outputs = rpr.run_batch(inputs)
+        self.assertEqual(outputs.shape, inputs.shape)
+        for initial, output in zip(inputs, outputs):
+            rpr.run(initial.tolist())
+            np.testing.assert_array_equal(np.frombuffer(rpr.rbits, np.uint8), output)
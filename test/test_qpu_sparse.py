@@ -0,0 +1,118 @@
+import itertools
+from math import comb
+from test.common_circuit import CircuitTestCase
+
+import numpy as np
+from qat.comm.exceptions.ttypes import QPUException
+from qat.external.qpus import sparse
+from qat.external.qpus.reversible import RProgram
+from qat.external.qroutines import qregs_init as qregs
+from qat.external.qroutines.hamming_weight_generate import bartschiE19
+from qat.external.qroutines.linalg import matrix as qmatrix
+from qat.lang.AQASM import CNOT, RX, RY, SWAP, H, T, X
+from qat.lang.AQASM.program import Program
+from qat.pylinalg import PyLinalg
+
+
+class SparseTestCase(CircuitTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.sparse = sparse.SparseQPU(seed=0)
+        cls.dense = PyLinalg()
+
+    def _mixed_program(self, n, k):
+        pr = Program()
+        qr = pr.qalloc(n + 2)
+        pr.apply(bartschiE19.generate(n, k), qr[:n])
+        pr.apply(H, qr[n])
+        pr.apply(RY(0.3).ctrl(), qr[0], qr[n])
+        pr.apply(RX(1.1).ctrl(2), qr[1], qr[n], qr[n + 1])
+        pr.apply(T.dag(), qr[n + 1])
+        pr.apply(SWAP.ctrl(), qr[n + 1], qr[2], qr[3])
+        pr.apply(CNOT, qr[n], qr[1])
+        return pr
+
+    def _compare(self, circ, qubits=None):
+        res = self.sparse.submit(circ.to_job(qubits=qubits))
+        expected = self.dense.submit(circ.to_job(qubits=qubits))
+        self.assertEqual(
+            [s.state.int for s in res], [s.state.int for s in expected]
+        )
+        for s, e in zip(res, expected):
+            self.assertAlmostEqual(s.probability, e.probability, delta=1e-12)
+            if qubits is None:
+                self.assertAlmostEqual(s.amplitude, e.amplitude, delta=1e-12)
+            else:
+                self.assertIsNone(s.amplitude)
+
+    def test_same_as_statevector(self):
+        for n, k in itertools.product(range(3, 7), range(1, 3)):
+            with self.subTest(n=n, k=k):
+                circ = self._mixed_program(n, k).to_circ()
+                self._compare(circ)
+                self._compare(circ, [n + 1, 0, n])
+
+    def test_dagger(self):
+        pr = Program()
+        qr = pr.qalloc(6)
+        pr.apply(bartschiE19.generate(6, 3), qr)
+        self.assertEqual(len(sparse.simulate(pr.to_circ())), comb(6, 3))
+        pr.apply(bartschiE19.generate(6, 3).dag(), qr)
+        state = sparse.simulate(pr.to_circ())
+        self.assertEqual(state.states(), [0])
+        self.assertAlmostEqual(abs(state.amplitudes[0]), 1)
+
+    def test_shots(self):
+        circ = self._mixed_program(4, 2).to_circ()
+        res = self.sparse.submit(circ.to_job(nbshots=200, qubits=[0, 1]))
+        self.assertLessEqual(len(res), 4)
+        self.assertAlmostEqual(sum(s.probability for s in res), 1)
+
+    def _move_columns_program(self, matrix, data, comb_bits=None):
+        nrows, ncols = matrix.shape
+        pr = Program()
+        qr = pr.qalloc(nrows * ncols)
+        comb_qr = pr.qalloc(ncols)
+        pr.apply(qmatrix.initialize_qureg_to_binary_matrix(matrix), qr)
+        if comb_bits is None:
+            pr.apply(bartschiE19.generate(ncols, 2), comb_qr)
+        else:
+            pr.apply(qregs.initialize_qureg_given_bitarray(comb_bits, False), comb_qr)
+        pr.apply(
+            qmatrix.move_columns_end_gate(data),
+            qr,
+            comb_qr,
+            pr.qalloc(data["n_comps"]),
+        )
+        return pr.to_circ()
+
+    def test_reversible_after_dicke(self):
+        """Each basis state of the Dicke superposition goes through the
+        reversible part as it does alone, with more qubits than a statevector
+        can hold."""
+        nrows, ncols = 3, 8
+        data = qmatrix.move_columns_end_data(nrows, ncols)
+        matrix = np.random.default_rng(0).integers(0, 2, (nrows, ncols))
+        circ = self._move_columns_program(matrix, data)
+        self.assertGreater(circ.nbqbits, 40)
+        state = sparse.simulate(circ)
+        self.assertEqual(len(state), comb(ncols, 2))
+        np.testing.assert_allclose(state.probabilities(), 1 / comb(ncols, 2))
+
+        expected = set()
+        for ones in itertools.combinations(range(ncols), 2):
+            comb_bits = [int(i in ones) for i in range(ncols)]
+            circ = self._move_columns_program(matrix, data, comb_bits)
+            expected.add(RProgram.circuit_to_rprogram(circ).rbits.to01())
+        self.assertEqual(
+            {"".join(str(b) for b in bits) for bits in state.bits}, expected
+        )
+
+    def test_not_supported(self):
+        pr = Program()
+        qr = pr.qalloc(2)
+        pr.apply(X, qr[0])
+        pr.reset(qr[0])
+        with self.assertRaises(QPUException):
+            self.sparse.submit(pr.to_circ().to_job())
@@ -1,6 +1,7 @@
 import itertools
 import logging
 import unittest
+from fractions import Fraction
 from math import factorial
 from test.common_circuit import CircuitTestCase
 
@@ -24,10 +25,11 @@ class BartschiTestCase(CircuitTestCase):
         # pr.apply(dicke_scs(nbqbits), qr)
         self.pr.apply(bartschiE19.generate(n, k), qr)
 
-    def _analyse_res_extensive(self, n, k):
-        circ = self.pr.to_circ()
-        # self.draw_circuit(circ, max_depth=2)
-        res = self.qpu.submit(circ.to_job())
+    def _analyse_res_extensive(self, n, k, res=None):
+        if res is None:
+            circ = self.pr.to_circ()
+            # self.draw_circuit(circ, max_depth=2)
+            res = self.qpu.submit(circ.to_job())
         ress = []
         amps = []
         for sample in res:
@@ -47,22 +49,42 @@ class BartschiTestCase(CircuitTestCase):
         self.assertEqual(len(res), factorial(n) // factorial(k) // factorial(n - k))
 
     def test_small(self):
-        for n, k in itertools.product(range(4, 10), range(1, 4)):
+        params = list(itertools.product(range(4, 10), range(1, 4)))
+        programs = []
+        for n, k in params:
+            self._generate_program(n, k)
+            programs.append(self.pr)
+        for (n, k), res in zip(params, self.simulate_programs(programs)):
             with self.subTest(n=n, k=k):
-                self._generate_program(n, k)
-                self._analyse_res_extensive(n, k)
+                self._analyse_res_extensive(n, k, res)
 
     def test_small_dagger(self):
-        for n, k in itertools.product(range(4, 10), range(1, 4)):
+        params = list(itertools.product(range(4, 10), range(1, 4)))
+        programs = []
+        for n, k in params:
+            self._generate_program(n, k)
+            self.pr.apply(bartschiE19.generate(n, k).dag(), self.pr.registers[0])
+            programs.append(self.pr)
+        for (n, k), res in zip(params, self.simulate_programs(programs)):
             with self.subTest(n=n, k=k):
-                self._generate_program(n, k)
-                self.pr.apply(bartschiE19.generate(n, k).dag(), self.pr.registers[0])
-                circ = self.pr.to_circ()
-                res = self.qpu.submit(circ.to_job())
                 self.assertEqual(len(res), 1)
                 state = res[0].state.state
                 self.assertEqual(state, 0)
 
+    def test_equal_ratios(self):
+        """Rotations of equal ratios l / n share the same definition."""
+        n, k = 12, 4
+        self._generate_program(n, k)
+        defs = [
+            gate.syntax.name
+            for gate in self.pr.to_circ().gateDic.values()
+            if gate.syntax is not None
+        ]
+        # (i) and (ii)_l of SCS(i, k) for i > k, then of SCS(i, i - 1)
+        ratios = {Fraction(l, i) for i in range(n, k, -1) for l in range(1, k + 1)}
+        ratios |= {Fraction(l, i) for i in range(k, 1, -1) for l in range(1, i)}
+        self.assertEqual(defs.count("RY"), len(ratios))
+
     # TODO quite useless, just bigger
     @unittest.skipUnless(
         CircuitTestCase.SLOW_TEST_ON, CircuitTestCase.SLOW_TEST_ON_REASON
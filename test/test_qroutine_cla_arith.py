@@ -0,0 +1,136 @@
+from test.common_circuit import CircuitTestCase
+
+import numpy as np
+from parameterized import parameterized
+from qat.external.qpus import reversible
+from qat.external.qpus.reversible import RProgram
+from qat.external.qroutines import qregs_init as qregs
+from qat.external.qroutines.arith import backends, cla_arith, cuccaro_arith
+from qat.lang.AQASM.program import Program
+
+
+def _run_exhaustive(qfun, bits, overflow):
+    """Add all the pairs of bits-long integers at once, using the bit-sliced
+    reversible simulator.
+
+    :returns: the a and b inputs, then a and (cout << bits) + b after the
+        adder, and the words of all the other qubits
+    """
+    a_ints, b_ints = np.divmod(np.arange(4**bits), 2**bits)
+    pr = Program()
+    a = pr.qalloc(bits)
+    b = pr.qalloc(bits)
+    regs = [a, b]
+    if overflow:
+        regs.append(pr.qalloc(1))
+    pr.apply(qfun, *regs)
+    circ = pr.to_circ()
+    rpr = RProgram.circuit_to_rprogram(circ)
+    a_idxs = [qbit.index for qbit in a]
+    b_idxs = [qbit.index for qbit in b]
+    words = rpr.new_words(len(a_ints))
+    words[a_idxs] = reversible.pack_ints(a_ints, bits)
+    words[b_idxs] = reversible.pack_ints(b_ints, bits)
+    rpr.run_words(words)
+
+    out_idxs = [qbit.index for reg in regs[1:] for qbit in reg]
+    a_out = reversible.unpack_ints(words[a_idxs], len(a_ints))
+    sum_out = reversible.unpack_ints(words[out_idxs], len(a_ints))
+    others = np.delete(words, a_idxs + out_idxs, axis=0)
+    return a_ints, b_ints, a_out, sum_out, others
+
+
+class AdderTestCase(CircuitTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if cls.logger.level != 0:
+            cla_arith.LOGGER.setLevel(cls.logger.level)
+            for handler in cls.logger.handlers:
+                cla_arith.LOGGER.addHandler(handler)
+
+    @parameterized.expand([(1,), (2,), (3,), (4,), (5,), (6,)])
+    def test_exhaustive_batch(self, bits):
+        for overflow in (True, False):
+            with self.subTest(overflow=overflow):
+                qfun = cla_arith.adder(bits, bits, overflow, True)
+                a_ints, b_ints, a_out, sum_out, others = _run_exhaustive(
+                    qfun, bits, overflow
+                )
+                np.testing.assert_array_equal(a_out, a_ints)
+                np.testing.assert_array_equal(
+                    sum_out, (a_ints + b_ints) % 2 ** (bits + overflow)
+                )
+                # The carries and the propagate bits are uncomputed
+                self.assertFalse(others.any())
+
+    @parameterized.expand([(2, 3), (5, 1), (13, 10)])
+    def test_big_endian(self, a_int, b_int):
+        bits = 4
+        pr = Program()
+        a = pr.qalloc(bits)
+        b = pr.qalloc(bits)
+        cout = pr.qalloc(1)
+        pr.apply(qregs.initialize_qureg_given_int(a_int, bits, False), a)
+        pr.apply(qregs.initialize_qureg_given_int(b_int, bits, False), b)
+        pr.apply(cla_arith.adder(bits, bits, True, False), a, b, cout)
+        rbits = RProgram.circuit_to_rprogram(pr.to_circ()).rbits.to01()
+        total = a_int + b_int
+        self.assertEqual(rbits[:bits], f"{a_int:0{bits}b}")
+        self.assertEqual(rbits[bits : 2 * bits], f"{total % 2**bits:0{bits}b}")
+        self.assertEqual(rbits[2 * bits], str(total >> bits))
+
+    def test_ancillae(self):
+        for bits in (1, 2, 5, 8, 13):
+            for overflow in (True, False):
+                with self.subTest(bits=bits, overflow=overflow):
+                    pr = Program()
+                    qr = pr.qalloc(2 * bits + overflow)
+                    pr.apply(cla_arith.adder(bits, bits, overflow, True), qr)
+                    carries, props = cla_arith.get_required_ancillae(bits, overflow)
+                    self.assertEqual(
+                        pr.to_circ().nbqbits, 2 * bits + overflow + carries + props
+                    )
+
+    def test_log_depth(self):
+        """The Toffoli depth grows as log(n), the one of the ripple adder as n."""
+        depths = [
+            cla_arith.adder_resources(bits, bits, True).toffoli_depth
+            for bits in (16, 32, 64, 128)
+        ]
+        self.assertEqual(len(set(np.diff(depths))), 1)
+        ripple = cuccaro_arith.adder_resources(128, 128, True).toffoli_depth
+        self.assertLess(depths[-1], ripple // 4)
+
+
+class AdderBackendsTestCase(CircuitTestCase):
+    @parameterized.expand([(1,), (3,), (4,)])
+    def test_backends(self, bits):
+        """All the backends add in place, leaving the ancillae clean."""
+        for name in backends.adder_names():
+            for overflow in (True, False):
+                with self.subTest(adder=name, overflow=overflow):
+                    qfun = backends.get_adder(name).adder(bits, bits, overflow, True)
+                    a_ints, b_ints, a_out, sum_out, others = _run_exhaustive(
+                        qfun, bits, overflow
+                    )
+                    np.testing.assert_array_equal(a_out, a_ints)
+                    np.testing.assert_array_equal(
+                        sum_out, (a_ints + b_ints) % 2 ** (bits + overflow)
+                    )
+                    self.assertFalse(others.any())
+
+    def test_select(self):
+        self.assertEqual(backends.select_adder(64, True, "qubits").name, "tkk")
+        self.assertEqual(backends.select_adder(64, True, "depth").name, "cla")
+        # Not worth the ancillae for short registers
+        self.assertEqual(backends.select_adder(4, True, "depth").name, "tkk")
+        by_gates = backends.select_adder(64, True, lambda res: sum(res.gates.values()))
+        self.assertEqual(by_gates.name, "tkk")
+        self.assertEqual(backends.resolve_adder("cuccaro", 64).name, "cuccaro")
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            backends.get_adder("ripple")
+        with self.assertRaises(ValueError):
+            backends.register_adder(backends.AdderBackend("depth", None, None, None))
@@ -1,8 +1,10 @@
 import itertools
 from test.common_circuit import CircuitTestCase
 
+import numpy as np
 from parameterized import parameterized
-# from qat.external.qpus.reversible import RProgram
+from qat.external.qpus import reversible
+from qat.external.qpus.reversible import RProgram
 from qat.external.qroutines import qregs_init as qregs
 from qat.external.qroutines.arith import cuccaro_arith
 from qat.external.utils.bits import conversion, misc
@@ -599,3 +601,69 @@ class AdderTestCase(CircuitTestCase):
                     actual = res[0].state.state
                     self.logger.debug("expected %s, actual %s", expected, actual)
                     self.assertEqual(actual, expected)
+
+    @parameterized.expand(
+        [
+            (1,),
+            (3,),
+            (5,),
+        ]
+    )
+    def test_exhaustive_batch(self, bits):
+        """Check adder, subtractor and comparator on all the pairs of
+        bits-long integers at once, using the bit-sliced reversible simulator."""
+        a_ints, b_ints = np.divmod(np.arange(4**bits), 2**bits)
+        little_endian = True
+        routines = [
+            (
+                "adder",
+                cuccaro_arith.adder(bits, bits, True, little_endian),
+                a_ints + b_ints,
+            ),
+            (
+                "subtractor",
+                cuccaro_arith.subtractor(bits, bits, True, little_endian),
+                (a_ints - b_ints) % 2 ** (bits + 1),
+            ),
+            (
+                "comparator",
+                cuccaro_arith.comparator(bits, bits, little_endian),
+                None,
+            ),
+        ]
+        for name, qfun, expected in routines:
+            with self.subTest(routine=name):
+                self._prepare_adder_circuit(bits, bits, True)
+                self.qc.apply(qfun, self.a, self.b, self.cout)
+                rpr = RProgram.circuit_to_rprogram(self.qc.to_circ())
+
+                a_idxs = [qbit.index for qbit in self.a]
+                b_idxs = [qbit.index for qbit in self.b]
+                words = rpr.new_words(len(a_ints))
+                words[a_idxs] = reversible.pack_ints(a_ints, bits)
+                words[b_idxs] = reversible.pack_ints(b_ints, bits)
+                rpr.run_words(words)
+
+                a_out = reversible.unpack_ints(words[a_idxs], len(a_ints))
+                np.testing.assert_array_equal(a_out, a_ints)
+                cout_out = reversible.unpack_ints(
+                    words[[self.cout[0].index]], len(a_ints)
+                )
+                if expected is None:
+                    np.testing.assert_array_equal(cout_out, a_ints < b_ints)
+                    continue
+                b_out = reversible.unpack_ints(words[b_idxs], len(a_ints))
+                np.testing.assert_array_equal(b_out + (cout_out << bits), expected)
+
+    def test_gate_definitions(self):
+        """All the MAJ and UMA of the chain share one definition each."""
+        self._prepare_adder_circuit(16, 16, True)
+        adder = cuccaro_arith.adder(16, 16, True, True)
+        self.qc.apply(adder, self.a, self.b, self.cout)
+        names = [
+            gate.syntax.name
+            for gate in self.qc.to_circ().gateDic.values()
+            if gate.syntax is not None
+        ]
+        self.assertEqual(names.count("MAJ"), 1)
+        self.assertEqual(names.count("UMA"), 1)
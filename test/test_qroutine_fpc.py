@@ -1,9 +1,12 @@
+import pickle
 import random
 import unittest
 from test.common_circuit import CircuitTestCase
 
+import numpy as np
 from parameterized import parameterized
-# from qat.external.qpus.reversible import RProgram
+from qat.external.qpus import reversible
+from qat.external.qpus.reversible import RProgram
 from qat.external.qroutines import qregs_init as qregs
 from qat.external.qroutines.hamming_weight_compute import fpc
 from qat.lang.AQASM.program import Program
@@ -86,6 +89,56 @@ class PopulationCountTestCase(CircuitTestCase):
         bitstring = bin(dec)[2:].zfill(64)
         self._test_fpc_common(bitstring)
 
+    @parameterized.expand(
+        [(4, "cuccaro"), (8, "cuccaro"), (8, "tkk"), (8, "cla"), (8, "depth")]
+    )
+    def test_fpc_weight_compute_exhaustive_batch(self, nbits, adder):
+        """Compute the weight of all the nbits-long bitstrings at once, using
+        the bit-sliced reversible simulator."""
+        nwr_dict = fpc.get_qroutine_for_qubits_weight_get_pattern(nbits, adder)
+        program = Program()
+        a = program.qalloc(nwr_dict["n_lines"])
+        cout = program.qalloc(nwr_dict["n_couts"])
+        qfun = fpc.get_qroutine_for_qubits_weight(len(a), len(cout), nwr_dict)
+        program.apply(qfun, a, cout)
+        to_measure_qubits = fpc.get_to_measure_qubits(a, cout, nwr_dict)
+        rpr = RProgram.circuit_to_rprogram(program.to_circ())
+
+        a_ints = np.arange(2**nbits)
+        words = rpr.new_words(len(a_ints))
+        words[[qb.index for qb in a[:nbits]]] = reversible.pack_ints(a_ints, nbits)
+        rpr.run_words(words)
+        obtained = reversible.unpack_ints(
+            words[[qb.index for qb in to_measure_qubits]], len(a_ints)
+        )
+        expected = [bin(i).count("1") for i in a_ints]
+        np.testing.assert_array_equal(obtained, expected)
+
+    def test_fpc_pattern(self):
+        nwr_dict = fpc.get_qroutine_for_qubits_weight_get_pattern(5)
+        self.assertEqual((nwr_dict["n_lines"], nwr_dict["n_couts"]), (8, 7))
+        adders = list(fpc.get_adders(nwr_dict))
+        # couts are the qubits 8 to 14
+        self.assertEqual(adders[0], ([0], [1], 8))
+        self.assertEqual(adders[4], ([1, 8], [3, 9], 12))
+        self.assertEqual(adders[6], ([3, 9, 12], [7, 11, 13], 14))
+        np.testing.assert_array_equal(nwr_dict["stage_offsets"], [0, 4, 6, 7])
+        np.testing.assert_array_equal(nwr_dict["results"], [7, 3, 5, 6])
+        np.testing.assert_array_equal(nwr_dict["results_sources"], [0, 1, 1, 1])
+
+    def test_fpc_pattern_adder(self):
+        nwr_dict = fpc.get_qroutine_for_qubits_weight_get_pattern(5)
+        self.assertEqual(nwr_dict["adder"], "cuccaro")
+        with self.assertRaises(ValueError):
+            fpc.get_qroutine_for_qubits_weight_get_pattern(5, "ripple")
+
+    def test_fpc_pattern_big(self):
+        nwr_dict = fpc.get_qroutine_for_qubits_weight_get_pattern(4000)
+        self.assertEqual(nwr_dict["n_lines"], 4096)
+        self.assertEqual(len(nwr_dict["results"]), 13)
+        self.assertEqual(sum(1 for _ in fpc.get_adders(nwr_dict)), 4095)
+        self.assertLess(len(pickle.dumps(nwr_dict)), 64 * 1024)
+
     # Removed since it's useless
     # @parameterized.expand([
     #     (0, 2),
@@ -3,11 +3,11 @@ from test.common_circuit import CircuitTestCase
 
 import numpy as np
 from parameterized import parameterized
-# from qat.external.qpus.reversible import RProgram
+from qat.external.qpus.reversible import RProgram
 from qat.external.qroutines.linalg import gauss_jordan_isd4 as gji
 from qat.external.qroutines.linalg import matrix as qmatrix
+from qat.external.utils.gf2 import GF2Matrix, gji_rref, unpack_rows
 from qat.lang.AQASM.program import Program
-from sympy import Matrix
 
 
 class GjiTestCase(CircuitTestCase):
@@ -71,7 +71,9 @@ class GjiTestCase(CircuitTestCase):
                         bitstring = rpr.rbits.to01()
                     else:
                         # ... otw only the qubits containing the matrix
-                        bitstring = "".join([rpr.rbits[qb.index] for qb in qbit_range])
+                        bitstring = "".join(
+                            [str(rpr.rbits[idx]) for idx in sorted(qbit_range)]
+                        )
                 else:
                     if test_u:
                         # we measure all the qubits
@@ -92,19 +94,28 @@ class GjiTestCase(CircuitTestCase):
                     bitstring, qbit_range, (nrows, ncols)
                 )
                 mat_gji_diag = mat_gji.diagonal()
-                mat_gji_sim = Matrix(matrix_ext).rref(pivots=False) % 2
+                mat_gji_sim = GF2Matrix.from_array(matrix_ext).rref()[0].to_array()
                 mat_gji_sim_diag = mat_gji_sim.diagonal()
                 self.logger.debug(f"skip {skip_rightmost}")
                 self.logger.debug("original matrix (last column is syndrome)")
                 self.logger.debug(f"\n{matrix_ext}")
                 self.logger.debug("reduced matrix from qcircuit")
                 self.logger.debug(f"\n{mat_gji}")
+                # The classical equivalent of the circuit
+                expected = gji_rref(
+                    GF2Matrix.from_array(matrix_ext), skip_rightmost, n
+                )
+                np.testing.assert_array_equal(mat_gji, expected.matrix.to_array())
+                self.assertEqual(expected.success, should_iden)
+                if test_u:
+                    swaps = [int(b) for b in bitstring[nrows * ncols :]]
+                    np.testing.assert_array_equal(swaps, expected.swaps)
                 if should_iden:
                     self.assertTrue(all(mat_gji_diag))
                     self.assertTrue(all(mat_gji_sim_diag))
                     # check the syndrome calculation is correct
                     syn = mat_gji[:, n].reshape(r, 1)
-                    np.testing.assert_array_equal(syn, mat_gji_sim[:, n])
+                    np.testing.assert_array_equal(syn, mat_gji_sim[:, [n]])
                     if not skip_rightmost:
                         # Additionally, if we didn't skip operations on the
                         # rightmost r*k matrix, the results on this portion
@@ -112,26 +123,22 @@ class GjiTestCase(CircuitTestCase):
                         np.testing.assert_array_equal(
                             mat_gji[:, r:n], mat_gji_sim[:, r:n]
                         )
-                    # # check as well that we can reconstruct the matrix U s.t. U @ matrix = matrix_reduced
-                    # if add_qregs and test_u:
-                    #     raise Exception("Impossible")
-                    #     add_bitstring, swap_bitstring = results.get_qregs_to_bitstring_from_sample(
-                    #         [add_qregs, swap_qregs], sample)
-                    #     u = rref.build_u_matrix_from_bitstrings(
-                    #         swap_bitstring, add_bitstring, r)
-                    #     if not skip_rightmost:
-                    #         check_matrix = matrix_ext
-                    #         check_against = mat_gji
-                    #     else:
-                    #         # if we skipped the righmost rxn matrix, we should
-                    #         # check only the leftmost one AND the syndrome
-                    #         range_cols = list(range(r))
-                    #         # append syndrome
-                    #         range_cols.append(n)
-                    #         check_matrix = matrix_ext[:, range_cols]
-                    #         check_against = mat_gji[:, range_cols]
-                    #     np.testing.assert_array_equal(u @ check_matrix % 2,
-                    #                                   check_against)
+                    # check as well that we can reconstruct the matrix U s.t.
+                    # U @ matrix = matrix_reduced
+                    if test_u:
+                        u = gji.build_u_matrices([swaps], [mat_gji])
+                        u = unpack_rows(u[0], r)
+                        reduced = u @ matrix_ext % 2
+                        if not skip_rightmost:
+                            range_cols = list(range(r, ncols))
+                        else:
+                            # if we skipped the righmost rxn matrix, we should
+                            # check only the syndrome
+                            range_cols = [n]
+                        np.testing.assert_array_equal(
+                            reduced[:, range_cols], mat_gji[:, range_cols]
+                        )
+                        np.testing.assert_array_equal(reduced[:, :r], np.eye(r))
                 else:
                     # in this case, we just check that at least one element on
                     # the diagonal is 0. This is enough to make the algorithm
@@ -0,0 +1,65 @@
+from test.common_circuit import CircuitTestCase
+
+import numpy as np
+from qat.external.qroutines.linalg import matrix as qmatrix
+from qat.lang.AQASM import CNOT, H
+from qat.lang.AQASM.program import Program
+
+
+class MatrixDecodeTestCase(CircuitTestCase):
+    def _prepare(self, nrows=3, ncols=4):
+        pr = Program()
+        # An ancilla before the matrix, so that the indexes don't start from 0
+        anc = pr.qalloc(1)
+        qr_matrix = pr.qalloc(nrows * ncols)
+        matrix = np.zeros((nrows, ncols), dtype=np.ubyte)
+        matrix[0, 1] = matrix[2, 3] = 1
+        pr.apply(qmatrix.initialize_qureg_to_binary_matrix(matrix), qr_matrix)
+        # 8 equiprobable matrices
+        for q in (0, 5, 10):
+            pr.apply(H, qr_matrix[q])
+        pr.apply(CNOT, qr_matrix[10], anc)
+        index_map = qmatrix.get_rows_as_index_list(nrows, ncols, qr_matrix)
+        return pr.to_circ(), index_map
+
+    def test_bitstring(self):
+        matrix = qmatrix.build_matrix_from_bitstring("0110100", {1, 2, 4, 6}, (2, 2))
+        np.testing.assert_array_equal(matrix, [[1, 1], [1, 0]])
+        matrix = qmatrix.build_matrix_from_bitstring("11", {0, 1, 2}, (2, 2))
+        np.testing.assert_array_equal(matrix, [[1, 1], [0, 0]])
+
+    def test_decode_result(self):
+        circuit, index_map = self._prepare()
+        qbit_range = set(np.ravel(index_map).tolist())
+        res = self.qpu.submit(circuit.to_job())
+        matrices, probabilities = qmatrix.decode_result_matrices(res, index_map)
+        self.assertEqual(matrices.shape, (8, 3, 4))
+        self.assertEqual(matrices.dtype, np.uint8)
+        np.testing.assert_allclose(probabilities, 1 / 8)
+        for sample, matrix in zip(res, matrices):
+            np.testing.assert_array_equal(
+                matrix, qmatrix.build_matrix_from_sample(sample, qbit_range, (3, 4))
+            )
+        self.assertEqual(len(set(m.tobytes() for m in matrices)), 8)
+
+        packed, _ = qmatrix.decode_result_matrices(res, index_map, packed=True)
+        self.assertEqual(packed.shape, (8, 3, 1))
+        np.testing.assert_array_equal(np.unpackbits(packed, axis=-1)[..., :4], matrices)
+
+    def test_decode_result_qubits(self):
+        circuit, index_map = self._prepare()
+        qubits = sorted(set(np.ravel(index_map).tolist()))
+        full, _ = qmatrix.decode_result_matrices(
+            self.qpu.submit(circuit.to_job()), index_map
+        )
+        res = self.qpu.submit(circuit.to_job(qubits=qubits))
+        matrices, probabilities = qmatrix.decode_result_matrices(
+            res, index_map, qubits=qubits
+        )
+        # The samples may be in a different order
+        self.assertEqual(
+            sorted(m.tobytes() for m in matrices), sorted(m.tobytes() for m in full)
+        )
+        np.testing.assert_allclose(probabilities, 1 / 8)
+        with self.assertRaises(ValueError):
+            qmatrix.decode_result_matrices(res, index_map, qubits=qubits[1:])
@@ -1,8 +1,9 @@
 import unittest
 from test.common_circuit import CircuitTestCase
 
+import numpy as np
 from parameterized import parameterized
-# # from qat.external.qpus.reversible import RProgram
+from qat.external.qpus.reversible import RProgram
 from qat.external.qroutines import qregs_init as qregs
 from qat.external.qroutines.sorting import sorting_network as sn
 from qat.lang.AQASM.program import Program
@@ -163,3 +164,87 @@ class SortingNetworkTestCase(CircuitTestCase):
     @unittest.skipUnless(CircuitTestCase.REVERSIBLE_ON, f"Only with reversible")
     def test_sorter_long(self, string):
         self._test_sorter_common(string)
+
+    @parameterized.expand(
+        [
+            (4,),
+            (8,),
+            (4, "batcher"),
+            (8, "batcher"),
+            (3, "bitonic", True),
+            (6, "bitonic", True),
+            (5, "batcher", True),
+            (7, "batcher", True),
+        ]
+    )
+    def test_sorter_exhaustive_batch(self, n, network="bitonic", exact=False):
+        """Sort all the n-bits strings at once, using the bit-sliced reversible
+        simulator."""
+        pattern = sn.get_pattern_network(n, network, exact)
+        self.pr = Program()
+        self.qr = self.pr.qalloc(pattern["n_lines"])
+        self.comps = self.pr.qalloc(pattern["n_comps"])
+        self.pr.apply(sn.build_gate_sorter(pattern), self.qr, self.comps)
+        rpr = RProgram.circuit_to_rprogram(self.pr.to_circ())
+        self.assertEqual(len(self.qr), n)
+
+        qr_idxs = [qbit.index for qbit in self.qr]
+        strings = np.array(list(np.ndindex(*([2] * n))), dtype=np.uint8)
+        inputs = np.zeros((len(strings), rpr.nbqbits), dtype=np.uint8)
+        inputs[:, qr_idxs] = strings
+        obtained = rpr.run_batch(inputs)[:, qr_idxs]
+        np.testing.assert_array_equal(obtained, np.sort(strings, axis=1))
+
+    def test_pattern_merger(self):
+        pattern = sn.get_pattern_merger(8)
+        np.testing.assert_array_equal(
+            pattern["swaps_pattern"],
+            [
+                [0, 0, 7],
+                [1, 1, 6],
+                [2, 2, 5],
+                [3, 3, 4],
+                [4, 0, 2],
+                [5, 1, 3],
+                [6, 0, 1],
+                [7, 2, 3],
+                [8, 4, 6],
+                [9, 5, 7],
+                [10, 4, 5],
+                [11, 6, 7],
+            ],
+        )
+        np.testing.assert_array_equal(
+            pattern["layers"], [0, 0, 0, 0, 1, 1, 2, 2, 1, 1, 2, 2]
+        )
+        self.assertEqual(pattern["n_layers"], 3)
+
+    @parameterized.expand(
+        [(5,), (16,), (100,), (16, "batcher"), (100, "batcher", True)]
+    )
+    def test_pattern_layers(self, n, network="bitonic", exact=False):
+        """The comparators of a layer act on disjoint lines, after all the
+        comparators of the previous layers acting on the same lines."""
+        pattern = sn.get_pattern_network(n, network, exact)
+        last = np.full(pattern["n_lines"], -1)
+        for (_, a, b), layer in zip(pattern["swaps_pattern"], pattern["layers"]):
+            self.assertEqual(layer, max(last[a], last[b]) + 1)
+            last[a] = last[b] = layer
+        self.assertEqual(pattern["n_layers"], last.max() + 1)
+        self.assertEqual(pattern["swaps_pattern"].shape, (pattern["n_comps"], 3))
+        self.assertEqual(pattern["swaps_pattern"].dtype, np.int32)
+
+    def test_compare_networks(self):
+        # Batcher's odd-even mergesort: (p^2 - p + 4) 2^(p-2) - 1 comparators
+        self.assertEqual(sn.compare_networks(8)["batcher"], (19, 6))
+        self.assertEqual(sn.compare_networks(16)["batcher"], (63, 10))
+        for n in (5, 13, 100):
+            with self.subTest(n=n):
+                stats = sn.compare_networks(n)
+                for network in sn.NETWORKS:
+                    padded, exact = stats[network], stats[f"{network}_exact"]
+                    self.assertLessEqual(exact[0], padded[0])
+                    self.assertLessEqual(exact[1], padded[1])
+                self.assertLess(stats["batcher_exact"][0], stats["bitonic_exact"][0])
+        with self.assertRaises(ValueError):
+            sn.get_pattern_network(8, "bubble")
@@ -1,7 +1,7 @@
 from test.common_circuit import CircuitTestCase
 
 from parameterized import parameterized
-# from qat.external.qpus.reversible import RProgram
+from qat.external.qpus.reversible import RProgram
 from qat.external.qroutines import qregs_init as qregs
 from qat.external.qroutines.arith import tkk_arith
 from qat.external.utils.bits import misc
@@ -0,0 +1,92 @@
+from test.common_circuit import CircuitTestCase
+
+import numpy as np
+from parameterized import parameterized
+from qat.external.qpus import reversible
+from qat.external.qpus.reversible import RProgram
+from qat.external.qroutines import qregs_init as qregs
+from qat.external.qroutines.hamming_weight_compute import fpc, wallace
+from qat.external.utils.ancillae import AncillaPool
+from qat.lang.AQASM.program import Program
+
+
+class WallaceTestCase(CircuitTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if cls.logger.level != 0:
+            wallace.LOGGER.setLevel(cls.logger.level)
+            for handler in cls.logger.handlers:
+                wallace.LOGGER.addHandler(handler)
+
+    @parameterized.expand([(2,), (3,), (5,), (7,), (8,), (11,)])
+    def test_weight_exhaustive_batch(self, nbits):
+        """Compute the weight of all the nbits-long bitstrings at once, using
+        the bit-sliced reversible simulator."""
+        pattern = wallace.get_pattern(nbits)
+        self.assertEqual(pattern["n_lines"], nbits)
+        program = Program()
+        a = program.qalloc(nbits)
+        cout = program.qalloc(pattern["n_couts"])
+        qfun = wallace.get_qroutine_for_qubits_weight(len(a), len(cout), pattern)
+        program.apply(qfun, a, cout)
+        to_measure_qubits = wallace.get_to_measure_qubits(a, cout, pattern)
+        circ = program.to_circ()
+        self.assertEqual(circ.nbqbits, nbits + pattern["n_couts"])
+        rpr = RProgram.circuit_to_rprogram(circ)
+
+        a_ints = np.arange(2**nbits)
+        words = rpr.new_words(len(a_ints))
+        words[[qb.index for qb in a]] = reversible.pack_ints(a_ints, nbits)
+        rpr.run_words(words)
+        obtained = reversible.unpack_ints(
+            words[[qb.index for qb in to_measure_qubits]], len(a_ints)
+        )
+        expected = [bin(i).count("1") for i in a_ints]
+        np.testing.assert_array_equal(obtained, expected)
+
+    def test_pattern(self):
+        pattern = wallace.get_pattern(5)
+        compressors = list(wallace.get_compressors(pattern))
+        # Two full adders on the first column, the sum is left in qubit 2
+        self.assertEqual(compressors[0], ([0, 1, 2], 5))
+        self.assertEqual(compressors[1], ([3, 4, 2], 6))
+        # A half adder on their carries
+        self.assertEqual(compressors[2], ([5, 6], 7))
+        np.testing.assert_array_equal(pattern["results"], [2, 1, 2])
+        np.testing.assert_array_equal(pattern["results_sources"], [0, 1, 1])
+        ripple = fpc.get_qroutine_for_qubits_weight_get_pattern(5)
+        with self.assertRaises(ValueError):
+            list(wallace.get_compressors(ripple))
+
+    def test_cheaper_than_ripple_tree(self):
+        for n in (5, 8, 64, 100, 1000):
+            with self.subTest(n=n):
+                pattern = wallace.get_pattern(n)
+                self.assertLess(pattern["n_couts"], n)
+                res = wallace.get_qroutine_for_qubits_weight_resources(pattern)
+                ripple = fpc.get_qroutine_for_qubits_weight_resources(
+                    fpc.get_qroutine_for_qubits_weight_get_pattern(n)
+                )
+                self.assertLess(res.qubits, ripple.qubits)
+                self.assertLess(res.toffoli_depth, ripple.toffoli_depth)
+
+    @parameterized.expand([(0b10110, 3), (0b10110, 2), (0b1111111, 7), (0, 0)])
+    def test_weight_check(self, value, weight):
+        """The weight check of fpc works with the Wallace tree too."""
+        n = 7
+        pattern = wallace.get_pattern(n)
+        pr = Program()
+        a_qs = pr.qalloc(n)
+        eq_q = pr.qalloc(1)
+        pr.apply(qregs.initialize_qureg_given_int(value, n, False), a_qs)
+        pool = AncillaPool(pr)
+        fpc.apply_qubits_weight_check(
+            pr, a_qs, weight, eq_q[0], pool, patterns_dict=pattern
+        )
+        circ = pr.to_circ()
+        self.assertEqual(circ.nbqbits, n + 1 + pattern["n_couts"])
+        rbits = RProgram.circuit_to_rprogram(circ).rbits
+        self.assertEqual(rbits.to01()[:n], f"{value:0{n}b}")
+        self.assertEqual(rbits[n], int(bin(value).count("1") == weight))
+        self.assertEqual(sum(rbits[n + 1 :]), 0)
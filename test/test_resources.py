@@ -0,0 +1,122 @@
+import itertools
+from test.common_circuit import CircuitTestCase
+
+from parameterized import parameterized
+from qat.external.qroutines.arith import backends, cuccaro_arith
+from qat.external.qroutines.hamming_weight_compute import fpc, wallace
+from qat.external.qroutines.hamming_weight_generate import bartschiE19
+from qat.external.qroutines.linalg import gauss_jordan_isd4 as gji
+from qat.external.qroutines.linalg import matrix as qmatrix
+from qat.external.qroutines.sorting import sorting_network as sn
+from qat.external.utils import resources
+from qat.lang.AQASM.program import Program
+
+
+class ResourcesTestCase(CircuitTestCase):
+    """Check the analytic estimates against the compiled circuits."""
+
+    def _check(self, estimated, qrout, nbqbits):
+        pr = Program()
+        qr = pr.qalloc(nbqbits)
+        pr.apply(qrout, qr)
+        expected = resources.circuit_resources(pr.to_circ())
+        self.assertEqual(estimated.qubits, expected.qubits)
+        self.assertEqual(dict(estimated.gates), dict(expected.gates))
+        self.assertEqual(estimated.toffoli_depth, expected.toffoli_depth)
+
+    @parameterized.expand([(1, False), (1, True), (2, False), (4, True), (5, False)])
+    def test_cuccaro_adder(self, bits, overflow):
+        estimated = cuccaro_arith.adder_resources(bits, bits, overflow)
+        qrout = cuccaro_arith.adder(bits, bits, overflow, True)
+        self._check(estimated, qrout, 2 * bits + overflow)
+
+    @parameterized.expand([(1, False), (1, True), (2, False), (4, True), (7, False)])
+    def test_adder_backends(self, bits, overflow):
+        for name in backends.adder_names():
+            with self.subTest(adder=name):
+                backend = backends.get_adder(name)
+                estimated = backend.resources(bits, bits, overflow)
+                qrout = backend.adder(bits, bits, overflow, True)
+                self._check(estimated, qrout, 2 * bits + overflow)
+
+    @parameterized.expand([(2,), (3,), (8,), (13,)])
+    def test_fpc(self, n):
+        pattern = fpc.get_qroutine_for_qubits_weight_get_pattern(n)
+        estimated = fpc.get_qroutine_for_qubits_weight_resources(pattern)
+        a_len, cout_len = pattern["n_lines"], pattern["n_couts"]
+        qrout = fpc.get_qroutine_for_qubits_weight(a_len, cout_len, pattern)
+        self._check(estimated, qrout, a_len + cout_len)
+        self.assertEqual(estimated.ancillae, cout_len + 1)
+
+    @parameterized.expand([("tkk",), ("cla",), ("depth",)])
+    def test_fpc_adders(self, adder):
+        pattern = fpc.get_qroutine_for_qubits_weight_get_pattern(32, adder)
+        estimated = fpc.get_qroutine_for_qubits_weight_resources(pattern)
+        a_len, cout_len = pattern["n_lines"], pattern["n_couts"]
+        qrout = fpc.get_qroutine_for_qubits_weight(a_len, cout_len, pattern)
+        self._check(estimated, qrout, a_len + cout_len)
+
+    @parameterized.expand([(2,), (5,), (8,), (13,)])
+    def test_wallace(self, n):
+        pattern = wallace.get_pattern(n)
+        estimated = wallace.get_qroutine_for_qubits_weight_resources(pattern)
+        a_len, cout_len = pattern["n_lines"], pattern["n_couts"]
+        qrout = wallace.get_qroutine_for_qubits_weight(a_len, cout_len, pattern)
+        self._check(estimated, qrout, a_len + cout_len)
+        self.assertEqual(estimated.ancillae, cout_len)
+
+    @parameterized.expand([(2,), (5,), (8,)])
+    def test_sorter(self, n):
+        pattern = sn.get_pattern_sorter(n)
+        estimated = sn.build_gate_sorter_resources(pattern)
+        qrout = sn.build_gate_sorter(pattern)
+        self._check(estimated, qrout, pattern["n_lines"] + pattern["n_comps"])
+
+    @parameterized.expand([(2, 4), (3, 5), (4, 8)])
+    def test_move_columns_end(self, nrows, ncols):
+        data = qmatrix.move_columns_end_data(nrows, ncols)
+        estimated = qmatrix.move_columns_end_gate_resources(data)
+        qrout = qmatrix.move_columns_end_gate(data)
+        nbqbits = (nrows + 1) * data["n_cols"] + data["n_comps"]
+        self._check(estimated, qrout, nbqbits)
+
+    def test_gji(self):
+        for r, n, skip_rightmost in itertools.product(
+            (1, 2, 3, 4), (4, 6), (False, True)
+        ):
+            with self.subTest(r=r, n=n, skip_rightmost=skip_rightmost):
+                # last column is a syndrome
+                estimated = gji.get_rref_resources(r, n, skip_rightmost, n - 1)
+                qrout = gji.get_rref(r, n, skip_rightmost, n - 1)
+                swap_anc_n, _ = gji.get_required_ancillae(r)
+                self._check(estimated, qrout, r * n + swap_anc_n)
+                self.assertEqual(estimated.ancillae, swap_anc_n)
+
+    def test_bartschi(self):
+        for n, k in itertools.product(range(1, 8), range(0, 8)):
+            with self.subTest(n=n, k=k):
+                estimated = bartschiE19.generate_resources(n, k)
+                self._check(estimated, bartschiE19.generate(n, k), n)
+
+    def test_no_depth(self):
+        estimated = gji.get_rref_resources(5, 9, True, 8)
+        counted = gji.get_rref_resources(5, 9, True, 8, track_depth=False)
+        self.assertEqual(estimated.gates, counted.gates)
+        self.assertNotIn("toffoli_depth", counted.to_dict())
+        with self.assertRaises(ValueError):
+            counted.toffoli_depth
+
+    @parameterized.expand(
+        [
+            ("X", "X", False),
+            ("CNOT", "CNOT", False),
+            ("C-CNOT", "CCNOT", True),
+            ("C-CCNOT", "C-C-C-X", True),
+            ("D-C-RY", "C-RY", True),
+            ("SWAP", "SWAP", False),
+            ("C-SWAP", "C-SWAP", True),
+        ]
+    )
+    def test_gate_names(self, name, canonical, toffoli):
+        self.assertEqual(resources.canonical_gate_name(name), canonical)
+        self.assertEqual(resources.is_toffoli_class(name), toffoli)
@@ -0,0 +1,149 @@
+from test.common_circuit import CircuitTestCase
+
+import numpy as np
+from parameterized import parameterized
+from qat.external.qpus import reversible
+from qat.external.qpus.reversible import RProgram
+from qat.external.qroutines import qregs_init as qregs
+from qat.external.qroutines.hamming_weight_compute import fpc, wallace
+from qat.external.synthesis.mctrls import mcx
+from qat.external.synthesis.mctrls.link import MctrlsPlugin, link_mctrls
+from qat.external.utils.resources import circuit_resources, split_gate_name
+from qat.lang.AQASM import CCNOT, Program, X
+from qat.pylinalg import PyLinalg
+
+
+def _max_ctrls(circuit):
+    return max(
+        split_gate_name(name)[1]
+        for name, _, _ in circuit.iterate_simple()
+        if split_gate_name(name)[0] == "X"
+    )
+
+
+class McxTestCase(CircuitTestCase):
+    @parameterized.expand([(n, anc) for n in range(7) for anc in ("clean", "dirty")])
+    def test_exhaustive_batch(self, nctrls, ancillae):
+        """Run all the inputs at once, using the bit-sliced reversible simulator.
+        The dirty ancillae are inputs too, and they must be restored."""
+        n_anc = mcx.get_required_ancillae(nctrls) if ancillae == "dirty" else 0
+        pr = Program()
+        qr = pr.qalloc(nctrls + 1 + n_anc)
+        pr.apply(mcx.mcx(nctrls, ancillae), qr)
+        rpr = RProgram.circuit_to_rprogram(pr.to_circ())
+        ints = np.arange(2 ** len(qr))
+        idxs = [qb.index for qb in qr]
+        words = rpr.new_words(len(ints))
+        words[idxs] = reversible.pack_ints(ints, len(qr))
+        rpr.run_words(words)
+        obtained = reversible.unpack_ints(words[idxs], len(ints))
+        mask = 2**nctrls - 1
+        expected = ints ^ (((ints & mask) == mask).astype(ints.dtype) << nctrls)
+        np.testing.assert_array_equal(obtained, expected)
+        # The clean ancillae are restored
+        self.assertFalse(np.delete(words, idxs, axis=0).any())
+
+    @parameterized.expand([(3,), (4,)])
+    def test_relative(self, nctrls):
+        """The relative phases of the chain cancel out."""
+        for value in (0, 2**nctrls - 1, 2 ** (nctrls + 1) - 1, 0b101):
+            with self.subTest(value=value):
+                pr = Program()
+                qr = pr.qalloc(nctrls + 1)
+                pr.apply(qregs.initialize_qureg_given_int(value, nctrls + 1, True), qr)
+                pr.apply(mcx.mcx(nctrls, "relative"), qr)
+                circ = pr.to_circ()
+                samples = list(PyLinalg().submit(circ.to_job()))
+                self.assertEqual(len(samples), 1)
+                self.assertAlmostEqual(samples[0].amplitude, 1)
+                expected = value
+                if value & (2**nctrls - 1) == 2**nctrls - 1:
+                    expected ^= 1 << nctrls
+                # Little endian, the ancillae are 0
+                bits = samples[0].state.bitstring[: nctrls + 1]
+                self.assertEqual(bits, f"{expected:0{nctrls + 1}b}"[::-1])
+                ancillae = samples[0].state.bitstring[nctrls + 1 :]
+                self.assertEqual(ancillae, "0" * (nctrls - 2))
+
+    def test_resources(self):
+        for nctrls in (3, 5, 8):
+            toffolis = {"clean": 2 * nctrls - 3, "dirty": 4 * nctrls - 8}
+            for ancillae in toffolis:
+                with self.subTest(nctrls=nctrls, ancillae=ancillae):
+                    res = mcx.mcx_resources(nctrls, ancillae)
+                    self.assertEqual(res.gates, {"CCNOT": toffolis[ancillae]})
+                    self.assertEqual(res.qubits, 2 * nctrls - 1)
+                    pr = Program()
+                    qr = pr.qalloc(nctrls + 1 + (nctrls - 2) * (ancillae == "dirty"))
+                    pr.apply(mcx.mcx(nctrls, ancillae), qr)
+                    circ_res = circuit_resources(pr.to_circ())
+                    self.assertEqual(circ_res.gates, res.gates)
+                    self.assertEqual(circ_res.toffoli_depth, res.toffoli_depth)
+        self.assertEqual(mcx.mcx_resources(5, "relative").gates["CCNOT"], 1)
+        with self.assertRaises(ValueError):
+            mcx.mcx_resources(5, "borrowed")
+
+    def test_ccnot_link(self):
+        """Linked with ccnot, the Toffoli is made of Clifford+T gates."""
+        for value in range(8):
+            with self.subTest(value=value):
+                pr = Program()
+                qr = pr.qalloc(3)
+                pr.apply(qregs.initialize_qureg_given_int(value, 3, False), qr)
+                pr.apply(CCNOT, qr)
+                circ = pr.to_circ(link=[mcx.ccnot], inline=True)
+                names = [name for name, _, _ in circ.iterate_simple()]
+                self.assertNotIn("CCNOT", names)
+                samples = list(PyLinalg().submit(circ.to_job()))
+                self.assertEqual(len(samples), 1)
+                expected = value ^ 1 if value >> 1 == 0b11 else value
+                self.assertEqual(samples[0].state.int, expected)
+
+
+class LinkMctrlsTestCase(CircuitTestCase):
+    def _program(self, nbqbits, value):
+        pr = Program()
+        qr = pr.qalloc(nbqbits)
+        pr.apply(qregs.initialize_qureg_given_int(value, nbqbits, False), qr)
+        pr.apply(X.ctrl(4), *qr[:5])
+        pr.apply(X.ctrl(3), qr[0], qr[2], qr[3], qr[nbqbits - 1])
+        return pr
+
+    @parameterized.expand([(6, "dirty", 1), (8, "dirty", 0), (6, "clean", 2)])
+    def test_link(self, nbqbits, ancillae, appended):
+        for value in (0, 0b111101 << (nbqbits - 6), 2**nbqbits - 1, 0b101101):
+            with self.subTest(value=value):
+                circ = self._program(nbqbits, value).to_circ(inline=True)
+                linked = link_mctrls(circ, ancillae)
+                self.assertEqual(linked.nbqbits, nbqbits + appended)
+                self.assertEqual(_max_ctrls(linked), 2)
+                expected = RProgram.circuit_to_rprogram(circ).rbits.to01()
+                obtained = RProgram.circuit_to_rprogram(linked).rbits.to01()
+                self.assertEqual(obtained, expected + "0" * appended)
+
+    def test_plugin(self):
+        circ = self._program(8, 0b11111001).to_circ(inline=True)
+        expected = list(PyLinalg().submit(circ.to_job()))
+        obtained = list((MctrlsPlugin() | PyLinalg()).submit(circ.to_job()))
+        self.assertEqual(obtained[0].state.int, expected[0].state.int)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            link_mctrls(self._program(6, 0).to_circ(inline=True), "relative")
+        pr = Program()
+        qr = pr.qalloc(6)
+        pr.apply(mcx.mcx(4, "clean"), qr[:5])
+        with self.assertRaises(ValueError):
+            link_mctrls(pr.to_circ())
+
+    def test_fpc_check(self):
+        """The X controlled by the result qubits borrows the other qubits."""
+        n = 8
+        pattern = wallace.get_pattern(n)
+        pr = Program()
+        a_qs = pr.qalloc(n)
+        eq_q = pr.qalloc(1)
+        fpc.apply_qubits_weight_check(pr, a_qs, 3, eq_q[0], patterns_dict=pattern)
+        circ = pr.to_circ(inline=True)
+        self.assertEqual(_max_ctrls(circ), 2)
+        self.assertEqual(circ.nbqbits, n + 1 + pattern["n_couts"])
@@ -0,0 +1,94 @@
+from test.common_circuit import CircuitTestCase
+
+import numpy as np
+from qat.external.qpus.reversible import RProgram
+from qat.external.qroutines.arith import cuccaro_arith
+from qat.external.qroutines.linalg import gauss_jordan_isd4 as gji
+from qat.external.qroutines.linalg import matrix as qmatrix
+from qat.external.utils.gf2 import GF2Matrix, gji_rref
+from qat.external.utils.template import CircuitTemplate
+from qat.lang.AQASM.program import Program
+
+
+class CircuitTemplateTestCase(CircuitTestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(7)
+
+    def _gji_template(self, r, n, skip_rightmost):
+        pr = Program()
+        ncols = n + 1
+        qr_matrix = pr.qalloc(r * ncols)
+        swap_qregs = pr.qalloc(gji.get_required_ancillae(r)[0])
+        rows = qmatrix.get_rows_as_qubit_list(r, ncols, qr_matrix)
+        pr.apply(gji.get_rref(r, ncols, skip_rightmost, n), rows, swap_qregs)
+        return CircuitTemplate.compile(pr, {"matrix": qr_matrix})
+
+    def test_gji_batch(self):
+        """A batch of matrices (with the syndrome) through one compiled GJISD."""
+        r, n = 3, 5
+        for skip_rightmost in (False, True):
+            with self.subTest(skip_rightmost=skip_rightmost):
+                template = self._gji_template(r, n, skip_rightmost)
+                matrices = self.rng.integers(0, 2, size=(100, r, n + 1))
+                outputs = template.run_batch(matrix=matrices)
+                obtained = outputs[:, template.qubits("matrix")]
+                for matrix, out in zip(matrices, obtained):
+                    expected = gji_rref(GF2Matrix.from_array(matrix), skip_rightmost, n)
+                    np.testing.assert_array_equal(
+                        out.reshape(r, n + 1), expected.matrix.to_array()
+                    )
+
+    def test_gji_bind(self):
+        """The bound circuit is the one of the program with the prefix."""
+        r, n = 3, 3
+        template = self._gji_template(r, n, False)
+        for _ in range(3):
+            matrix = self.rng.integers(0, 2, size=(r, n + 1))
+            pr = Program()
+            qr_matrix = pr.qalloc(r * (n + 1))
+            swap_qregs = pr.qalloc(gji.get_required_ancillae(r)[0])
+            pr.apply(qmatrix.initialize_qureg_to_binary_matrix(matrix), qr_matrix)
+            rows = qmatrix.get_rows_as_qubit_list(r, n + 1, qr_matrix)
+            pr.apply(gji.get_rref(r, n + 1, False, n), rows, swap_qregs)
+            expected = RProgram.circuit_to_rprogram(pr.to_circ()).rbits
+            bound = template.bind(matrix=matrix)
+            self.assertEqual(RProgram.circuit_to_rprogram(bound).rbits, expected)
+            self.assertEqual(template.run(matrix=matrix), expected)
+            # The compiled body is untouched
+            self.assertEqual(len(bound.ops), len(template.circuit.ops) + matrix.sum())
+            res = self.simulate_circuit(bound)
+            self.assertEqual(len(res), 1)
+            for sample in res:
+                self.assertEqual(sample.state.bitstring, expected.to01())
+
+    def test_adder(self):
+        """The ints are set MSB first, so the little endian registers are
+        given in reverse order."""
+        bits = 4
+        pr = Program()
+        a = pr.qalloc(bits)
+        b = pr.qalloc(bits)
+        cout = pr.qalloc(1)
+        pr.apply(cuccaro_arith.adder(bits, bits, True, True), a, b, cout)
+        template = CircuitTemplate.compile(
+            pr, {"a": list(a)[::-1], "b": list(b)[::-1], "cout": cout}
+        )
+        a_ints, b_ints = np.divmod(np.arange(4**bits), 2**bits)
+        outputs = template.run_batch(a=a_ints, b=b_ints)
+        sums = outputs[:, template.qubits("cout", "b")] @ (1 << np.arange(bits, -1, -1))
+        np.testing.assert_array_equal(sums, a_ints + b_ints)
+        self.assertEqual(
+            template.run(a=5, b=9).to01(),
+            RProgram.circuit_to_rprogram(template.bind(a=5, b=9)).rbits.to01(),
+        )
+
+    def test_errors(self):
+        template = self._gji_template(3, 3, False)
+        with self.assertRaises(ValueError):
+            template.bind(syndrome=[1, 0, 1])
+        with self.assertRaises(ValueError):
+            template.bind(matrix=[1, 0, 1])
+        with self.assertRaises(ValueError):
+            template.bind(matrix=1 << 12)
+        with self.assertRaises(ValueError):
+            template.run_batch(matrix=np.zeros((2, 11)))
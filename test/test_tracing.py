@@ -0,0 +1,69 @@
+import re
+import unittest
+
+from qat.external.qroutines.arith import cuccaro_arith
+from qat.external.qroutines.hamming_weight_compute import fpc
+from qat.external.qroutines.linalg import _rref
+from qat.external.utils import cache, tracing
+from qat.lang.AQASM.program import Program
+
+
+class TracingTestCase(unittest.TestCase):
+    def setUp(self):
+        cache.cache_clear()
+
+    def test_calls(self):
+        with tracing.tracing() as trace:
+            cuccaro_arith.adder.circuit_generator(4, 4, True, True)
+            cuccaro_arith.adder.circuit_generator(4, 4, True, True)
+        node = trace.root.children["adder"]
+        self.assertEqual((node.calls, node.hits), (2, 1))
+        self.assertEqual(node.gates, {"MAJ": 4, "UMA": 4, "CNOT": 1})
+        self.assertEqual((node.wires, node.ancillae), (9, 1))
+        self.assertGreater(node.wall, 0)
+        self.assertFalse(tracing.ACTIVE)
+
+    def test_link_time(self):
+        """The gates of a program are built by to_circ."""
+        nrows, ncols = 3, 4
+        with tracing.tracing(["get_row_swap", "_rref:get_row_addition"]) as trace:
+            pr = Program()
+            qr = pr.qalloc(_rref.get_rref.circuit_generator(nrows, ncols).arity)
+            pr.apply(_rref.get_rref(nrows, ncols), qr)
+            pr.to_circ()
+        self.assertEqual(set(trace.root.children), {"get_row_swap"})
+        with tracing.tracing(["get_row_swap", "get_row_addition"]) as trace:
+            pr.to_circ()
+        swaps = trace.root.children["get_row_swap"]
+        self.assertEqual(swaps.calls, swaps.hits)
+        self.assertEqual(trace.root.children["get_row_addition"].calls, nrows)
+
+    def test_nested(self):
+        """A builder building another one directly is its parent."""
+        pattern = fpc.get_qroutine_for_qubits_weight_get_pattern(8)
+        with tracing.tracing() as trace:
+            fpc.get_qroutine_for_qubits_weight_check.circuit_generator(
+                pattern["n_lines"], pattern["n_couts"], 3, pattern, True
+            )
+        check = trace.root.children["get_qroutine_for_qubits_weight_check"]
+        self.assertIn("get_qroutine_for_qubits_weight", check.children)
+        weight = check.children["get_qroutine_for_qubits_weight"]
+        self.assertLessEqual(weight.wall, check.wall)
+        self.assertEqual(
+            trace.totals()["get_qroutine_for_qubits_weight"].gates, weight.gates
+        )
+        folded = trace.folded().splitlines()
+        self.assertIn(
+            "get_qroutine_for_qubits_weight_check;get_qroutine_for_qubits_weight",
+            [line.rsplit(" ", 1)[0] for line in folded],
+        )
+        for line in folded + trace.folded(gates=True).splitlines():
+            self.assertRegex(line, re.compile(r"^[\w;]+ \d+$"))
+        self.assertEqual(len(trace.tree().splitlines()), len(folded))
+
+    def test_nested_traces(self):
+        with tracing.tracing():
+            with self.assertRaises(RuntimeError):
+                with tracing.tracing():
+                    pass
+        self.assertFalse(tracing.ACTIVE)